@@ -6,67 +6,202 @@ It orchestrates three agents: Web searcher, Research analyst, and Technical writ
 """
 
 import os
+import re
+import time
 import asyncio
 import logging
-from typing import Dict, Any, Optional
+from contextvars import ContextVar
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional
 
 from crewai import Agent, Task, Crew, Process
 from crewai.tools import BaseTool
 from dotenv import load_dotenv
 
-from .tools.linkup_search import LinkUpSearchTool
+from runtime.deadline import Deadline, DeadlineExceeded, check_deadline, current_deadline, deadline_scope
+from runtime.executor import run_blocking
+from runtime.freshness import policy_for
+from runtime.governor import (
+    GenerationRun, GenerationSettings, current_generation, generation_run, get_governor, record_generation
+)
+from runtime.logging_setup import run_trace, trace_step
+from runtime.metrics import REGISTRY
+from runtime.query_log import logged_query, note_cached
+from runtime.report_store import get_report_store
+
+from .tools.linkup_search import LinkUpSearchTool, choose_depth, search_depth, search_failed
 from .tools.ollama_tool import OllamaLLMTool
+from .tools.search_providers import make_search
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+QUICK_ANSWER_PROMPT = """Answer the question below using only the web search results provided.
+Be concise, use markdown, and cite result URLs where relevant.
+
+Question: {query}
+
+{results}
+
+Answer:"""
+
+EXECUTION_MODES = ("sequential", "dag")
+
+# CrewAI's own verbose output prints synchronously to stdout on every step;
+# sampled structured traces (CREW_TRACE_SAMPLE_RATE) are the cheaper default
+CREW_VERBOSE = os.getenv('CREW_VERBOSE', 'false').lower() in ('1', 'true', 'yes')
+
+RUN_SECONDS = REGISTRY.histogram("crew_run_seconds", "End-to-end research run time")
+STAGE_SECONDS = REGISTRY.histogram("crew_stage_seconds", "Time per research pipeline stage")
+
+# Start of each numbered entry produced by LinkUpSearchTool.format_results
+_RESULT_ENTRY = re.compile(r"^(?=\d+\. )", re.MULTILINE)
+
+
+class ResearchFailed(Exception):
+    """A research or search run failed; the message says why."""
+
+
+def _split_results(search_results: str, parts: int) -> List[str]:
+    """Split formatted search results into up to `parts` groups of whole entries."""
+    entries = [e.strip() for e in _RESULT_ENTRY.split(search_results)[1:] if e.strip()]
+    if len(entries) <= 1 or parts <= 1:
+        return [search_results]
+    size = -(-len(entries) // parts)
+    return ["\n\n".join(entries[i:i + size]) for i in range(0, len(entries), size)]
+
+# Stage reported when each sequential crew task finishes, keyed by agent role
+_STAGE_BY_ROLE = {
+    'Web Research Specialist': ('search', 'Web search complete'),
+    'Research Analyst': ('analysis', 'Analysis complete'),
+    'Technical Writer': ('writing', 'Report written'),
+}
+
+# Generation governor role of each agent and of each DAG stage
+_GOVERNOR_ROLE = {
+    'Web Research Specialist': 'searcher',
+    'Research Analyst': 'analyst',
+    'Technical Writer': 'writer',
+}
+_GOVERNOR_ROLE_BY_STAGE = {'outline': 'writer', 'analysis': 'analyst', 'section': 'writer'}
+
+
+class ProgressReporter:
+    """Numbers pipeline events for one run and forwards them to a callback.
+    
+    Events are dicts with stage, progress, total and message keys, plus
+    partial (stage output text) and tokens (rough token count of it) when
+    a stage produced output. The callback may be invoked from worker threads.
+    """
+    
+    def __init__(self, callback: Callable[[Dict[str, Any]], None], total: int):
+        self.callback = callback
+        self.total = total
+        self.progress = 0
+    
+    def emit(self, stage: str, message: str, partial: Optional[str] = None) -> None:
+        self.progress += 1
+        event = {'stage': stage, 'progress': self.progress, 'total': self.total, 'message': message}
+        if partial:
+            event['partial'] = partial
+            event['tokens'] = len(partial) // 4
+        try:
+            self.callback(event)
+        except Exception as e:
+            logger.debug("Progress callback failed: %s", e)
+
+
+_progress: ContextVar[Optional[ProgressReporter]] = ContextVar("research_progress", default=None)
+
+
+def _kickoff(crew: Crew) -> Callable[..., Any]:
+    """The crew's native async kickoff when this CrewAI version has one,
+    else its blocking kickoff (run on the dedicated executor)."""
+    return getattr(crew, "akickoff", None) or crew.kickoff
+
+
+def _report(stage: str, message: str, partial: Optional[str] = None) -> None:
+    """Emit a progress event for the current run, if anyone is listening."""
+    reporter = _progress.get()
+    if reporter is not None:
+        reporter.emit(stage, message, partial)
+
 class ResearchCrew:
     """Multi-agent research crew using CrewAI."""
     
-    def __init__(self):
+    def __init__(self, execution_mode: Optional[str] = None):
         self.linkup_tool = LinkUpSearchTool()
         self.ollama_tool = OllamaLLMTool()
+        # Output length, temperature and context window per agent
+        self.governor = get_governor()
+        if os.getenv('EVIDENCE_SUMMARIES', 'false').lower() in ('1', 'true', 'yes'):
+            # Sources seen by earlier runs are summarized once and shared
+            self.linkup_tool.use_evidence_pool(self.ollama_tool.summarize_source)
+        # Quick search backend: LinkUp alone, or several providers fanned out (SEARCH_PROVIDERS)
+        self.search_tool = make_search(self.linkup_tool)
+        self.execution_mode = execution_mode or os.getenv('CREW_EXECUTION_MODE', 'sequential')
+        if self.execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {self.execution_mode}")
+        self.dag_chunks = int(os.getenv('CREW_DAG_CHUNKS', '3'))
+        # Stored reports younger than this are returned instead of re-running
+        self.report_reuse_max_age = float(os.getenv('REPORT_REUSE_MAX_AGE', '3600'))
         self.crew = self._setup_crew()
     
-    def _setup_crew(self) -> Crew:
-        """Set up the research crew with agents and their tasks."""
-        
-        # Web Searcher Agent
-        web_searcher = Agent(
+    def _settings(self, role: str, generation: Optional[GenerationRun]) -> GenerationSettings:
+        """A role's generation settings, with the run's budget when there is a run."""
+        return generation.settings_for(role) if generation is not None else self.governor.settings_for(role)
+    
+    def _make_web_searcher(self, generation: Optional[GenerationRun] = None) -> Agent:
+        """Create the web searcher agent."""
+        return Agent(
             role='Web Research Specialist',
             goal='Find comprehensive and relevant information from the web using LinkUp API',
             backstory="""You are an expert web researcher who excels at finding relevant, 
             accurate, and comprehensive information from various online sources. You use 
             advanced search techniques to gather data from multiple perspectives.""",
-            verbose=True,
+            verbose=CREW_VERBOSE,
             allow_delegation=False,
-            tools=[self.linkup_tool]
-            # Note: LLM will be set via environment variables
+            tools=[self.linkup_tool],
+            llm=self.ollama_tool.agent_llm(self._settings('searcher', generation))
         )
-        
-        # Research Analyst Agent
-        research_analyst = Agent(
+    
+    def _make_research_analyst(self, generation: Optional[GenerationRun] = None) -> Agent:
+        """Create the research analyst agent."""
+        return Agent(
             role='Research Analyst',
             goal='Analyze and synthesize information to provide comprehensive insights',
             backstory="""You are a skilled research analyst with expertise in synthesizing 
             information from multiple sources. You excel at identifying key insights, 
             verifying facts, and organizing information in a logical manner.""",
-            verbose=True,
-            allow_delegation=False
-            # Note: LLM will be set via environment variables
+            verbose=CREW_VERBOSE,
+            allow_delegation=False,
+            llm=self.ollama_tool.agent_llm(self._settings('analyst', generation))
         )
-        
-        # Technical Writer Agent
-        technical_writer = Agent(
+    
+    def _make_technical_writer(self, generation: Optional[GenerationRun] = None) -> Agent:
+        """Create the technical writer agent."""
+        return Agent(
             role='Technical Writer',
             goal='Create clear, comprehensive, and well-structured written content',
             backstory="""You are an expert technical writer who excels at creating 
             clear, comprehensive, and well-structured documents. You can transform 
             complex research into accessible and informative content.""",
-            verbose=True,
-            allow_delegation=False
-            # Note: LLM will be set via environment variables
+            verbose=CREW_VERBOSE,
+            allow_delegation=False,
+            llm=self.ollama_tool.agent_llm(self._settings('writer', generation))
         )
+    
+    def _setup_crew(self, generation: Optional[GenerationRun] = None) -> Crew:
+        """Set up the research crew with agents and their tasks.
+        
+        Args:
+            generation: Run whose token budgets the agents get; the
+                governor's current ones when None.
+        """
+        
+        # Agents
+        web_searcher = self._make_web_searcher(generation)
+        research_analyst = self._make_research_analyst(generation)
+        technical_writer = self._make_technical_writer(generation)
         
         # Define tasks for each agent
         search_task = Task(
@@ -110,6 +245,7 @@ class ResearchCrew:
             - Is written in clear, accessible language
             - Provides actionable insights where appropriate
             - Includes proper context and background
+            {writer_length}
             
             Format the response in markdown for better readability.""",
             agent=technical_writer,
@@ -122,42 +258,303 @@ class ResearchCrew:
             agents=[web_searcher, research_analyst, technical_writer],
             tasks=[search_task, analysis_task, writing_task],
             process=Process.sequential,
-            verbose=True
+            verbose=CREW_VERBOSE,
+            # Abort between agent steps once the caller's deadline has passed
+            step_callback=self._on_step,
+            task_callback=self._on_task_done
         )
         
         return crew
     
-    async def conduct_research(self, query: str) -> str:
-        """Conduct comprehensive research using the multi-agent crew."""
+    @staticmethod
+    def _on_step(step: Any) -> None:
+        """Crew step callback: stop abandoned runs and trace sampled ones."""
+        check_deadline()
+        trace_step(step)
+    
+    @staticmethod
+    def _on_task_done(output: Any) -> None:
+        """Sequential crew task callback: stop abandoned runs, record tokens and report progress."""
+        check_deadline()
+        role = str(getattr(output, 'agent', '')).strip()
+        text = getattr(output, 'raw', None) or str(output)
+        generation = current_generation()
+        if generation is not None and role in _GOVERNOR_ROLE:
+            # Tasks run back to back, so the time since the last one finished is this one's
+            record_generation(_GOVERNOR_ROLE[role], len(text) // 4, generation.lap())
+        stage, message = _STAGE_BY_ROLE.get(role, ('task', 'Task complete'))
+        _report(stage, message, text)
+    
+    def _crew_for(self, run: GenerationRun) -> Crew:
+        """Sequential crew built for this run, with its token budgets.
+        
+        Agents, tasks and crews keep per-kickoff state (executors, task
+        outputs, usage metrics), so, as in the DAG pipeline, every run gets
+        its own instead of sharing them with concurrent runs.
+        """
+        return self._setup_crew(run)
+    
+    def _single_task_crew(self, agent: Agent, description: str, expected_output: str) -> Crew:
+        """Build a one-agent, one-task crew for a step of the DAG pipeline."""
+        task = Task(description=description, agent=agent, expected_output=expected_output)
+        return Crew(
+            agents=[agent],
+            tasks=[task],
+            process=Process.sequential,
+            verbose=CREW_VERBOSE,
+            step_callback=self._on_step,
+            task_callback=check_deadline
+        )
+    
+    async def _run_stage(self, stage: str, crew: Crew, inputs: Dict[str, Any]) -> str:
+        """Run one DAG stage and record its duration."""
+        started = time.monotonic()
+        result = str(await self._run_with_deadline(_kickoff(crew), inputs=inputs))
+        elapsed = time.monotonic() - started
+        STAGE_SECONDS.observe(elapsed, mode="dag", stage=stage)
+        record_generation(_GOVERNOR_ROLE_BY_STAGE[stage], len(result) // 4, elapsed)
+        return result
+    
+    async def _conduct_dag(self, query: str, generation: GenerationRun) -> str:
+        """Pipelined research: parallel analyses with sections drafted as they finish.
+        
+        The raw search results feed both the writer's outline and one analysis
+        per group of results, all running concurrently. Each group's section is
+        drafted as soon as its analysis (and the outline) is ready, and the
+        sections are merged in result order at the end. Each stage gets fresh
+        agents so concurrent kickoffs do not share executor state.
+        """
+        started = time.monotonic()
+        search_results = await self._run_with_deadline(self.linkup_tool._run, query)
+        STAGE_SECONDS.observe(time.monotonic() - started, mode="dag", stage="search")
+        
+        groups = _split_results(search_results, self.dag_chunks)
+        reporter = _progress.get()
+        if reporter is not None:
+            reporter.total = 1 + 2 * len(groups)
+        _report('search', 'Web search complete', search_results)
+        
+        outline = asyncio.ensure_future(self._run_stage(
+            "outline",
+            self._single_task_crew(
+                self._make_technical_writer(generation),
+                """Draft the outline of a markdown report answering: {query}
+                
+                Base the outline on these web search results:
+                {results}
+                
+                List the section headings with one line on what each covers.
+                {length}""",
+                "A markdown outline of section headings"
+            ),
+            {'query': query, 'results': search_results, 'length': generation.length_hint('writer', scale=0.25)}
+        ))
+        
+        async def analyse_and_draft(results: str) -> str:
+            analysis = await self._run_stage(
+                "analysis",
+                self._single_task_crew(
+                    self._make_research_analyst(generation),
+                    """Analyze these web search results about: {query}
+                    
+                    {results}
+                    
+                    Provide key insights, differing perspectives, gaps or
+                    contradictions, and note which claims are well supported.
+                    {length}""",
+                    "A structured analysis with key insights and verified information"
+                ),
+                {'query': query, 'results': results, 'length': generation.length_hint('analyst')}
+            )
+            _report('analysis', 'Analysis of a result group complete', analysis)
+            section = await self._run_stage(
+                "section",
+                self._single_task_crew(
+                    self._make_technical_writer(generation),
+                    """Write the parts of the report on "{query}" that this analysis supports.
+                    
+                    Follow the report outline, using only the headings relevant here:
+                    {outline}
+                    
+                    Analysis:
+                    {analysis}
+                    
+                    Write clear, well-organized markdown with examples and data.
+                    {length}""",
+                    "Markdown sections of the report"
+                ),
+                {'query': query, 'outline': await outline, 'analysis': analysis,
+                 'length': generation.length_hint('writer', "Use no more than {words} words.")}
+            )
+            _report('writing', 'Report section drafted', section)
+            return section
+        
+        pipelines = [asyncio.ensure_future(analyse_and_draft(group)) for group in groups]
+        try:
+            sections = await asyncio.gather(*pipelines)
+        except BaseException:
+            for task in [outline, *pipelines]:
+                task.cancel()
+            raise
+        
+        return f"# {query}\n\n" + "\n\n".join(section.strip() for section in sections)
+    
+    async def _run_with_deadline(self, func, *args, timeout: Optional[float] = None, **kwargs):
+        """Run a call bounded by timeout and the caller's deadline.
+        
+        Coroutine functions are awaited on the event loop; blocking calls run
+        on the dedicated executor. The deadline is visible to either through
+        its context. If it expires or the awaiting task is cancelled (client
+        disconnect, MCP cancel) the deadline is cancelled so the crew and its
+        tools stop at their next check.
+        """
+        deadline = Deadline(timeout, parent=current_deadline())
+        with deadline_scope(deadline):
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    call = func(*args, **kwargs)
+                else:
+                    call = run_blocking(func, *args, **kwargs)
+                return await asyncio.wait_for(call, deadline.remaining())
+            except asyncio.TimeoutError:
+                deadline.cancel("exceeded its deadline")
+                raise DeadlineExceeded("Research run exceeded its deadline") from None
+            except asyncio.CancelledError:
+                deadline.cancel("cancelled by caller")
+                raise
+    
+    async def conduct_research(
+        self,
+        query: str,
+        timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        depth: Optional[str] = None
+    ) -> str:
+        """Conduct comprehensive research using the multi-agent crew.
+        
+        Args:
+            query: Research question.
+            timeout: Seconds before the run is abandoned.
+            on_progress: Called with a progress event as each pipeline stage
+                finishes (see ProgressReporter); may run on a worker thread.
+            depth: LinkUp search depth override; full research searches deep by default.
+        
+        Raises:
+            ResearchFailed: The crew or its tools failed.
+            DeadlineExceeded: The run outlived timeout or the caller's deadline.
+        """
+        token = _progress.set(ProgressReporter(on_progress, total=3) if on_progress else None)
+        try:
+            with logged_query(query, "research"):
+                return await self._research(query, timeout, depth)
+        finally:
+            _progress.reset(token)
+    
+    async def _research(
+        self,
+        query: str,
+        timeout: Optional[float],
+        depth: Optional[str]
+    ) -> str:
+        """conduct_research without the progress and query log bookkeeping."""
         try:
-            logger.info(f"Starting research process for query: {query}")
+            logger.info("Starting research process for query: %s", query)
             
-            # Run the crew asynchronously
-            result = await asyncio.to_thread(
-                self.crew.kickoff,
-                inputs={'query': query}
-            )
+            store = get_report_store()
+            model = self.ollama_tool.model_name
+            if self.report_reuse_max_age > 0:
+                # Reports on fast-moving topics are only reused while fresh
+                max_age = min(self.report_reuse_max_age, policy_for(query).ttl)
+                report_id = await run_blocking(store.latest, query, model=model, max_age=max_age)
+                if report_id:
+                    logger.info("Reusing stored report %s for query: %s", report_id, query)
+                    note_cached("research")
+                    return await run_blocking(store.read_text, report_id)
             
+            started = time.monotonic()
+            with run_trace("research", query), search_depth(depth), generation_run(self.governor) as generation:
+                if self.execution_mode == "dag":
+                    with deadline_scope(Deadline(timeout, parent=current_deadline())):
+                        result = await self._conduct_dag(query, generation)
+                else:
+                    # Run the crew, abandoning it at the deadline
+                    result = await self._run_with_deadline(
+                        _kickoff(self._crew_for(generation)),
+                        inputs={
+                            'query': query,
+                            'writer_length': generation.length_hint('writer', "- Stays within about {words} words")
+                        },
+                        timeout=timeout
+                    )
+            RUN_SECONDS.observe(time.monotonic() - started, mode=self.execution_mode)
+            
+            result = str(result)
+            try:
+                await run_blocking(store.save, query, result, model=model)
+            except Exception as e:
+                logger.warning("Could not store report: %s", e)
             logger.info("Research process completed successfully")
-            return str(result)
+            return result
             
+        except DeadlineExceeded:
+            logger.warning("Research aborted for query: %s", query)
+            raise
         except Exception as e:
-            logger.error(f"Error in research process: {str(e)}")
-            return f"Error conducting research: {str(e)}"
+            logger.error("Error in research process: %s", e)
+            raise ResearchFailed(f"Error conducting research: {str(e)}") from e
     
-    async def quick_search(self, query: str) -> str:
-        """Perform a quick search using just the web searcher agent."""
-        try:
-            logger.info(f"Performing quick search for: {query}")
+    async def quick_search(
+        self,
+        query: str,
+        timeout: Optional[float] = None,
+        depth: Optional[str] = None
+    ) -> str:
+        """Perform a quick search using just the web searcher agent.
+        
+        Searches at standard depth unless the query looks like it needs a
+        deep search or depth overrides it.
+        
+        Raises:
+            ResearchFailed: Every search backend failed.
+        """
+        with logged_query(query, "search"):
+            try:
+                logger.info("Performing quick search for: %s", query)
+                
+                # Use just the search tool directly for quick results
+                search_results = await self._run_with_deadline(
+                    self.search_tool.search,
+                    query,
+                    depth or choose_depth(query, default="standard"),
+                    timeout=timeout
+                )
+                
+            except DeadlineExceeded:
+                logger.warning("Quick search aborted for: %s", query)
+                raise
+            except Exception as e:
+                logger.error("Error in quick search: %s", e)
+                raise ResearchFailed(f"Error performing quick search: {str(e)}") from e
             
-            # Use just the search tool directly for quick results
-            search_results = await asyncio.to_thread(
-                self.linkup_tool._run,
-                query
-            )
+            # The search tools report failures as text, which must not pass for results
+            if search_failed(search_results):
+                logger.error("Quick search failed for %s: %s", query, search_results)
+                raise ResearchFailed(search_results)
             
             return f"Quick search results for '{query}':\n\n{search_results}"
-            
-        except Exception as e:
-            logger.error(f"Error in quick search: {str(e)}")
-            return f"Error performing quick search: {str(e)}"
\ No newline at end of file
+    
+    async def stream_quick_answer(
+        self,
+        query: str,
+        timeout: Optional[float] = None,
+        depth: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Quick search followed by a streamed Ollama answer grounded on the results."""
+        deadline = Deadline(timeout, parent=current_deadline())
+        search_results = await self.quick_search(query, timeout=deadline.remaining(), depth=depth)
+        
+        prompt = QUICK_ANSWER_PROMPT.format(query=query, results=search_results)
+        async for chunk in self.ollama_tool.astream_text(
+            prompt, timeout=deadline.remaining(), source="http_stream"
+        ):
+            yield chunk
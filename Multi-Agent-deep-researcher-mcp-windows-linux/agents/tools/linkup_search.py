@@ -5,13 +5,104 @@ This tool implements web search functionality using the LinkUp API.
 """
 
 import os
+import re
+import json
+import time
 import requests
 import logging
-from typing import Any, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional, Tuple
 from crewai.tools import BaseTool
 
+from runtime.canonical import query_key
+from runtime.cassette import get_cassette
+from runtime.deadline import call_timeout
+from runtime.evidence import canonical_url, get_evidence_pool
+from runtime.freshness import get_fresh_cache
+from runtime.hedging import Hedger
+from runtime.memory import PayloadBuffer
+from runtime.metrics import REGISTRY
+from runtime.query_log import note_cached
+
 logger = logging.getLogger(__name__)
 
+# LinkUp search depths: "standard" is fast and cheap, "deep" runs an agentic
+# multi-step search that is several times slower and pricier
+DEPTHS = ("standard", "deep")
+COST_PER_CALL = {
+    "standard": float(os.getenv('LINKUP_COST_STANDARD', '0.005')),
+    "deep": float(os.getenv('LINKUP_COST_DEEP', '0.05')),
+}
+
+LINKUP_SECONDS = REGISTRY.histogram(
+    "linkup_request_seconds", "LinkUp API call time, by depth",
+    # Above the 30 s request timeout too, so timeouts do not land in +Inf
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60)
+)
+LINKUP_REQUESTS = REGISTRY.counter("linkup_requests_total", "LinkUp API calls, by depth and outcome")
+LINKUP_COST = REGISTRY.counter("linkup_cost_total", "Estimated LinkUp spend, by depth")
+
+# Slow LinkUp calls are retried in parallel once they pass the p90 for their depth
+_hedger = Hedger("linkup", LINKUP_SECONDS)
+
+# Questions that need the breadth of a deep search even from quick search
+_NEEDS_DEEP = re.compile(
+    r"\b(?:compare|comparison|versus|vs\.?|pros and cons|trade-?offs?|in-depth|comprehensive|"
+    r"detailed|analy[sz]e|analysis|survey|state of the art|impact of|history of)\b",
+    re.IGNORECASE,
+)
+
+SOURCE_SUMMARY_PROMPT = """Summarize the web page below in at most three sentences for a researcher.
+Keep concrete facts, figures and dates; do not add anything that is not in the text.
+
+Title: {title}
+
+{content}
+
+Summary:"""
+
+# Longest source text sent for summarizing
+SOURCE_SUMMARY_MAX_CHARS = 4000
+
+
+class LinkUpError(Exception):
+    """A LinkUp search failed; str() is the message shown instead of results."""
+
+
+# Start of the messages searches return instead of results; agents read them
+# as tool output, so failures are text rather than exceptions
+FAILURE_PREFIXES = ("Search failed", "Network error", "Unexpected error", "Error")
+
+
+def search_failed(result: str) -> bool:
+    """True if a search returned a failure message instead of results."""
+    return result.startswith(FAILURE_PREFIXES)
+
+
+_depth_override: ContextVar[Optional[str]] = ContextVar("linkup_depth", default=None)
+
+
+@contextmanager
+def search_depth(depth: Optional[str]) -> Iterator[None]:
+    """Force the depth of LinkUp searches made in this context; None keeps it automatic."""
+    token = _depth_override.set(depth)
+    try:
+        yield
+    finally:
+        _depth_override.reset(token)
+
+
+def choose_depth(query: str, default: str = "deep") -> str:
+    """Depth for a search: a search_depth() override, else default, with
+    standard escalated to deep for comparative or analytical questions."""
+    override = _depth_override.get()
+    if override:
+        return override
+    if default == "standard" and (_NEEDS_DEEP.search(query) or len(query.split()) > 20):
+        return "deep"
+    return default
+
 class LinkUpSearchTool(BaseTool):
     """Tool for performing web searches using LinkUp API."""
     
@@ -23,62 +114,175 @@ class LinkUpSearchTool(BaseTool):
         # Store API configuration as instance attributes
         self._api_key = os.getenv('LINKUP_API_KEY')
         self._base_url = "https://api.linkup.so/v1/search"
+        # TTLs follow the query's freshness class; SEARCH_CACHE_TTL=0 turns caching off
+        self._cache = get_fresh_cache("linkup:search") if float(os.getenv('SEARCH_CACHE_TTL', '900')) > 0 else None
+        self._summarize: Optional[Callable[[str], str]] = None
         
         if not self._api_key:
             logger.warning("LinkUp API key not found. Web search may not work properly.")
     
+    def use_evidence_pool(self, summarize: Callable[[str], str]) -> None:
+        """Replace long result snippets with pooled LLM summaries.
+        
+        Args:
+            summarize: Generates a summary for a SOURCE_SUMMARY_PROMPT; only
+                called for sources the evidence pool has not seen.
+        """
+        self._summarize = summarize
+    
     def _run(self, query: str) -> str:
         """Execute web search using LinkUp API."""
-        if not self._api_key:
+        return self.search(query)
+    
+    def search(self, query: str, depth: Optional[str] = None) -> str:
+        """Search LinkUp, through the cache.
+        
+        Args:
+            query: Search query.
+            depth: "standard" or "deep"; defaults to choose_depth(query), which
+                is deep unless overridden, as agents call this during full research.
+        """
+        depth = depth or choose_depth(query)
+        cassette = get_cassette()
+        if not self._api_key and not (cassette and cassette.replaying):
             return "Error: LinkUp API key not configured. Please set LINKUP_API_KEY environment variable."
         
+        if self._cache is None:
+            return self._hedged_search(query, depth)
+        
+        computed = False
+        
+        def compute() -> str:
+            nonlocal computed
+            computed = True
+            return self._hedged_search(query, depth)
+        
+        # Shared across workers so concurrent identical queries hit LinkUp once;
+        # stale entries are served while a background refresh runs
+        result = self._cache.get(
+            query_key(query, namespace=depth),
+            query,
+            compute,
+            should_cache=self._is_cacheable,
+            wait_timeout=35,
+        )
+        if not computed:
+            note_cached("search")
+        return result
+    
+    @staticmethod
+    def _is_cacheable(result: str) -> bool:
+        """Only successful searches are cached; errors should be retried."""
+        return not search_failed(result)
+    
+    def _hedged_search(self, query: str, depth: str) -> str:
+        """Search LinkUp without the cache, with a duplicate request if the first is slower than usual.
+        
+        Only the LinkUp call is hedged; results are formatted (and long
+        sources summarized) once, after the race, so summarizing neither
+        delays an attempt into a hedge nor counts towards LinkUp latency.
+        """
+        cassette = get_cassette()
+        try:
+            if cassette is not None and cassette.replaying:
+                results = self.fetch_results(query, depth)
+            else:
+                results = _hedger.call(
+                    lambda attempt: self.fetch_results(query, depth),
+                    labels={"depth": depth},
+                )
+        except LinkUpError as e:
+            return str(e)
+        return self.format_results(results)
+    
+    def fetch_results(self, query: str, depth: str = "deep") -> List[dict]:
+        """Raw LinkUp results (title, url, content), without cache or hedging.
+        
+        Raises:
+            LinkUpError: The search failed; the message is meant for the user.
+        """
+        cassette = get_cassette()
+        if not self._api_key and not (cassette and cassette.replaying):
+            raise LinkUpError("Error: LinkUp API key not configured. Please set LINKUP_API_KEY environment variable.")
+        
+        # Raises DeadlineExceeded if the run was abandoned before we got here
+        timeout = call_timeout(30)
+        
+        started = time.monotonic()
+        outcome = "error"
         try:
-            headers = {
-                "Authorization": f"Bearer {self._api_key}",
-                "Content-Type": "application/json"
-            }
-            
             payload = {
                 "q": query,
-                "depth": "deep",
+                "depth": depth,
                 "outputType": "searchResults"
             }
             
-            logger.info(f"Searching LinkUp for: {query}")
-            response = requests.post(self._base_url, headers=headers, json=payload, timeout=30)
+            if cassette is not None:
+                status, body = cassette.call("linkup", payload, lambda: self._post(payload, timeout))
+            else:
+                status, body = self._post(payload, timeout)
             
-            if response.status_code == 200:
-                data = response.json()
-                return self._format_search_results(data)
+            if status == 200:
+                outcome = "ok"
+                if not (cassette and cassette.replaying):
+                    LINKUP_COST.inc(COST_PER_CALL[depth], depth=depth)
+                return json.loads(body).get('results', [])
             else:
-                logger.error(f"LinkUp API error: {response.status_code} - {response.text}")
-                return f"Search failed with status {response.status_code}: {response.text}"
+                logger.error("LinkUp API error: %s - %s", status, body)
+                raise LinkUpError(f"Search failed with status {status}: {body}")
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"Network error during search: {str(e)}")
-            return f"Network error during search: {str(e)}"
+            logger.error("Network error during search: %s", e)
+            raise LinkUpError(f"Network error during search: {str(e)}") from e
+        except LinkUpError:
+            raise
         except Exception as e:
-            logger.error(f"Unexpected error during search: {str(e)}")
-            return f"Unexpected error during search: {str(e)}"
+            logger.error("Unexpected error during search: %s", e)
+            raise LinkUpError(f"Unexpected error during search: {str(e)}") from e
+        finally:
+            LINKUP_SECONDS.observe(time.monotonic() - started, depth=depth)
+            LINKUP_REQUESTS.inc(depth=depth, outcome=outcome)
     
-    def _format_search_results(self, data: dict) -> str:
+    def _post(self, payload: dict, timeout: float) -> Tuple[int, str]:
+        """POST a search to LinkUp; returns the status code and response body."""
+        headers = {
+            "Authorization": f"Bearer {self._api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        logger.info("Searching LinkUp (%s) for: %s", payload["depth"], payload["q"])
+        response = requests.post(self._base_url, headers=headers, json=payload, timeout=timeout, stream=True)
+        
+        # Deep searches can return megabytes of JSON; the body is charged to
+        # the run while it is held
+        with response, PayloadBuffer("linkup") as body:
+            for chunk in response.iter_content(chunk_size=65536):
+                body.write(chunk)
+            return response.status_code, body.text()
+    
+    def format_results(self, results: List[dict]) -> str:
         """Format search results into a readable string."""
         try:
-            results = data.get('results', [])
-            
             if not results:
                 return "No search results found."
             
+            # The same page often comes back under several URLs
+            unique = {}
+            for result in results:
+                unique.setdefault(canonical_url(result.get('url', '')), result)
+            top = list(unique.values())[:10]  # Limit to top 10 results
+            summaries = self._summaries(top)
+            
             formatted_results = []
             formatted_results.append(f"Web Search Results ({len(results)} results found):\n")
             
-            for i, result in enumerate(results[:10], 1):  # Limit to top 10 results
+            for i, (result, summary) in enumerate(zip(top, summaries), 1):
                 title = result.get('title', 'No title')
                 url = result.get('url', 'No URL')
-                snippet = result.get('content', result.get('snippet', 'No description available'))
+                snippet = summary or result.get('content', result.get('snippet', 'No description available'))
                 
                 # Truncate snippet if too long
-                if len(snippet) > 300:
+                if len(snippet) > 300 and not summary:
                     snippet = snippet[:300] + "..."
                 
                 formatted_results.append(f"{i}. **{title}**")
@@ -89,9 +293,34 @@ class LinkUpSearchTool(BaseTool):
             return "\n".join(formatted_results)
             
         except Exception as e:
-            logger.error(f"Error formatting search results: {str(e)}")
+            logger.error("Error formatting search results: %s", e)
             return f"Error formatting search results: {str(e)}"
     
+    def _summaries(self, results: list) -> list:
+        """Pooled summaries of results whose content is too long to show whole."""
+        if self._summarize is None:
+            return [None] * len(results)
+        long_sources = [
+            (i, result) for i, result in enumerate(results) if len(result.get('content') or '') > 300
+        ]
+        pooled = get_evidence_pool().summaries(
+            [
+                (
+                    result.get('url', ''),
+                    result['content'],
+                    SOURCE_SUMMARY_PROMPT.format(
+                        title=result.get('title', ''), content=result['content'][:SOURCE_SUMMARY_MAX_CHARS]
+                    )
+                )
+                for _, result in long_sources
+            ],
+            self._summarize
+        )
+        summaries = [None] * len(results)
+        for (i, _), summary in zip(long_sources, pooled):
+            summaries[i] = summary
+        return summaries
+    
     async def _arun(self, query: str) -> str:
         """Async version of the search."""
         return self._run(query)
\ No newline at end of file
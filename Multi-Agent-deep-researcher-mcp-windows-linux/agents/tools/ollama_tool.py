@@ -5,17 +5,262 @@ This tool provides integration with Ollama for local LLM processing.
 """
 
 import os
+import json
+import time
+import asyncio
+import itertools
 import requests
 import logging
-from typing import Any, Optional, Dict
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from runtime.cassette import get_cassette, recorded_stream
+from runtime.deadline import Deadline, DeadlineExceeded, call_timeout, check_deadline, current_deadline, deadline_scope
+from runtime.executor import submit_blocking
+from runtime.governor import GenerationSettings
+from runtime.hedging import Hedger
+from runtime.memory import PayloadBuffer
+from runtime.metrics import REGISTRY
+
+try:
+    from crewai import LLM
+except ImportError:  # CrewAI before explicit LLM configuration
+    LLM = None
+
+try:
+    from crewai import BaseLLM
+except ImportError:  # CrewAI before custom LLM support
+    BaseLLM = None
 
 logger = logging.getLogger(__name__)
 
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "ollama_time_to_first_token_seconds", "Time from request to first generated chunk"
+)
+GENERATION_SECONDS = REGISTRY.histogram("ollama_generation_seconds", "Total streamed generation time")
+GENERATED_TOKENS = REGISTRY.counter("ollama_generated_tokens_total", "Chunks received from Ollama streams")
+
+# With several Ollama nodes, a generation whose first token is slower than the
+# p90 is duplicated on the next node and the slower stream is closed
+_hedger = Hedger("ollama", TIME_TO_FIRST_TOKEN)
+_next_node = itertools.count()
+
+
+class OllamaError(Exception):
+    """Raised when Ollama rejects or fails a generation request."""
+
+
+def _generate_chunks(base_url: str, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield the decoded NDJSON chunks of a streamed /api/generate call."""
+    with requests.post(f"{base_url}/api/generate", json=payload, stream=True, timeout=call_timeout(120)) as response:
+        if response.status_code != 200:
+            raise OllamaError(f"Ollama generation failed: {response.status_code}")
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def stream_generate(
+    base_url: str,
+    model: str,
+    prompt: str,
+    stop: Optional[List[str]] = None,
+    max_tokens: Optional[int] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    source: str = "tool",
+    **kwargs
+) -> Iterator[str]:
+    """Yield generated text from Ollama's NDJSON stream as it arrives.
+    
+    Generation stops early at the first stop sequence (which is not yielded)
+    or after max_tokens chunks; closing the connection makes Ollama stop
+    generating too. The current run's deadline is checked between chunks.
+    
+    Args:
+        base_url: Ollama server URL.
+        model: Model name.
+        prompt: Prompt text.
+        stop: Stop sequences, also forwarded to Ollama.
+        max_tokens: Token budget, also forwarded as num_predict.
+        on_token: Called with every chunk before it is yielded.
+        source: Label for the time-to-first-token metric.
+        **kwargs: Extra fields for the /api/generate payload.
+    """
+    options = dict(kwargs.pop('options', None) or {})
+    if stop:
+        options['stop'] = list(stop)
+    if max_tokens:
+        options['num_predict'] = max_tokens
+    
+    payload = {"model": model, "prompt": prompt, "stream": True, **kwargs}
+    if options:
+        payload['options'] = options
+    
+    # Hold back enough characters to catch a stop sequence split across chunks
+    holdback = max((len(s) for s in stop), default=1) - 1 if stop else 0
+    pending = ""
+    tokens = 0
+    started = time.monotonic()
+    
+    def emit(text: str) -> Iterator[str]:
+        if text:
+            if on_token:
+                on_token(text)
+            yield text
+    
+    # Recorded or replayed when a cassette is active; the node does not matter
+    chunks = recorded_stream("ollama", payload, lambda: _generate_chunks(base_url, payload))
+    try:
+        for chunk in chunks:
+            check_deadline()
+            if chunk.get('error'):
+                raise OllamaError(chunk['error'])
+            
+            piece = chunk.get('response', '')
+            if piece:
+                if tokens == 0:
+                    TIME_TO_FIRST_TOKEN.observe(time.monotonic() - started, source=source)
+                tokens += 1
+                pending += piece
+                
+                if stop:
+                    cut = min((i for i in (pending.find(s) for s in stop) if i >= 0), default=-1)
+                    if cut >= 0:
+                        yield from emit(pending[:cut])
+                        pending = ""
+                        break
+                
+                safe = len(pending) - holdback
+                if safe > 0:
+                    yield from emit(pending[:safe])
+                    pending = pending[safe:]
+                
+                if max_tokens and tokens >= max_tokens:
+                    break
+            
+            if chunk.get('done'):
+                break
+        chunks.finish()
+    finally:
+        chunks.close()
+    
+    yield from emit(pending)
+    GENERATED_TOKENS.inc(tokens, source=source)
+    GENERATION_SECONDS.observe(time.monotonic() - started, source=source)
+
+def hedged_stream(
+    base_urls: List[str],
+    model: str,
+    prompt: str,
+    on_token: Optional[Callable[[str], None]] = None,
+    source: str = "tool",
+    **kwargs
+) -> Iterator[str]:
+    """stream_generate spread over Ollama nodes, hedged on time to first token.
+    
+    Each generation starts on the next node in turn; if its first token is
+    late, the same request goes to the following node and the first stream
+    to produce a token is used. With one node this is plain stream_generate.
+    """
+    cassette = get_cassette()
+    # Replayed generations are deterministic; a hedge would only consume a recording
+    if len(base_urls) < 2 or (cassette is not None and cassette.replaying):
+        yield from stream_generate(base_urls[0], model, prompt, on_token=on_token, source=source, **kwargs)
+        return
+    
+    first_node = next(_next_node)
+    
+    def open_stream(attempt: int):
+        url = base_urls[(first_node + attempt) % len(base_urls)]
+        stream = stream_generate(url, model, prompt, source=source, **kwargs)
+        return next(stream, None), stream
+    
+    first, stream = _hedger.call(
+        open_stream,
+        labels={"source": source},
+        discard=lambda opened: opened[1].close()
+    )
+    # on_token is applied here so a losing stream never reports tokens
+    for piece in itertools.chain([first] if first is not None else [], stream):
+        if on_token:
+            on_token(piece)
+        yield piece
+
+
+def _post_chat(base_url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    response = requests.post(f"{base_url}/api/chat", json=payload, timeout=call_timeout(300))
+    if response.status_code != 200:
+        raise OllamaError(f"Ollama chat failed: {response.status_code}")
+    return response.json()
+
+
+def chat(
+    base_urls: List[str],
+    model: str,
+    messages: List[Dict[str, str]],
+    stop: Optional[List[str]] = None,
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """One non-streamed /api/chat completion, through the cassette when one is active."""
+    payload = {"model": model, "messages": messages, "stream": False}
+    options = dict(options or {})
+    if stop:
+        options['stop'] = list(stop)
+    if options:
+        payload['options'] = options
+    url = base_urls[next(_next_node) % len(base_urls)]
+    cassette = get_cassette()
+    if cassette is not None:
+        data = cassette.call("ollama.chat", payload, lambda: _post_chat(url, payload))
+    else:
+        data = _post_chat(url, payload)
+    if data.get('error'):
+        raise OllamaError(data['error'])
+    return data.get('message', {}).get('content', '')
+
+
+if BaseLLM is not None:
+    class OllamaChatLLM(BaseLLM):
+        """CrewAI LLM that calls Ollama through chat() instead of LiteLLM.
+        
+        Used for agents while a cassette is active, so their calls are
+        recorded and replayed along with the tools'.
+        """
+        
+        def __init__(self, model: str, base_urls: List[str], settings: Optional[GenerationSettings] = None):
+            super().__init__(model=model)
+            self.base_urls = base_urls
+            self.options = settings.options() if settings else {}
+            self.max_tokens = self.options.get('num_predict')
+        
+        def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs) -> str:
+            if isinstance(messages, str):
+                messages = [{"role": "user", "content": messages}]
+            options = dict(self.options)
+            if self.max_tokens:
+                options['num_predict'] = self.max_tokens
+            return chat(self.base_urls, self.model, messages, stop=getattr(self, 'stop', None), options=options)
+        
+        def supports_function_calling(self) -> bool:
+            return False
+
+
+def collect_text(pieces: Iterator[str]) -> str:
+    """Join streamed chunks, accounting them to the current run."""
+    with PayloadBuffer("ollama") as buffer:
+        for piece in pieces:
+            buffer.write(piece)
+        return buffer.text()
+
+
 class OllamaLLMTool:
     """Tool for interacting with Ollama local LLMs."""
     
     def __init__(self):
         self.base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+        # Optional comma-separated list of interchangeable nodes for load spreading and hedging
+        self.base_urls = [
+            url.strip() for url in os.getenv('OLLAMA_BASE_URLS', '').split(',') if url.strip()
+        ] or [self.base_url]
         self.model_name = os.getenv('MODEL_NAME', 'phi3:latest')
         self.headers = {'Content-Type': 'application/json'}
     
@@ -24,34 +269,48 @@ class OllamaLLMTool:
         # Use string-based configuration which works with newer CrewAI versions
         return f"ollama/{self.model_name}"
     
+    def agent_llm(self, settings: Optional[GenerationSettings] = None) -> Optional[Any]:
+        """LLM for a CrewAI agent with the given generation settings.
+        
+        While a cassette is recording or replaying, calls go through chat()
+        so they are captured. Returns None (CrewAI configures the LLM from
+        the environment) when this CrewAI version cannot take the settings.
+        """
+        if get_cassette() is not None:
+            if BaseLLM is not None:
+                return OllamaChatLLM(self.model_name, self.base_urls, settings)
+            logger.warning("This CrewAI version has no BaseLLM; agent LLM calls bypass the cassette")
+        if settings is None or LLM is None:
+            return None
+        return LLM(
+            model=self.get_llm(),
+            base_url=self.base_url,
+            temperature=settings.temperature,
+            max_tokens=settings.num_predict,
+            num_ctx=settings.num_ctx
+        )
+    
     def _create_fallback_llm(self):
         """Create a fallback LLM configuration."""
         class FallbackLLM:
-            def __init__(self, model_name: str, base_url: str):
+            def __init__(self, model_name: str, base_urls: List[str]):
                 self.model_name = model_name
-                self.base_url = base_url
+                self.base_urls = base_urls
             
             def generate(self, prompt: str) -> str:
                 return self._call_ollama(prompt)
             
             def _call_ollama(self, prompt: str) -> str:
                 try:
-                    url = f"{self.base_url}/api/generate"
-                    payload = {
-                        "model": self.model_name,
-                        "prompt": prompt,
-                        "stream": False
-                    }
-                    
-                    response = requests.post(url, json=payload, timeout=120)
-                    if response.status_code == 200:
-                        return response.json().get('response', '')
-                    else:
-                        return f"Error: {response.status_code}"
+                    return collect_text(hedged_stream(self.base_urls, self.model_name, prompt))
+                except DeadlineExceeded:
+                    raise
+                except OllamaError as e:
+                    return f"Error: {str(e)}"
                 except Exception as e:
                     return f"Error calling Ollama: {str(e)}"
         
-        return FallbackLLM(self.model_name, self.base_url)
+        return FallbackLLM(self.model_name, self.base_urls)
     
     def check_model_availability(self) -> bool:
         """Check if the specified model is available in Ollama."""
@@ -64,11 +323,11 @@ class OllamaLLMTool:
                 available_models = [model['name'] for model in models]
                 return self.model_name in available_models
             else:
-                logger.error(f"Failed to check Ollama models: {response.status_code}")
+                logger.error("Failed to check Ollama models: %s", response.status_code)
                 return False
                 
         except Exception as e:
-            logger.error(f"Error checking Ollama model availability: {str(e)}")
+            logger.error("Error checking Ollama model availability: %s", e)
             return False
     
     def pull_model(self) -> bool:
@@ -77,39 +336,76 @@ class OllamaLLMTool:
             url = f"{self.base_url}/api/pull"
             payload = {"name": self.model_name}
             
-            logger.info(f"Pulling model {self.model_name}...")
+            logger.info("Pulling model %s...", self.model_name)
             response = requests.post(url, json=payload, timeout=300)
             
             if response.status_code == 200:
-                logger.info(f"Model {self.model_name} pulled successfully")
+                logger.info("Model %s pulled successfully", self.model_name)
                 return True
             else:
-                logger.error(f"Failed to pull model: {response.status_code}")
+                logger.error("Failed to pull model: %s", response.status_code)
                 return False
                 
         except Exception as e:
-            logger.error(f"Error pulling model: {str(e)}")
+            logger.error("Error pulling model: %s", e)
             return False
     
+    def stream_text(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Stream generated text chunk by chunk; see stream_generate for options."""
+        return hedged_stream(self.base_urls, self.model_name, prompt, **kwargs)
+    
+    async def astream_text(self, prompt: str, timeout: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+        """Async iterator over generated chunks.
+        
+        The blocking stream runs on the dedicated executor. Leaving the loop early
+        (or the consumer being cancelled) cancels the generation's deadline,
+        which closes the Ollama connection at the next chunk.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        deadline = Deadline(timeout, parent=current_deadline())
+        finished = object()
+        
+        def produce():
+            with deadline_scope(deadline):
+                try:
+                    for piece in self.stream_text(prompt, **kwargs):
+                        loop.call_soon_threadsafe(queue.put_nowait, piece)
+                    item = finished
+                except BaseException as e:
+                    item = e
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # Event loop already closed
+        
+        submit_blocking(loop, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            deadline.cancel("stream closed by consumer")
+    
+    def summarize_source(self, prompt: str) -> str:
+        """Short, low-temperature generation for evidence pool summaries; raises on failure."""
+        return collect_text(self.stream_text(
+            prompt,
+            max_tokens=int(os.getenv('EVIDENCE_SUMMARY_TOKENS', '150')),
+            options={'temperature': 0.2},
+            source="evidence"
+        )).strip()
+    
     def generate_text(self, prompt: str, **kwargs) -> str:
         """Generate text using the Ollama model."""
         try:
-            url = f"{self.base_url}/api/generate"
-            payload = {
-                "model": self.model_name,
-                "prompt": prompt,
-                "stream": False,
-                **kwargs
-            }
-            
-            response = requests.post(url, json=payload, timeout=120)
-            
-            if response.status_code == 200:
-                return response.json().get('response', '')
-            else:
-                logger.error(f"Ollama generation failed: {response.status_code}")
-                return f"Error generating text: {response.status_code}"
-                
+            return collect_text(self.stream_text(prompt, **kwargs))
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            logger.error(f"Error generating text: {str(e)}")
-            return f"Error generating text: {str(e)}"
\ No newline at end of file
+            logger.error("Error generating text: %s", e)
+            return f"Error generating text: {str(e)}"
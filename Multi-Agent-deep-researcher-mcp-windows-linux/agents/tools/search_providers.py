@@ -0,0 +1,446 @@
+"""
+Search Providers
+
+Quick search is no longer tied to LinkUp. A SearchProvider returns raw results
+(title, url, content) for a query; LinkUp, a local full-text index and a stub
+for tests implement it. FanoutSearch sends each query to the configured
+providers concurrently and either answers with the first provider that
+returns results ("first") or merges whatever arrived within a short wait
+("merge").
+
+Routing adapts to observed latency: providers are ranked by their recent
+median latency divided by their success rate, only the best SEARCH_FANOUT of
+them are queried, and in merge mode a provider too slow to ever make the
+wait is skipped. Every PROBE_EVERY-th query still goes to all providers, so
+one that recovers is noticed.
+"""
+
+import os
+import re
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from runtime.canonical import STOPWORDS, query_key
+from runtime.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
+from runtime.evidence import canonical_url
+from runtime.freshness import get_fresh_cache
+from runtime.metrics import REGISTRY
+from runtime.profiling import attributed
+from runtime.query_log import note_cached
+from runtime.state import DEFAULT_SQLITE_PATH
+
+from .linkup_search import LinkUpSearchTool, search_failed
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("first", "merge")
+DEFAULT_INDEX_PATH = DEFAULT_SQLITE_PATH.parent / "search_index.db"
+
+PROVIDER_SECONDS = REGISTRY.histogram(
+    "search_provider_seconds", "Search provider call time, by provider",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30)
+)
+PROVIDER_REQUESTS = REGISTRY.counter("search_provider_requests_total", "Search provider calls, by provider and outcome")
+FANOUT_WINNERS = REGISTRY.counter("search_fanout_answers_total", "Providers whose results answered a fan-out search, by policy")
+
+_WORDS = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchProvider:
+    """A source of search results.
+    
+    search() returns a list of dicts with "title", "url" and "content" and
+    raises on failure; an empty list means the provider found nothing.
+    """
+    
+    name: str = "provider"
+    
+    def search(self, query: str, depth: str) -> List[Dict[str, str]]:
+        raise NotImplementedError
+
+
+class LinkUpProvider(SearchProvider):
+    """LinkUp web search."""
+    
+    name = "linkup"
+    
+    def __init__(self, tool: LinkUpSearchTool):
+        self.tool = tool
+    
+    def search(self, query: str, depth: str) -> List[Dict[str, str]]:
+        return self.tool.fetch_results(query, depth)
+
+
+class LocalIndexProvider(SearchProvider):
+    """Full-text search (SQLite FTS5, stemmed, BM25 ranking) over locally indexed documents.
+    
+    A document matches only if it contains every non-filler term of the query.
+    
+    Args:
+        path: Index database; created when missing.
+    """
+    
+    name = "local"
+    
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents "
+            "USING fts5(url UNINDEXED, title, content, tokenize='porter unicode61')"
+        )
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            self._local.conn = conn
+        return conn
+    
+    def add(self, url: str, title: str, content: str) -> None:
+        """Index a document, replacing an earlier one with the same URL."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM documents WHERE url = ?", (url,))
+            conn.execute("INSERT INTO documents (url, title, content) VALUES (?, ?, ?)", (url, title, content))
+    
+    def index_directory(self, directory: Path, patterns: Sequence[str] = ("*.md", "*.txt")) -> int:
+        """Index every matching file under directory; returns how many."""
+        count = 0
+        for pattern in patterns:
+            for file in sorted(Path(directory).rglob(pattern)):
+                text = file.read_text(encoding="utf-8", errors="replace")
+                title = next((line.lstrip("# ").strip() for line in text.splitlines() if line.strip()), file.stem)
+                self.add(file.resolve().as_uri(), title, text)
+                count += 1
+        return count
+    
+    def search(self, query: str, depth: str, limit: int = 10) -> List[Dict[str, str]]:
+        terms = [term for term in _WORDS.findall(query.lower()) if term not in STOPWORDS]
+        if not terms:
+            return []
+        # Every term must match: a document sharing one word with the query is
+        # not an answer, and under the "first" policy it would beat LinkUp
+        match = " AND ".join(f'"{term}"' for term in terms)
+        rows = self._connect().execute(
+            "SELECT url, title, content FROM documents WHERE documents MATCH ? ORDER BY bm25(documents) LIMIT ?",
+            (match, limit),
+        ).fetchall()
+        return [{"url": url, "title": title, "content": content[:2000]} for url, title, content in rows]
+
+
+class StubProvider(SearchProvider):
+    """Canned results after a configurable delay, for tests and load testing.
+    
+    Args:
+        name: Provider name in metrics.
+        latency: Mean seconds per search (exponentially distributed when jitter is set).
+        jitter: Draw latency from an exponential distribution instead of a fixed delay.
+        failure_rate: Fraction of searches that raise.
+        results: Results returned per search.
+    """
+    
+    def __init__(
+        self,
+        name: str = "stub",
+        latency: float = 0.0,
+        jitter: bool = False,
+        failure_rate: float = 0.0,
+        results: int = 5
+    ):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.results = results
+    
+    def search(self, query: str, depth: str) -> List[Dict[str, str]]:
+        delay = random.expovariate(1 / self.latency) if self.jitter and self.latency > 0 else self.latency
+        if delay > 0:
+            time.sleep(delay)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError(f"{self.name} search failed (simulated)")
+        slug = hashlib.sha1(query.encode("utf-8")).hexdigest()[:10]
+        return [
+            {
+                "url": f"https://{self.name}.example/{slug}/{i}",
+                "title": f"{query} - result {i}",
+                "content": f"Stub {depth} result {i} from {self.name} for: {query}",
+            }
+            for i in range(1, self.results + 1)
+        ]
+
+
+class ProviderStats:
+    """Recent latency and success of each provider, for routing."""
+    
+    def __init__(self, window: int = 50, min_samples: int = 5):
+        self.min_samples = min_samples
+        self._window = window
+        self._latency: Dict[str, Deque[float]] = {}
+        self._success: Dict[str, Deque[bool]] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, provider: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._latency.setdefault(provider, deque(maxlen=self._window)).append(seconds)
+            self._success.setdefault(provider, deque(maxlen=self._window)).append(ok)
+    
+    def median(self, provider: str) -> Optional[float]:
+        """Median recent latency, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._latency.get(provider, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[len(samples) // 2]
+    
+    def score(self, provider: str) -> float:
+        """Expected seconds to a good answer; lower is better, 0 while unmeasured."""
+        median = self.median(provider)
+        if median is None:
+            return 0.0  # Unmeasured providers are tried first so they get measured
+        with self._lock:
+            outcomes = self._success.get(provider, ())
+            success = sum(outcomes) / len(outcomes) if outcomes else 1.0
+        return median / max(success, 0.05)
+    
+    def report(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with self._lock:
+            providers = list(self._latency)
+        return {provider: {"median_seconds": self.median(provider), "score": self.score(provider)}
+                for provider in providers}
+
+
+class FanoutSearch:
+    """Concurrent search over several providers, through the search cache.
+    
+    Args:
+        providers: Providers in configured order (ties in routing keep it).
+        format_results: Turns the chosen results into the text quick search returns.
+        policy: "first" answers with the first provider to return results;
+            "merge" interleaves the results of all providers that answer
+            within merge_wait seconds.
+        merge_wait: Seconds merge mode waits for slower providers.
+        fanout: Providers queried per search (the best-ranked ones); 0 means all.
+        probe_every: Every Nth search queries all providers regardless of rank.
+        max_workers: Threads for provider calls.
+    """
+    
+    def __init__(
+        self,
+        providers: Sequence[SearchProvider],
+        format_results: Callable[[List[Dict[str, str]]], str],
+        policy: str = "first",
+        merge_wait: float = 3.0,
+        fanout: int = 0,
+        probe_every: int = 20,
+        max_workers: int = 16
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Search policy must be one of {', '.join(POLICIES)}")
+        if not providers:
+            raise ValueError("At least one search provider is required")
+        self.providers = list(providers)
+        self.format_results = format_results
+        self.policy = policy
+        self.merge_wait = merge_wait
+        self.fanout = fanout
+        self.probe_every = probe_every
+        self.stats = ProviderStats()
+        self._calls = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search-provider")
+        self._cache = (
+            get_fresh_cache("search:fanout") if float(os.getenv('SEARCH_CACHE_TTL', '900')) > 0 else None
+        )
+    
+    def search(self, query: str, depth: str) -> str:
+        """Formatted results for a query, through the cache."""
+        if self._cache is None:
+            return self._search(query, depth)
+        
+        computed = False
+        
+        def compute() -> str:
+            nonlocal computed
+            computed = True
+            return self._search(query, depth)
+        
+        names = ",".join(provider.name for provider in self.providers)
+        result = self._cache.get(
+            query_key(query, namespace=f"{depth}:{self.policy}:{names}"),
+            query,
+            compute,
+            should_cache=lambda result: not search_failed(result),
+            wait_timeout=35,
+        )
+        if not computed:
+            note_cached("search")
+        return result
+    
+    def route(self) -> List[SearchProvider]:
+        """Providers to query for the next search, best first."""
+        ranked = sorted(self.providers, key=lambda provider: self.stats.score(provider.name))
+        with self._lock:
+            self._calls += 1
+            probing = self.probe_every > 0 and self._calls % self.probe_every == 0
+        if probing:
+            return ranked
+        if self.policy == "merge":
+            # A provider whose median is past the wait would only ever be ignored
+            in_time = [p for p in ranked if (self.stats.median(p.name) or 0.0) <= self.merge_wait]
+            ranked = in_time or ranked[:1]
+        return ranked[:self.fanout] if self.fanout > 0 else ranked
+    
+    def _call(self, provider: SearchProvider, query: str, depth: str) -> List[Dict[str, str]]:
+        started = time.monotonic()
+        ok = False
+        try:
+            results = provider.search(query, depth)
+            ok = True
+            return results
+        finally:
+            elapsed = time.monotonic() - started
+            self.stats.observe(provider.name, elapsed, ok)
+            PROVIDER_SECONDS.observe(elapsed, provider=provider.name)
+            PROVIDER_REQUESTS.inc(provider=provider.name, outcome="ok" if ok else "error")
+    
+    def _search(self, query: str, depth: str) -> str:
+        providers = self.route()
+        parent = current_deadline()
+        attempts: Dict[Future, Tuple[SearchProvider, Deadline]] = {}
+        for provider in providers:
+            deadline = Deadline(parent=parent)
+            context = contextvars.copy_context()
+            future = self._executor.submit(
+                context.run, attributed(_run_in_scope), deadline, self._call, provider, query, depth
+            )
+            attempts[future] = (provider, deadline)
+        
+        answers: Dict[str, List[Dict[str, str]]] = {}
+        errors: List[str] = []
+        give_up_at = time.monotonic() + self.merge_wait if self.policy == "merge" else None
+        pending = set(attempts)
+        try:
+            while pending:
+                timeout = None
+                if give_up_at is not None:
+                    timeout = give_up_at - time.monotonic()
+                if parent is not None and parent.remaining() is not None:
+                    timeout = parent.remaining() if timeout is None else min(timeout, parent.remaining())
+                if timeout is not None and timeout <= 0:
+                    break
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    provider = attempts[future][0]
+                    error = future.exception()
+                    if isinstance(error, DeadlineExceeded) and parent is not None and parent.expired:
+                        raise error
+                    if error is not None:
+                        logger.warning("Search provider %s failed: %s", provider.name, error)
+                        errors.append(f"{provider.name}: {error}")
+                    elif future.result():
+                        answers[provider.name] = future.result()
+                if answers and self.policy == "first":
+                    break
+        finally:
+            # Providers still running lose; they stop at their next deadline check
+            for future in pending:
+                attempts[future][1].cancel("lost a fan-out search")
+        
+        if parent is not None:
+            parent.check()
+        if not answers:
+            if errors and len(errors) == len(providers):
+                return f"Search failed: all providers failed ({'; '.join(errors)})"
+            return "No search results found."
+        
+        for name in answers:
+            FANOUT_WINNERS.inc(provider=name, policy=self.policy)
+        ordered = [answers[p.name] for p in providers if p.name in answers]
+        return self.format_results(merge_results(ordered))
+    
+    def report(self) -> Dict[str, object]:
+        return {
+            "providers": [provider.name for provider in self.providers],
+            "policy": self.policy,
+            "stats": self.stats.report(),
+        }
+
+
+def _run_in_scope(deadline: Deadline, func: Callable, *args):
+    with deadline_scope(deadline):
+        return func(*args)
+
+
+def merge_results(result_lists: Iterable[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """Interleave ranked result lists (first of each, then second, ...), dropping duplicate URLs."""
+    merged, seen = [], set()
+    lists = [list(results) for results in result_lists]
+    for rank in range(max((len(results) for results in lists), default=0)):
+        for results in lists:
+            if rank < len(results):
+                url = canonical_url(results[rank].get("url", ""))
+                if url not in seen:
+                    seen.add(url)
+                    merged.append(results[rank])
+    return merged
+
+
+def make_provider(name: str, linkup_tool: LinkUpSearchTool) -> SearchProvider:
+    """Provider for a SEARCH_PROVIDERS entry: linkup, local or stub."""
+    if name == "linkup":
+        return LinkUpProvider(linkup_tool)
+    if name == "local":
+        return LocalIndexProvider(Path(os.getenv("LOCAL_INDEX_PATH") or DEFAULT_INDEX_PATH))
+    if name == "stub":
+        return StubProvider(latency=float(os.getenv("STUB_SEARCH_LATENCY", "0")), jitter=True)
+    raise ValueError(f"Unknown search provider: {name}")
+
+
+def make_search(linkup_tool: LinkUpSearchTool):
+    """Search backend for quick search, configured from the environment.
+
+    With SEARCH_PROVIDERS left at "linkup" this is the LinkUp tool itself
+    (cached and hedged as before); otherwise a FanoutSearch over the listed
+    providers using SEARCH_POLICY, SEARCH_MERGE_WAIT and SEARCH_FANOUT.
+    """
+    names = [name.strip() for name in os.getenv("SEARCH_PROVIDERS", "linkup").split(",") if name.strip()]
+    if names == ["linkup"]:
+        return linkup_tool
+    return FanoutSearch(
+        [make_provider(name, linkup_tool) for name in names],
+        linkup_tool.format_results,
+        policy=os.getenv("SEARCH_POLICY", "first"),
+        merge_wait=float(os.getenv("SEARCH_MERGE_WAIT", "3")),
+        fanout=int(os.getenv("SEARCH_FANOUT", "0")),
+    )
+
+
+def main():
+    """Add local files to the index used by the "local" provider."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index documents for the local search provider")
+    parser.add_argument("directory", type=Path, help="Directory to index (.md and .txt files)")
+    parser.add_argument("--index", type=Path, default=Path(os.getenv("LOCAL_INDEX_PATH") or DEFAULT_INDEX_PATH))
+    args = parser.parse_args()
+
+    count = LocalIndexProvider(args.index).index_directory(args.directory)
+    print(f"Indexed {count} documents into {args.index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the MCP Multi-Agent Deep Researcher
+
+Each suite times one part of the system and prints a small report.
+Run with: python benchmark.py <suite> [options]
+"""
+
+import asyncio
+import statistics
+import sys
+import os
+import time
+from typing import Callable, Dict, List
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_QUERIES = [
+    "What is agentic AI and how does it differ from traditional AI?",
+    "How does quantum computing work?",
+]
+
+
+def _summary(samples: List[float]) -> str:
+    """Format min/median/max of a list of seconds."""
+    if not samples:
+        return "no samples"
+    return (
+        f"min {min(samples):.2f}s  median {statistics.median(samples):.2f}s  "
+        f"max {max(samples):.2f}s  (n={len(samples)})"
+    )
+
+
+async def _peak_rss(stop: asyncio.Event, interval: float = 0.05) -> int:
+    """Highest RSS seen until stop is set."""
+    from runtime.memory import rss_bytes
+
+    peak = rss_bytes()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        peak = max(peak, rss_bytes())
+    return peak
+
+
+async def bench_crew(args) -> None:
+    """Compare critical-path time of the sequential and DAG execution modes.
+    
+    With --concurrency N, N runs share the process at a time and the RSS
+    growth per concurrent run is reported too.
+    """
+    from agents.research_crew import ResearchCrew, STAGE_SECONDS
+    from runtime.evidence import evidence_report
+    from runtime.governor import GENERATION_TOKENS, ROLES
+    from runtime.memory import memory_scope, rss_bytes
+
+    def generated(kind: str) -> Dict[str, float]:
+        return {role: GENERATION_TOKENS.value(role=role, kind=kind) for role in ROLES}
+
+    async def timed_run(crew, query: str) -> float:
+        started = time.perf_counter()
+        with memory_scope("research"):
+            await crew.conduct_research(query)
+        return time.perf_counter() - started
+
+    for mode in ("sequential", "dag"):
+        crew = ResearchCrew(execution_mode=mode)
+        # Reuse would answer repeats from the report store without running the crew
+        crew.report_reuse_max_age = 0
+        runs = [query for _ in range(args.repeat) for query in args.queries]
+        samples = []
+        actual_before, budget_before = generated("actual"), generated("budget")
+        baseline = rss_bytes()
+        stop = asyncio.Event()
+        sampler = asyncio.ensure_future(_peak_rss(stop))
+        for i in range(0, len(runs), args.concurrency):
+            batch = runs[i:i + args.concurrency]
+            samples += await asyncio.gather(*(timed_run(crew, query) for query in batch))
+        stop.set()
+        peak = await sampler
+
+        print(f"{mode:>10}: {_summary(samples)}")
+        per_run = (peak - baseline) / min(args.concurrency, len(runs)) / 2 ** 20
+        print(f"{'':>12}rss      {baseline / 2 ** 20:.0f} MB idle, {peak / 2 ** 20:.0f} MB peak, "
+              f"{per_run:.1f} MB per concurrent run (concurrency {args.concurrency})")
+        actual, budget = generated("actual"), generated("budget")
+        for role in ROLES:
+            budgeted = budget[role] - budget_before[role]
+            if budgeted:
+                print(f"{'':>12}{role:<9}{(actual[role] - actual_before[role]) / len(runs):>7.0f} tokens/run "
+                      f"of {budgeted / len(runs):.0f} budgeted")
+        evidence = evidence_report()
+        if evidence["lookups"]:
+            print(f"{'':>12}evidence {evidence['hit_rate']:.0%} pool hits over {evidence['lookups']} sources, "
+                  f"{evidence['tokens_saved']} tokens saved (cumulative)")
+        if mode == "dag":
+            for stage in ("search", "outline", "analysis", "section"):
+                count, total = STAGE_SECONDS.stats(mode=mode, stage=stage)
+                if count:
+                    print(f"{'':>12}{stage:<9} {count:>3} runs, {total / count:.2f}s avg")
+
+
+async def bench_logging(args) -> None:
+    """Caller-side cost per log record: direct vs queued handlers, text vs JSON.
+    
+    The sink sleeps --sink-latency ms per write to model a terminal or a pipe
+    that is drained slowly; set it to 0 to measure formatting cost alone.
+    """
+    import logging
+    import queue
+    import tempfile
+    from logging.handlers import QueueHandler, QueueListener
+    from runtime.logging_setup import JsonFormatter, TEXT_FORMAT
+
+    class SlowSink:
+        def __init__(self, stream):
+            self.stream = stream
+
+        def write(self, text):
+            if args.sink_latency:
+                time.sleep(args.sink_latency / 1000)
+            return self.stream.write(text)
+
+        def flush(self):
+            self.stream.flush()
+
+    records = args.records
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt_name, formatter in (("text", logging.Formatter(TEXT_FORMAT)), ("json", JsonFormatter())):
+            for mode in ("direct", "queued"):
+                sink = open(os.path.join(tmp, f"{fmt_name}-{mode}.log"), "w")
+                file_handler = logging.StreamHandler(SlowSink(sink))
+                file_handler.setFormatter(formatter)
+                listener = None
+                if mode == "queued":
+                    log_queue = queue.SimpleQueue()
+                    listener = QueueListener(log_queue, file_handler)
+                    listener.start()
+                    handler = QueueHandler(log_queue)
+                else:
+                    handler = file_handler
+
+                bench_logger = logging.getLogger(f"bench.{fmt_name}.{mode}")
+                bench_logger.propagate = False
+                bench_logger.addHandler(handler)
+                bench_logger.setLevel(logging.INFO)
+
+                started = time.perf_counter()
+                for i in range(records):
+                    bench_logger.info("Received research request: %s", args.queries[i % len(args.queries)])
+                elapsed = time.perf_counter() - started
+
+                if listener:
+                    listener.stop()
+                sink.close()
+                print(f"{fmt_name:>5} {mode:<7} {elapsed / records * 1e6:8.2f} us/record on the calling thread")
+
+
+def _sample_report(sections: int = 12) -> str:
+    """Synthetic markdown report shaped like the technical writer's output."""
+    parts = ["# Research Report: Agentic AI", "", "Agentic AI systems plan and act on their own. " * 6, ""]
+    for i in range(sections):
+        parts += [f"## Section {i + 1}", ""]
+        parts += [f"- Finding {j}: autonomous agents coordinate tools, memory and feedback loops "
+                  f"(source: https://example.com/articles/{i}-{j})" for j in range(8)]
+        parts += ["", "Analysis paragraph discussing trade-offs and evidence. " * 10, ""]
+    return "\n".join(parts)
+
+
+async def bench_payload(args) -> None:
+    """Bytes on the wire and encode time for full, compressed and digest responses."""
+    import json
+    from runtime.compression import brotli, compress
+    from runtime.reports import build_digest, report_etag
+
+    if args.report_file:
+        with open(args.report_file, encoding="utf-8") as f:
+            report = f.read()
+    else:
+        report = _sample_report()
+
+    def timed(func) -> float:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            func()
+        return (time.perf_counter() - started) / args.repeat * 1000
+
+    body = json.dumps({"result": report, "status": "success"}).encode("utf-8")
+    print(f"{'full json':>14}: {len(body):>8} bytes  {timed(lambda: json.dumps({'result': report})):7.3f} ms encode")
+
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        compressed = compress(body, encoding)
+        elapsed = timed(lambda: compress(body, encoding))
+        print(f"{'full ' + encoding:>14}: {len(compressed):>8} bytes  {elapsed:7.3f} ms compress "
+              f"({len(compressed) / len(body):.0%})")
+    if brotli is None:
+        print(f"{'full br':>14}: skipped (brotli not installed)")
+
+    report_id = report_etag(report).strip('"')
+    digest = json.dumps(build_digest(report_id, report)).encode("utf-8")
+    elapsed = timed(lambda: json.dumps(build_digest(report_id, report)))
+    print(f"{'digest json':>14}: {len(digest):>8} bytes  {elapsed:7.3f} ms build ({len(digest) / len(body):.0%})")
+
+
+async def bench_canonical(args) -> None:
+    """Query key throughput for new (uncached) and repeated queries."""
+    import random
+    from runtime.canonical import canonicalize, normalize, query_key, stem
+
+    words = ("latest agentic AI frameworks compared how does quantum computing work "
+             "the U.S. energy prices 2026 running large language models locally").split()
+    rng = random.Random(0)
+    queries = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 9))) for _ in range(args.records)]
+    queries = list(dict.fromkeys(queries + args.queries))
+
+    canonicalize.cache_clear()
+    normalize.cache_clear()
+    query_key.cache_clear()
+    stem.cache_clear()
+    started = time.perf_counter()
+    for query in queries:
+        query_key(query)
+    cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for query in queries:
+            query_key(query)
+    warm = (time.perf_counter() - started) / args.repeat
+
+    distinct = len({normalize(query) for query in queries})
+    topics = len({canonicalize(query) for query in queries})
+    print(f"{'new queries':>16}: {len(queries) / cold:>12,.0f} queries/s")
+    print(f"{'repeated queries':>16}: {len(queries) / warm:>12,.0f} queries/s")
+    print(f"{'distinct keys':>16}: {distinct} for {len(queries)} raw queries")
+    print(f"{'topics':>16}: {topics} canonical forms (analytics grouping)")
+
+
+SUITES: Dict[str, Callable] = {
+    "crew": bench_crew,
+    "logging": bench_logging,
+    "payload": bench_payload,
+    "canonical": bench_canonical,
+}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark MCP Research components")
+    parser.add_argument("suite", choices=sorted(SUITES), help="Benchmark suite to run")
+    parser.add_argument("--query", dest="queries", action="append",
+                        help="Query to use (repeatable); defaults to a small built-in set")
+    parser.add_argument("--repeat", type=int, default=1, help="Times to repeat each query")
+    parser.add_argument("--concurrency", type=int, default=1, help="Research runs in flight at once (crew suite)")
+    parser.add_argument("--records", type=int, default=5000, help="Log records (logging suite) or queries (canonical suite)")
+    parser.add_argument("--sink-latency", type=float, default=0.2,
+                        help="Simulated ms per log write for the logging suite")
+    parser.add_argument("--report-file", help="Markdown report for the payload suite; defaults to a synthetic one")
+    args = parser.parse_args()
+    args.queries = args.queries or DEFAULT_QUERIES
+
+    print(f"Running benchmark suite: {args.suite}")
+    print("=" * 50)
+    asyncio.run(SUITES[args.suite](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,23 +5,45 @@ FastAPI HTTP Server for MCP Multi-Agent Deep Researcher
 Provides HTTP endpoints for direct access to research functionality.
 """
 
+import os
+import hmac
+import uuid
 import asyncio
 import logging
-from typing import Dict, Any
+import ipaddress
+from contextlib import AsyncExitStack
+from typing import Dict, Any, List, Literal, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
 from dotenv import load_dotenv
 
-from agents.research_crew import ResearchCrew
+from agents.research_crew import ResearchCrew, ResearchFailed
+from agents.tools.search_providers import FanoutSearch
+from runtime.admission import AdmissionRejected, get_admission_controller
+from runtime.compression import CompressionMiddleware
+from runtime.deadline import Deadline, DeadlineExceeded, deadline_scope
+from runtime.evidence import evidence_report
+from runtime.executor import executor_report, install_executor
+from runtime.freshness import policy_for
+from runtime.logging_setup import configure_logging, get_logging_settings, update_logging_settings
+from runtime.memory import memory_report
+from runtime.metrics import REGISTRY
+from runtime.profiling import ProfilerBusy, dump_tasks, get_loop_monitor, request_scope, sample_cpu, start_loop_monitor
+from runtime.query_log import get_query_log, query_source
+from runtime.report_store import get_report_store
+from runtime.reports import etag_matches, report_etag
+from runtime.state import DEFAULT_SQLITE_PATH
+from runtime.warmer import make_warmer
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure non-blocking logging (LOG_LEVEL, LOG_FORMAT=text|json)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # FastAPI app
@@ -38,52 +60,422 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["ETag", "X-Request-ID"],
 )
 
+# Compress large JSON/markdown responses (gzip, or brotli when installed)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")))
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Tag each request with X-Request-ID (generated if absent) so it can be profiled."""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    with request_scope(request_id), query_source("http"):
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.on_event("startup")
+async def start_monitors() -> None:
+    # Blocking work (and asyncio.to_thread) runs on a pool sized by EXECUTOR_THREADS
+    install_executor()
+    start_loop_monitor()
+    if warmer is not None and os.getenv("WARMER_ENABLED", "false").lower() in ("1", "true", "yes"):
+        asyncio.create_task(warmer.run_forever(float(os.getenv("WARMER_INTERVAL", "900"))))
+
 # Initialize research crew
 research_crew = ResearchCrew()
 
+async def _warm_topic(kind: str, query: str) -> str:
+    if kind == "research":
+        return await research_crew.conduct_research(query)
+    return await research_crew.quick_search(query)
+
+def _has_fresh_answer(kind: str, query: str) -> bool:
+    """Stored research reports are fresh within the freshness TTL; searches
+    are always re-run, which costs nothing while their cache entry is fresh."""
+    if kind != "research":
+        return False
+    max_age = min(research_crew.report_reuse_max_age, policy_for(query).ttl)
+    return get_report_store().latest(query, model=research_crew.ollama_tool.model_name, max_age=max_age) is not None
+
+warmer = make_warmer(_warm_topic, _has_fresh_answer)
+
+# Default time budgets (seconds) when a request does not set its own timeout
+DEFAULT_TIMEOUTS = {
+    "research": float(os.getenv("RESEARCH_TIMEOUT", "600")),
+    "search": float(os.getenv("SEARCH_TIMEOUT", "60")),
+}
+DISCONNECT_POLL_INTERVAL = 1.0
+
 class ResearchRequest(BaseModel):
     """Request model for research queries."""
     query: str
+    priority: Literal["interactive", "batch"] = "interactive"
+    timeout: Optional[float] = Field(default=None, gt=0, description="Seconds before the run is abandoned")
+    depth: Optional[Literal["standard", "deep"]] = Field(
+        default=None, description="LinkUp search depth; automatic when omitted"
+    )
+    response_format: Literal["full", "digest"] = Field(
+        default="full", description="digest returns the outline only; fetch sections from /reports"
+    )
 
 class ResearchResponse(BaseModel):
     """Response model for research results."""
     result: str
     status: str = "success"
 
+class SectionInfo(BaseModel):
+    """Heading and size of one report section."""
+    index: int
+    heading: str
+    chars: int
+
+class ReportDigest(BaseModel):
+    """Compact outline of a report; sections are fetched on demand."""
+    report_id: str
+    title: str
+    summary: str
+    chars: int
+    sections: List[SectionInfo]
+
+class ReportSection(BaseModel):
+    """One section of a stored report."""
+    report_id: str
+    index: int
+    heading: str
+    content: str
+
+class LoggingSettings(BaseModel):
+    """Runtime logging changes; omitted fields are left unchanged."""
+    level: Optional[Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]] = None
+    trace_sample_rate: Optional[float] = Field(default=None, ge=0, le=1)
+    logger: Optional[str] = Field(default=None, description="Logger to change instead of the root")
+
+def require_admin(request: Request, x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Guard admin endpoints: ADMIN_TOKEN when it is configured, else loopback clients only."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if expected:
+        if not hmac.compare_digest(x_admin_token or "", expected):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+        return
+    if not _is_loopback(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="Admin endpoints need ADMIN_TOKEN for non-local clients")
+
+def _is_loopback(host: Optional[str]) -> bool:
+    try:
+        return host is not None and ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+def _overloaded(rejection: AdmissionRejected) -> HTTPException:
+    """Translate a shed request into a 429/503 with a Retry-After header."""
+    return HTTPException(
+        status_code=rejection.status_code,
+        detail=f"Server busy ({rejection.reason}), retry later",
+        headers={"Retry-After": str(rejection.retry_after)}
+    )
+
+async def _run_for_client(http_request: Request, kind: str, request: ResearchRequest, run) -> str:
+    """Admit and run a research/search call under a deadline.
+    
+    The run is cancelled when the deadline passes or the HTTP client
+    disconnects, so abandoned requests stop consuming crew capacity.
+    """
+    deadline = Deadline(request.timeout or DEFAULT_TIMEOUTS[kind])
+    
+    async def admitted() -> str:
+        async with get_admission_controller(kind).admit(request.priority, deadline=deadline.expires_at):
+            return await run(request.query, depth=request.depth)
+    
+    with deadline_scope(deadline):
+        task = asyncio.ensure_future(admitted())
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling %s for: %s", kind, request.query)
+                deadline.cancel("abandoned by client")
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def _raise_for_run_error(endpoint: str, error: Exception) -> None:
+    """Map run failures onto HTTP status codes."""
+    if isinstance(error, HTTPException):
+        raise error
+    if isinstance(error, AdmissionRejected):
+        raise _overloaded(error)
+    if isinstance(error, DeadlineExceeded):
+        raise HTTPException(status_code=504, detail=str(error))
+    if isinstance(error, ResearchFailed):
+        # The crew or the search backends failed, not this server
+        raise HTTPException(status_code=502, detail=str(error))
+    logger.error("Error in %s endpoint: %s", endpoint, error)
+    raise HTTPException(status_code=500, detail=str(error))
+
+async def _report_response(http_request: Request, request: ResearchRequest, result: str, kind: str) -> Response:
+    """Full result or digest, with an ETag honoured via If-None-Match and a
+    freshness lifetime (Cache-Control max-age) from the query's freshness class.
+    
+    Only successful results get here; failed runs raise ResearchFailed, which
+    becomes an error response without either header.
+    """
+    if request.response_format == "digest":
+        store = get_report_store()
+        report_id = await asyncio.to_thread(
+            store.save, request.query, result, model=research_crew.ollama_tool.model_name, kind=kind
+        )
+        etag = f'"{report_id}-digest"'
+        body = await asyncio.to_thread(store.digest, report_id)
+    else:
+        etag = report_etag(result)
+        body = ResearchResponse(result=result).model_dump()
+    
+    # Clients may reuse the result without asking again while the query's
+    # answers are considered fresh
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={int(policy_for(request.query).ttl)}"}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Half-open byte range from a single-range Range header; None means the whole body."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) + 1 if last else size
+        else:
+            start, end = max(size - int(last), 0), size
+    except ValueError:
+        return None
+    if start >= size or end <= start:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size)
+
 @app.post("/research", response_model=ResearchResponse)
-async def conduct_research(request: ResearchRequest) -> ResearchResponse:
+async def conduct_research(request: ResearchRequest, http_request: Request) -> ResearchResponse:
     """Conduct comprehensive research using the multi-agent workflow."""
     try:
-        logger.info(f"Received research request: {request.query}")
+        logger.info("Received research request: %s", request.query)
         
-        result = await research_crew.conduct_research(request.query)
+        result = await _run_for_client(http_request, "research", request, research_crew.conduct_research)
         
-        return ResearchResponse(result=result)
+        return await _report_response(http_request, request, result, "research")
         
     except Exception as e:
-        logger.error(f"Error in research endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        _raise_for_run_error("research", e)
 
 @app.post("/search", response_model=ResearchResponse)
-async def quick_search(request: ResearchRequest) -> ResearchResponse:
+async def quick_search(request: ResearchRequest, http_request: Request) -> ResearchResponse:
     """Perform quick web search."""
     try:
-        logger.info(f"Received search request: {request.query}")
+        logger.info("Received search request: %s", request.query)
         
-        result = await research_crew.quick_search(request.query)
+        result = await _run_for_client(http_request, "search", request, research_crew.quick_search)
         
-        return ResearchResponse(result=result)
+        return await _report_response(http_request, request, result, "search")
         
     except Exception as e:
-        logger.error(f"Error in search endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        _raise_for_run_error("search", e)
+
+class _SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse that releases an admission slot once the response ends,
+    including when the body never starts because the client is already gone."""
+    
+    def __init__(self, content, slot: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self._slot = slot
+    
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._slot.aclose()
+
+@app.post("/search/stream")
+async def stream_search_answer(request: ResearchRequest) -> StreamingResponse:
+    """Quick search, then stream an Ollama answer as it is generated."""
+    logger.info("Received streaming search request: %s", request.query)
+    
+    deadline = Deadline(request.timeout or DEFAULT_TIMEOUTS["search"])
+    # Admit before sending headers so overload can still be reported as 429/503
+    slot = AsyncExitStack()
+    try:
+        await slot.enter_async_context(
+            get_admission_controller("search").admit(request.priority, deadline=deadline.expires_at)
+        )
+    except AdmissionRejected as e:
+        raise _overloaded(e)
+    
+    async def body():
+        try:
+            async for chunk in research_crew.stream_quick_answer(
+                request.query, timeout=deadline.remaining(), depth=request.depth
+            ):
+                yield chunk
+        except DeadlineExceeded as e:
+            yield f"\n\n[{str(e)}]"
+        except Exception as e:
+            logger.error("Error in streaming search endpoint: %s", e)
+            yield f"\n\n[Error: {str(e)}]"
+    
+    return _SlotStreamingResponse(body(), slot, media_type="text/markdown; charset=utf-8")
+
+@app.get("/reports")
+async def list_reports(
+    query: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[float] = None,
+    limit: int = 20
+) -> List[Dict[str, Any]]:
+    """Stored reports, newest first, filtered by query text, cited source or creation time."""
+    return await asyncio.to_thread(
+        get_report_store().search, query=query, source=source, since=since, limit=min(limit, 200)
+    )
+
+@app.get("/reports/{report_id}", response_model=ReportDigest)
+async def get_report(
+    report_id: str,
+    http_request: Request,
+    format: Literal["digest", "markdown"] = "digest"
+) -> Response:
+    """Digest of a stored report, or its markdown with Range support (format=markdown)."""
+    store = get_report_store()
+    entry = await asyncio.to_thread(store.get, report_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    # Reports are content-addressed, so an id always names the same bytes
+    etag = f'"{report_id}-{format}"'
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if format == "digest":
+        return JSONResponse(await asyncio.to_thread(store.digest, report_id), headers={"ETag": etag})
+    
+    size = entry["bytes"]
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    byte_range = _parse_range(http_request.headers.get("range"), size)
+    if byte_range is None:
+        start, end, status_code = 0, size, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    
+    async def body():
+        # Decompress one section at a time off the event loop
+        chunks = store.iter_range(report_id, start, end)
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    
+    return StreamingResponse(body(), status_code=status_code, headers=headers,
+                             media_type="text/markdown; charset=utf-8")
+
+@app.get("/reports/{report_id}/sections/{index}", response_model=ReportSection)
+async def get_report_section(report_id: str, index: int, http_request: Request) -> Response:
+    """One section of a stored report, by its index in the digest."""
+    etag = f'"{report_id}-{index}"'
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    store = get_report_store()
+    entry = await asyncio.to_thread(store.get, report_id)
+    if entry is None or not 0 <= index < len(entry["sections"]):
+        raise HTTPException(status_code=404, detail="Report or section not found")
+    
+    content = await asyncio.to_thread(store.read_section, report_id, index)
+    return JSONResponse(
+        ReportSection(
+            report_id=report_id, index=index, heading=entry["sections"][index]["heading"], content=content
+        ).model_dump(),
+        headers={"ETag": etag}
+    )
 
 @app.get("/health")
-async def health_check() -> Dict[str, str]:
-    """Health check endpoint."""
-    return {"status": "healthy", "service": "MCP Multi-Agent Deep Researcher"}
+async def health_check() -> Dict[str, Any]:
+    """Health check endpoint, with this worker's memory use per in-flight run."""
+    search_tool = research_crew.search_tool
+    return {
+        "status": "healthy",
+        "service": "MCP Multi-Agent Deep Researcher",
+        "memory": memory_report(),
+        "executor": executor_report(),
+        "evidence_pool": evidence_report(),
+        "search_providers": search_tool.report() if isinstance(search_tool, FanoutSearch) else None
+    }
+
+@app.get("/admin/logging", dependencies=[Depends(require_admin)])
+async def read_logging_settings() -> Dict[str, Any]:
+    """Current log level and agent trace sample rate."""
+    return get_logging_settings()
+
+@app.put("/admin/logging", dependencies=[Depends(require_admin)])
+async def change_logging_settings(settings: LoggingSettings) -> Dict[str, Any]:
+    """Change log verbosity and trace sampling without a restart."""
+    return update_logging_settings(settings.level, settings.trace_sample_rate, settings.logger)
+
+@app.post("/admin/profile/cpu", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile_cpu(
+    seconds: float = Query(default=10, gt=0, le=300),
+    interval_ms: float = Query(default=5, ge=1, le=1000),
+    request_id: Optional[str] = None
+) -> str:
+    """Sample CPU stacks of this worker for N seconds, or for the run of one request id.
+    
+    Returns collapsed stacks for flamegraph.pl or speedscope. With request_id,
+    start the profile first, then send the request with that X-Request-ID.
+    """
+    try:
+        return await asyncio.to_thread(sample_cpu, seconds, interval_ms / 1000, request_id)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/admin/profile/tasks", dependencies=[Depends(require_admin)])
+async def profile_tasks() -> Dict[str, Any]:
+    """Pending asyncio tasks with their stacks, plus event-loop lag statistics."""
+    monitor = get_loop_monitor()
+    return {"loop": monitor.report() if monitor else None, "tasks": dump_tasks()}
+
+@app.get("/admin/queries", dependencies=[Depends(require_admin)])
+async def query_analytics(limit: int = Query(default=20, ge=1, le=200)) -> Dict[str, Any]:
+    """Hot and trending research/search topics from the query log, and the warm-hit ratio."""
+    log = get_query_log()
+    if log is None:
+        raise HTTPException(status_code=404, detail="Query log is disabled (QUERY_LOG=false)")
+    
+    def analyse() -> Dict[str, Any]:
+        report: Dict[str, Any] = {
+            kind: {"hot": log.hot(kind, limit=limit), "trending": log.trending(kind, limit=limit)}
+            for kind in ("research", "search")
+        }
+        report["warm"] = log.warm_stats()
+        report["warmer"] = warmer.report() if warmer else None
+        return report
+    
+    return await asyncio.to_thread(analyse)
+
+@app.post("/admin/warmer/run", dependencies=[Depends(require_admin)])
+async def run_warmer() -> Dict[str, Any]:
+    """Warm hot and trending topics now, regardless of the off-peak window."""
+    if warmer is None:
+        raise HTTPException(status_code=404, detail="Query log is disabled (QUERY_LOG=false)")
+    return await warmer.warm_once(force=True)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """Prometheus metrics (queue depth, wait times, shed requests)."""
+    return REGISTRY.render()
 
 @app.get("/")
 async def root() -> Dict[str, str]:
@@ -94,17 +486,45 @@ async def root() -> Dict[str, str]:
         "endpoints": {
             "research": "POST /research - Comprehensive research with multi-agent workflow",
             "search": "POST /search - Quick web search",
-            "health": "GET /health - Health check"
+            "search_stream": "POST /search/stream - Quick search with a streamed answer",
+            "reports": "GET /reports - List stored reports; /reports/{id} - digest or markdown (Range); /reports/{id}/sections/{n} - one section",
+            "queries": "GET /admin/queries - Hot and trending topics, warm-hit ratio; POST /admin/warmer/run - Warm them now",
+            "profile": "POST /admin/profile/cpu - Sampled CPU stacks; GET /admin/profile/tasks - asyncio tasks and loop lag",
+            "health": "GET /health - Health check",
+            "metrics": "GET /metrics - Prometheus metrics"
         }
     }
 
-if __name__ == "__main__":
-    logger.info("Starting FastAPI server for MCP Multi-Agent Deep Researcher...")
+def main():
+    """Run the HTTP server, optionally with several worker processes."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="MCP Multi-Agent Deep Researcher HTTP server")
+    parser.add_argument("--host", default=os.getenv("HTTP_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("HTTP_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("HTTP_WORKERS", "1")),
+                        help="Number of worker processes (production mode when > 1)")
+    args = parser.parse_args()
+    
+    if args.workers > 1 and not os.getenv("STATE_BACKEND_URL"):
+        # Workers must share caches, otherwise each one repeats the same LinkUp calls
+        os.environ["STATE_BACKEND_URL"] = f"sqlite:///{DEFAULT_SQLITE_PATH}"
+    
+    logger.info(
+        "Starting FastAPI server for MCP Multi-Agent Deep Researcher on %s:%s with %s worker(s)...",
+        args.host, args.port, args.workers
+    )
     
     uvicorn.run(
         "http_server:app",
-        host="0.0.0.0",
-        port=8080,
+        host=args.host,
+        port=args.port,
         log_level="info",
-        reload=True
-    )
\ No newline at end of file
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        # Auto-reload is a development convenience and cannot be combined with workers
+        reload=args.workers == 1,
+        workers=args.workers if args.workers > 1 else None
+    )
+
+if __name__ == "__main__":
+    main()
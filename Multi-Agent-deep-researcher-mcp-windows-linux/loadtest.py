@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Load test and capacity planner for the HTTP API
+
+Replays a query mix against the FastAPI app at open-loop (Poisson) arrival
+rates: requests are sent on schedule whether or not earlier ones have
+finished, as real users would, so queueing, shedding and timeouts show up
+the way they would in production. Each step of --rates runs for --duration
+seconds and reports goodput and latency percentiles; together the steps
+form the latency-vs-throughput curve, and the saturation point is the last
+rate the server kept up with.
+
+By default the app runs in-process with stubbed backends: searches sleep
+like LinkUp calls, research runs add one generation per agent, each holding one
+of --ollama-nodes x --ollama-parallel generation slots, and repeated queries
+are answered from a cache. Admission control, the executor, deadlines and
+the HTTP layer are the real ones, so their limits (RESEARCH_MAX_CONCURRENCY,
+EXECUTOR_THREADS, ...) can be sized from the results. With --url the same
+load is sent to a running server instead.
+
+Run with: python loadtest.py --rates 0.5,1,2,4 --duration 60
+"""
+
+import os
+import sys
+import csv
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TOPICS = (
+    "agentic AI frameworks", "quantum computing", "solid state batteries", "CRISPR gene editing",
+    "vector databases", "fusion energy", "large language model evaluation", "edge computing",
+    "carbon capture", "Rust vs Go for backend services", "WebAssembly outside the browser",
+    "retrieval augmented generation", "RISC-V adoption", "small modular reactors", "mRNA vaccines",
+)
+TEMPLATES = ("What is {}?", "Latest developments in {}", "How does {} work?", "{} explained", "Pros and cons of {}")
+
+
+def query_pool(distinct: int, seed: int = 0) -> List[str]:
+    """`distinct` different queries built from topic/phrasing combinations."""
+    rng = random.Random(seed)
+    combos = [template.format(topic) for topic in TOPICS for template in TEMPLATES]
+    rng.shuffle(combos)
+    queries = combos[:distinct]
+    while len(queries) < distinct:
+        queries.append(f"{rng.choice(combos)} ({len(queries)})")
+    return queries
+
+
+class QueryMix:
+    """Draws (kind, query) pairs: research with probability research_ratio,
+    queries by a Zipf law over the pool so a few topics are asked a lot.
+
+    Args:
+        queries: Query pool, most popular first.
+        research_ratio: Fraction of requests sent to /research.
+        zipf: Popularity skew; 0 draws uniformly, around 1 is typical of search traffic.
+    """
+
+    def __init__(self, queries: List[str], research_ratio: float, zipf: float, seed: int = 0):
+        self.queries = queries
+        self.research_ratio = research_ratio
+        self.weights = [1 / (rank + 1) ** zipf for rank in range(len(queries))]
+        self.rng = random.Random(seed)
+
+    def draw(self) -> Tuple[str, str]:
+        kind = "research" if self.rng.random() < self.research_ratio else "search"
+        return kind, self.rng.choices(self.queries, weights=self.weights)[0]
+
+
+class StubCrew:
+    """Stands in for ResearchCrew with modeled LinkUp and Ollama latencies.
+
+    Blocking sleeps run on the dedicated executor, like the real calls, and
+    generations contend for a fixed number of Ollama slots.
+
+    Args:
+        search_seconds: Mean LinkUp search time (exponentially distributed).
+        generation_seconds: Mean time of one agent's generation.
+        ollama_slots: Generations that can run at once across all nodes.
+        cache_ttl: Seconds a finished search or report answers repeats.
+    """
+
+    def __init__(self, search_seconds: float, generation_seconds: float, ollama_slots: int, cache_ttl: float):
+        self.search_seconds = search_seconds
+        self.generation_seconds = generation_seconds
+        self.cache_ttl = cache_ttl
+        self.search_tool = None
+        self.report_reuse_max_age = cache_ttl
+        self._slots = threading.BoundedSemaphore(ollama_slots)
+        self._cache: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _cached(self, key: str) -> bool:
+        with self._lock:
+            stored = self._cache.get(key)
+        return stored is not None and time.monotonic() - stored < self.cache_ttl
+
+    def _store(self, key: str) -> None:
+        with self._lock:
+            self._cache[key] = time.monotonic()
+
+    def _search(self) -> None:
+        from runtime.deadline import check_deadline
+
+        check_deadline()
+        time.sleep(random.expovariate(1 / self.search_seconds))
+
+    def _generate(self) -> None:
+        from runtime.deadline import check_deadline
+
+        with self._slots:
+            check_deadline()
+            time.sleep(random.expovariate(1 / self.generation_seconds))
+
+    async def quick_search(self, query: str, timeout: Optional[float] = None, depth: Optional[str] = None) -> str:
+        from runtime.canonical import query_key
+        from runtime.executor import run_blocking
+
+        key = "search:" + query_key(query)
+        if not self._cached(key):
+            await asyncio.wait_for(run_blocking(self._search), timeout)
+            self._store(key)
+        return f"Quick search results for '{query}':\n\n1. **Stub result**\n   URL: https://stub.example/\n"
+
+    async def conduct_research(self, query: str, timeout: Optional[float] = None, on_progress=None,
+                               depth: Optional[str] = None) -> str:
+        from runtime.canonical import query_key
+        from runtime.executor import run_blocking
+
+        key = "research:" + query_key(query)
+        if not self._cached(key):
+            async def pipeline() -> None:
+                await run_blocking(self._search)
+                for _ in ("searcher", "analyst", "writer"):
+                    await run_blocking(self._generate)
+
+            await asyncio.wait_for(pipeline(), timeout)
+            self._store(key)
+        return f"# {query}\n\nStub report ({hashlib.sha1(query.encode()).hexdigest()[:8]}).\n"
+
+
+@dataclass
+class Outcome:
+    kind: str
+    status: int
+    seconds: float
+
+
+@dataclass
+class Step:
+    """Results of one offered arrival rate."""
+    rate: float
+    duration: float
+    outcomes: List[Outcome] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def ok(self, kind: Optional[str] = None) -> List[float]:
+        return [o.seconds for o in self.outcomes if o.status == 200 and (kind is None or o.kind == kind)]
+
+    def goodput(self, kind: Optional[str] = None) -> float:
+        """Successful responses per second, over the time until the step's last response."""
+        return len(self.ok(kind)) / self.elapsed if self.elapsed else 0.0
+
+    def error_rate(self) -> float:
+        return 1 - len(self.ok()) / len(self.outcomes) if self.outcomes else 0.0
+
+    def statuses(self) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        for outcome in self.outcomes:
+            counts[outcome.status] = counts.get(outcome.status, 0) + 1
+        return counts
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+async def run_step(client, mix: QueryMix, rate: float, duration: float, timeout: float, drain: float) -> Step:
+    """Send Poisson arrivals at `rate` per second for `duration` seconds, then
+    wait up to `drain` seconds for the responses still outstanding."""
+    step = Step(rate=rate, duration=duration)
+    tasks = []
+
+    async def send(kind: str, query: str) -> None:
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"/{kind}", json={"query": query, "timeout": timeout}, timeout=timeout + 5)
+            status = response.status_code
+        except Exception:
+            status = 0  # Transport error or client-side timeout
+        step.outcomes.append(Outcome(kind, status, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    next_at = started
+    while True:
+        next_at += random.expovariate(rate)
+        if next_at - started >= duration:
+            break
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        tasks.append(asyncio.ensure_future(send(*mix.draw())))
+
+    done, pending = await asyncio.wait(tasks, timeout=drain) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    step.elapsed = max(duration, time.perf_counter() - started)
+    for _ in pending:
+        step.outcomes.append(Outcome("unfinished", -1, step.elapsed))
+    return step
+
+
+def saturation(steps: List[Step], slo: float, min_goodput: float = 0.9) -> Optional[Step]:
+    """Highest-rate step before the first one that missed the SLO: goodput
+    below min_goodput of the offered rate, or p95 latency above slo seconds."""
+    best = None
+    for step in sorted(steps, key=lambda s: s.rate):
+        p95 = percentile(step.ok(), 0.95)
+        if step.goodput() < min_goodput * step.rate or p95 is None or p95 > slo:
+            break
+        best = step
+    return best
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return f"{seconds:7.2f}s" if seconds is not None else "      -"
+
+
+def report(steps: List[Step], args) -> None:
+    print(f"{'offered/s':>9} {'goodput/s':>9} {'research':>8} {'search':>7} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}  statuses")
+    for step in steps:
+        ok = step.ok()
+        statuses = ", ".join(f"{code}:{count}" for code, count in sorted(step.statuses().items()))
+        print(f"{step.rate:>9.2f} {step.goodput():>9.2f} {step.goodput('research'):>8.2f} "
+              f"{step.goodput('search'):>7.2f} {_fmt(percentile(ok, 0.5))} {_fmt(percentile(ok, 0.95))} "
+              f"{_fmt(percentile(ok, 0.99))} {step.error_rate():>7.1%}  {statuses}")
+
+    knee = saturation(steps, args.slo)
+    print()
+    if knee is None:
+        print(f"Saturated at the lowest rate: p95 above {args.slo:.1f}s or goodput below 90% of offered.")
+        return
+    print(f"Saturation point: {knee.rate:.2f} req/s offered, {knee.goodput():.2f} req/s served "
+          f"within p95 {args.slo:.1f}s ({knee.goodput('research'):.2f} research/s)")
+    if knee is steps[-1]:
+        print("The highest rate tested was still within the SLO; extend --rates to find the limit.")
+
+    if args.url is None and args.target_rate and knee.goodput():
+        # Capacity scales with Ollama slots while generations are the bottleneck
+        slots = args.ollama_nodes * args.ollama_parallel
+        research_share = knee.goodput("research") / knee.goodput() if knee.goodput() else args.research_ratio
+        needed = args.target_rate / knee.goodput()
+        print(f"Target {args.target_rate:.2f} req/s ({research_share:.0%} research): about "
+              f"{math.ceil(needed * args.ollama_nodes)} Ollama nodes ({slots} slots now), with "
+              f"RESEARCH_MAX_CONCURRENCY and EXECUTOR_THREADS scaled by {needed:.1f}x - an estimate "
+              f"assuming generations stay the bottleneck; rerun at the new size to confirm.")
+
+
+def write_csv(steps: List[Step], path: str) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["offered_rps", "goodput_rps", "research_rps", "search_rps",
+                         "p50_s", "p95_s", "p99_s", "error_rate", "requests"])
+        for step in steps:
+            ok = step.ok()
+            writer.writerow([
+                step.rate, round(step.goodput(), 4), round(step.goodput("research"), 4),
+                round(step.goodput("search"), 4), percentile(ok, 0.5), percentile(ok, 0.95),
+                percentile(ok, 0.99), round(step.error_rate(), 4), len(step.outcomes),
+            ])
+    print(f"Wrote curve to {path}")
+
+
+async def load_test(args) -> List[Step]:
+    import httpx
+
+    mix = QueryMix(query_pool(args.distinct, args.seed), args.research_ratio, args.zipf, args.seed)
+    random.seed(args.seed)
+    stub: Optional[StubCrew] = None
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=httpx.Limits(max_connections=None))
+    else:
+        # Stubs replace the backends; the HTTP layer, admission and executor are real
+        os.environ.setdefault("QUERY_LOG", "false")
+        os.environ.setdefault("WARMER_ENABLED", "false")
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        import http_server
+
+        stub = StubCrew(
+            search_seconds=args.search_seconds * args.time_scale,
+            generation_seconds=args.generation_seconds * args.time_scale,
+            ollama_slots=args.ollama_nodes * args.ollama_parallel,
+            cache_ttl=args.cache_ttl,
+        )
+        http_server.research_crew = stub
+        await http_server.app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=http_server.app), base_url="http://loadtest")
+
+    steps = []
+    async with client:
+        for rate in args.rates:
+            if stub is not None and not args.warm_cache:
+                stub.reset()
+            step = await run_step(client, mix, rate, args.duration, args.timeout, args.drain)
+            steps.append(step)
+            print(f"  {rate:.2f} req/s: {len(step.outcomes)} requests, {step.goodput():.2f}/s served")
+    return steps
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Open-loop load test of the HTTP API")
+    parser.add_argument("--url", help="Load a running server instead of the in-process app with stubbed backends")
+    parser.add_argument("--rates", type=lambda s: [float(r) for r in s.split(",")], default=[0.5, 1, 2, 4, 8],
+                        help="Comma-separated arrival rates (requests/s) to step through")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of arrivals per rate")
+    parser.add_argument("--drain", type=float, default=60, help="Seconds to wait for outstanding responses")
+    parser.add_argument("--timeout", type=float, default=60, help="Request timeout sent with each request")
+    parser.add_argument("--slo", type=float, default=30, help="p95 latency (s) a rate must meet to count as sustained")
+    parser.add_argument("--research-ratio", type=float, default=0.2, help="Fraction of requests that are /research")
+    parser.add_argument("--distinct", type=int, default=50, help="Distinct queries in the mix")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Query popularity skew (0 = uniform)")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep stub caches across rate steps")
+    parser.add_argument("--search-seconds", type=float, default=1.5, help="Mean stub LinkUp search time")
+    parser.add_argument("--generation-seconds", type=float, default=8, help="Mean stub time per agent generation")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier on stub latencies (0.1 runs 10x faster)")
+    parser.add_argument("--ollama-nodes", type=int, default=1, help="Stub Ollama nodes")
+    parser.add_argument("--ollama-parallel", type=int, default=1, help="Generations each stub node runs at once")
+    parser.add_argument("--cache-ttl", type=float, default=900, help="Seconds stub caches answer repeated queries")
+    parser.add_argument("--target-rate", type=float, help="Rate (req/s) to size Ollama nodes for")
+    parser.add_argument("--csv", help="Write the latency/throughput curve to this CSV file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    target = args.url or f"in-process app, stubbed backends ({args.ollama_nodes} Ollama node(s))"
+    print(f"Load testing {target}")
+    print("=" * 50)
+    steps = asyncio.run(load_test(args))
+    print()
+    report(steps, args)
+    if args.csv:
+        write_csv(steps, args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Admission Control
+
+Bounds how many research and search runs execute at once. Requests beyond the
+concurrency limit wait in a priority queue (interactive ahead of batch) for at
+most a queue deadline; when the queue is full, or a batch request would eat
+into room reserved for interactive users, the request is shed with a
+Retry-After hint instead of piling more work onto the thread pool.
+
+With a memory budget (MEMORY_BUDGET_MB) a free slot is only used while the
+worker's RSS leaves room for another run's observed growth; one run is
+always allowed so the queue keeps draining.
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from runtime.memory import MemoryBudget, get_memory_budget, memory_scope, rss_bytes
+from runtime.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "batch")
+
+QUEUE_DEPTH = REGISTRY.gauge("admission_queue_depth", "Requests waiting for an execution slot")
+IN_FLIGHT = REGISTRY.gauge("admission_in_flight", "Requests currently executing")
+WAIT_SECONDS = REGISTRY.histogram("admission_wait_seconds", "Time spent queued before execution")
+SERVICE_SECONDS = REGISTRY.histogram("admission_service_seconds", "Execution time of admitted requests")
+REJECTED = REGISTRY.counter("admission_rejected_total", "Requests shed by admission control")
+MEMORY_HELD = REGISTRY.counter("admission_memory_held_total", "Free slots left unused because of the memory budget")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the HTTP status and Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limiter with priority classes and queue deadlines."""
+
+    def __init__(
+        self,
+        kind: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        batch_queue_share: float = 0.5,
+        memory: Optional[MemoryBudget] = None,
+        run_memory_estimate: float = 0.0,
+    ):
+        self.kind = kind
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # Batch requests may only occupy this fraction of the queue
+        self.batch_queue_limit = max(1, int(max_queue * batch_queue_share))
+        self.in_flight = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+        self._avg_service = 1.0
+        self.memory = memory
+        # RSS growth expected from one more run: observed growth, but never
+        # below the configured estimate since freed memory is rarely returned
+        self.run_memory_estimate = run_memory_estimate
+        self._avg_memory = run_memory_estimate
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _retry_after(self) -> int:
+        """Rough time until a slot frees up, based on average service time."""
+        backlog = self.queue_depth + 1
+        return max(1, math.ceil(self._avg_service * backlog / self.max_concurrency))
+
+    def _reject(self, status_code: int, reason: str) -> AdmissionRejected:
+        REJECTED.inc(kind=self.kind, reason=reason)
+        logger.warning("Shedding %s request: %s", self.kind, reason)
+        return AdmissionRejected(status_code, reason, self._retry_after())
+
+    def _update_gauges(self) -> None:
+        QUEUE_DEPTH.set(self.queue_depth, kind=self.kind)
+        IN_FLIGHT.set(self.in_flight, kind=self.kind)
+
+    def _has_memory(self, running: int) -> bool:
+        """True if the memory budget allows another run next to `running` others."""
+        if self.memory is None or running == 0:
+            return True
+        if self.memory.has_room(self._avg_memory):
+            return True
+        MEMORY_HELD.inc(kind=self.kind)
+        return False
+    
+    def _release(self) -> None:
+        """Hand the freed slot to the next live waiter, highest priority first."""
+        if not self._has_memory(self.in_flight - 1):
+            # Keep the slot empty; the next release reconsiders the waiters
+            self.in_flight -= 1
+            self._update_gauges()
+            return
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    self._update_gauges()
+                    return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    async def _wait_for_slot(self, priority: str, timeout: float) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self._queues[priority]
+        queue.append(waiter)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            else:
+                waiter.cancel()
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+                self._update_gauges()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(503, "queue_timeout") from None
+            raise
+
+    @asynccontextmanager
+    async def admit(self, priority: str = "interactive", deadline: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold an execution slot for the duration of the block.
+
+        Args:
+            priority: "interactive" or "batch".
+            deadline: Optional absolute time.monotonic() after which waiting is pointless.
+        """
+        if priority not in self._queues:
+            priority = "interactive"
+
+        enqueued_at = time.monotonic()
+        if self.in_flight < self.max_concurrency and self.queue_depth == 0 and self._has_memory(self.in_flight):
+            self.in_flight += 1
+            self._update_gauges()
+        else:
+            if self.queue_depth >= self.max_queue:
+                raise self._reject(503, "queue_full")
+            if priority == "batch" and len(self._queues["batch"]) >= self.batch_queue_limit:
+                raise self._reject(429, "batch_quota")
+
+            timeout = self.queue_timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - enqueued_at)
+            if timeout <= 0:
+                raise self._reject(503, "deadline")
+            await self._wait_for_slot(priority, timeout)
+
+        started_at = time.monotonic()
+        WAIT_SECONDS.observe(started_at - enqueued_at, kind=self.kind, priority=priority)
+        rss_before = rss_bytes() if self.memory is not None else 0
+        try:
+            with memory_scope(self.kind):
+                yield
+        finally:
+            service = time.monotonic() - started_at
+            SERVICE_SECONDS.observe(service, kind=self.kind)
+            self._avg_service = 0.8 * self._avg_service + 0.2 * service
+            if self.memory is not None:
+                growth = max(0, rss_bytes() - rss_before)
+                self._avg_memory = max(0.8 * self._avg_memory + 0.2 * growth, self.run_memory_estimate)
+            self._release()
+
+
+_controllers: Dict[str, AdmissionController] = {}
+
+_DEFAULTS = {
+    # kind: (max concurrency, max queue, queue timeout seconds, expected MB per run)
+    "research": (2, 16, 60.0, 150.0),
+    "search": (8, 64, 10.0, 10.0),
+}
+
+
+def get_admission_controller(kind: str) -> AdmissionController:
+    """Return the process-wide controller for "research" or "search".
+
+    Limits are read from <KIND>_MAX_CONCURRENCY, <KIND>_MAX_QUEUE,
+    <KIND>_QUEUE_TIMEOUT and <KIND>_RUN_MEMORY_MB (expected RSS growth per
+    run, used with MEMORY_BUDGET_MB) environment variables.
+    """
+    controller = _controllers.get(kind)
+    if controller is None:
+        concurrency, queue, timeout, run_memory_mb = _DEFAULTS[kind]
+        prefix = kind.upper()
+        controller = AdmissionController(
+            kind,
+            max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", concurrency)),
+            max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", queue)),
+            queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", timeout)),
+            memory=get_memory_budget(),
+            run_memory_estimate=float(os.getenv(f"{prefix}_RUN_MEMORY_MB", run_memory_mb)) * 1024 * 1024,
+        )
+        _controllers[kind] = controller
+    return controller
@@ -0,0 +1,176 @@
+"""
+Query Canonicalization
+
+Two normal forms of a free-text query:
+
+- normalize() folds only case, accents and Unicode compatibility forms,
+  punctuation and whitespace. Word order and every term are kept, so two
+  queries share it only when they ask the same thing. query_key() hashes
+  it; report identity, report reuse and cache keys are built on it.
+- canonicalize() additionally drops filler words, strips plural/tense
+  suffixes, unifies common entity spellings ("U.S.", "A.I.", "artificial
+  intelligence") and, by default, ignores word order. It is lossy - "is
+  python faster than java" and "is java faster than python" agree - and is
+  meant for grouping queries in analytics and for term search only.
+
+Patterns and alias tables are built at import time and results are
+memoized: a new query costs on the order of ten microseconds, a repeated
+one well under one (see `python benchmark.py canonical`).
+"""
+
+import re
+import hashlib
+import unicodedata
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Tuple
+
+# Filler words that do not change what is being asked. Negations, comparison
+# words and most question words are kept on purpose: "how" and "why"
+# questions about the same topic want different answers.
+STOPWORDS: FrozenSet[str] = frozenset(
+    "a an the of to in on at for by with from into about as and or is are was were be been being "
+    "do does did can could should would will shall may might must please tell me i you explain "
+    "describe give show find search what which this that these those it its there their some any "
+    "information info regarding".split()
+)
+
+# Spellings of the same entity, matched on whole words after case folding
+ENTITY_ALIASES: Dict[str, str] = {
+    "artificial intelligence": "ai",
+    "a.i.": "ai",
+    "machine learning": "ml",
+    "large language models": "llm",
+    "large language model": "llm",
+    "llms": "llm",
+    "u.s.": "us",
+    "u.s.a.": "us",
+    "usa": "us",
+    "united states": "us",
+    "united states of america": "us",
+    "u.k.": "uk",
+    "united kingdom": "uk",
+    "e-mail": "email",
+}
+
+_POSSESSIVE = re.compile(r"['’]s\b")
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}\b)")
+# Terms keep "node.js", "c++" and "c#" whole; the ASCII pattern is the fast path
+_ASCII_TOKEN = re.compile(r"[a-z0-9]+(?:[.+#][a-z0-9]+)*[+#]*")
+_TOKEN = re.compile(r"[^\W_]+(?:[.+#][^\W_]+)*[+#]*")
+
+
+def _tokenize(text: str) -> List[str]:
+    return (_ASCII_TOKEN if text.isascii() else _TOKEN).findall(text)
+
+
+# Aliases as token tuples, looked up only at tokens that can start one
+_ALIASES: Dict[Tuple[str, ...], str] = {tuple(_tokenize(alias)): target for alias, target in ENTITY_ALIASES.items()}
+_ALIAS_HEADS = frozenset(alias[0] for alias in _ALIASES)
+_ALIAS_MAX_WORDS = max(len(alias) for alias in _ALIASES)
+
+
+def _resolve_aliases(terms: List[str]) -> List[str]:
+    if _ALIAS_HEADS.isdisjoint(terms):
+        return terms
+    resolved = []
+    i = 0
+    while i < len(terms):
+        if terms[i] in _ALIAS_HEADS:
+            for n in range(min(_ALIAS_MAX_WORDS, len(terms) - i), 0, -1):
+                target = _ALIASES.get(tuple(terms[i:i + n]))
+                if target is not None:
+                    resolved.append(target)
+                    i += n
+                    break
+            else:
+                resolved.append(terms[i])
+                i += 1
+        else:
+            resolved.append(terms[i])
+            i += 1
+    return resolved
+
+
+_SUFFIXES = (("ies", "y"), ("sses", "ss"), ("ing", ""), ("ed", ""), ("s", ""))
+_KEEP_DOUBLE = frozenset("lsz")
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Light suffix stripping so that e.g. compute/computes/computing/computed agree.
+
+    Removes one plural or -ing/-ed suffix, then a doubled final consonant
+    (running -> run) or a final "e" (compute -> comput). Words shorter than
+    five letters are left alone.
+    """
+    if len(word) < 5 or not word.isalpha() or word.endswith(("ss", "us", "is")):
+        return word
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            break
+    if len(word) >= 4 and word[-1] == word[-2] and word[-1] not in _KEEP_DOUBLE and word[-1] not in "aeiou":
+        return word[:-1]
+    if len(word) >= 4 and word.endswith("e"):
+        return word[:-1]
+    return word
+
+
+def _fold(text: str) -> str:
+    """NFKC-normalize, case-fold and strip accents."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    if not text.isascii():
+        text = "".join(
+            ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch)
+        )
+    return text
+
+
+@lru_cache(maxsize=65536)
+def canonicalize(
+    query: str,
+    drop_stopwords: bool = True,
+    stem_words: bool = True,
+    sort_terms: bool = True,
+) -> str:
+    """Canonical form of a query: normalized terms joined by single spaces.
+
+    Args:
+        query: Raw query text.
+        drop_stopwords: Remove filler words (kept if nothing else remains).
+        stem_words: Strip plural and -ing/-ed suffixes.
+        sort_terms: Sort and de-duplicate terms so word order does not matter.
+    """
+    text = _fold(query)
+    if "'" in text or "’" in text:
+        text = _POSSESSIVE.sub("", text)
+    if "," in text:
+        text = _THOUSANDS.sub("", text)
+    terms = _resolve_aliases(_tokenize(text))
+
+    if drop_stopwords:
+        terms = [term for term in terms if term not in STOPWORDS] or terms
+    if stem_words:
+        terms = [stem(term) for term in terms]
+    if sort_terms:
+        terms = sorted(set(terms))
+    return " ".join(terms)
+
+
+@lru_cache(maxsize=65536)
+def normalize(query: str) -> str:
+    """Order-preserving, lossless form of a query: folded terms joined by single spaces.
+
+    "What is Agentic AI?" and "what is agentic  ai" agree; "dogs bite men"
+    and "men bite dogs" do not.
+    """
+    text = _fold(query)
+    if "," in text:
+        text = _THOUSANDS.sub("", text)
+    return " ".join(_tokenize(text))
+
+
+@lru_cache(maxsize=65536)
+def query_key(query: str, namespace: str = "") -> str:
+    """Stable 32-hex-digit hash of a query's normalized form, optionally scoped by namespace."""
+    return hashlib.blake2b(f"{namespace}\0{normalize(query)}".encode("utf-8"), digest_size=16).hexdigest()
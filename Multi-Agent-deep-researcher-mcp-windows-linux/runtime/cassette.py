@@ -0,0 +1,249 @@
+"""
+Record/Replay Cassettes
+
+Makes research runs reproducible and offline. With CASSETTE_MODE=record,
+every LinkUp search and Ollama generation is performed live and appended to
+a cassette file; with CASSETTE_MODE=replay the same requests are answered
+from the cassette without touching the network, so the pipeline's own
+overhead can be measured and profiled in isolation.
+
+A cassette is one append-only file: a magic line, then records of
+
+    <request hash> <blob length>\\n<zlib-compressed JSON blob>
+
+where the blob holds the request, the response and how long the call took
+(streams keep the arrival time of every chunk). The index of request hash ->
+record offsets is rebuilt by skipping from header to header on open; a
+last record cut short by a crash is ignored, and cut off before recording
+resumes. A request recorded several times is replayed in recorded order, repeating the
+last recording once they run out.
+
+Replay sleeps for the recorded duration scaled by CASSETTE_LATENCY (0 serves
+instantly, 1 reproduces recorded timing).
+"""
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from runtime.state import DEFAULT_SQLITE_PATH
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "record", "replay")
+MAGIC = b"RESEARCH-CASSETTE 1\n"
+DEFAULT_CASSETTE_PATH = DEFAULT_SQLITE_PATH.parent / "cassettes" / "default.cassette"
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+def request_key(target: str, request: Dict[str, Any]) -> str:
+    """Stable hash of a request; dict key order does not matter."""
+    canonical = json.dumps([target, request], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """One cassette file in record or replay mode.
+
+    Args:
+        path: Cassette file; created on first record.
+        mode: "record" or "replay".
+        latency_scale: Multiplier applied to recorded durations on replay.
+    """
+
+    def __init__(self, path: Path, mode: str, latency_scale: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._index: Dict[str, List[int]] = defaultdict(list)
+        self._played: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        if self.path.exists():
+            self._load_index()
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load_index(self) -> None:
+        with open(self.path, "rb") as f:
+            if f.readline() != MAGIC:
+                raise ValueError(f"Not a cassette file: {self.path}")
+            size = os.fstat(f.fileno()).st_size
+            offset = f.tell()
+            while offset < size:
+                header = f.readline()
+                try:
+                    key, length = header.split()
+                    end = offset + len(header) + int(length)
+                except ValueError:
+                    end = None
+                if end is None or end > size:
+                    break
+                self._index[key.decode("ascii")].append(offset)
+                f.seek(end)
+                offset = end
+        if offset < size:
+            logger.warning("Ignoring truncated cassette tail at byte %d of %s", offset, self.path)
+            if self.mode == "record":
+                # New records would otherwise be appended after the partial one
+                # and skipped with it on every later load
+                os.truncate(self.path, offset)
+        logger.info("Loaded cassette %s (%d requests)", self.path, len(self._index))
+
+    def _append(self, key: str, record: Dict[str, Any]) -> None:
+        blob = zlib.compress(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+        data = f"{key} {len(blob)}\n".encode("ascii") + blob
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # O_APPEND with a single write keeps records whole across workers
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.write(fd, MAGIC)
+                offset = os.lseek(fd, 0, os.SEEK_END)
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            self._index[key].append(offset)
+
+    def _read(self, offset: int) -> Dict[str, Any]:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            _, length = f.readline().split()
+            return json.loads(zlib.decompress(f.read(int(length))))
+
+    def _next_recording(self, target: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        key = request_key(target, request)
+        with self._lock:
+            offsets = self._index.get(key)
+            if not offsets:
+                raise CassetteMiss(f"No recorded {target} call for request {key}")
+            n = self._played[key]
+            self._played[key] = n + 1
+            offset = offsets[min(n, len(offsets) - 1)]
+        return self._read(offset)
+
+    def _sleep(self, seconds: float) -> None:
+        if self.latency_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.latency_scale)
+
+    def call(self, target: str, request: Dict[str, Any], perform: Callable[[], Any]) -> Any:
+        """Result of perform() for a request: recorded live, or replayed.
+
+        The result must be JSON-serializable. Exceptions are not recorded.
+        """
+        if self.replaying:
+            recording = self._next_recording(target, request)
+            self._sleep(recording["elapsed"])
+            return recording["response"]
+
+        started = time.monotonic()
+        response = perform()
+        self._append(request_key(target, request), {
+            "target": target, "request": request, "response": response,
+            "elapsed": round(time.monotonic() - started, 4),
+        })
+        return response
+
+    def stream(self, target: str, request: Dict[str, Any], open_stream: Callable[[], Iterator[Any]]) -> "Tape":
+        """A Tape over a streamed response: recorded live, or replayed."""
+        if self.replaying:
+            recording = self._next_recording(target, request)
+            return Tape(self._replay(recording["response"]))
+        return Tape(open_stream(), record=lambda chunks: self._append(request_key(target, request), {
+            "target": target, "request": request, "response": chunks,
+            "elapsed": chunks[-1][0] if chunks else 0.0,
+        }))
+
+    def _replay(self, chunks: List[Tuple[float, Any]]) -> Iterator[Any]:
+        started = time.monotonic()
+        for at, chunk in chunks:
+            if self.latency_scale > 0:
+                delay = started + at * self.latency_scale - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield chunk
+
+
+class Tape:
+    """Iterator over stream chunks that records them when finish() is called.
+
+    Only streams the consumer finished (reached the end, a stop sequence or
+    a token limit) are recorded; abandoned or failed streams are not, as
+    replaying them would cut a later run short.
+    """
+
+    def __init__(self, chunks: Iterator[Any], record: Optional[Callable[[List], None]] = None):
+        self._chunks = iter(chunks)
+        self._record = record
+        self._seen: List[Tuple[float, Any]] = []
+        self._started = time.monotonic()
+
+    def __iter__(self) -> "Tape":
+        return self
+
+    def __next__(self) -> Any:
+        chunk = next(self._chunks)
+        if self._record is not None:
+            self._seen.append((round(time.monotonic() - self._started, 4), chunk))
+        return chunk
+
+    def finish(self) -> None:
+        if self._record is not None:
+            self._record(self._seen)
+            self._record = None
+
+    def close(self) -> None:
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The process-wide cassette set by CASSETTE_MODE, or None when off.
+
+    CASSETTE_PATH picks the file and CASSETTE_LATENCY scales replayed
+    latency.
+    """
+    global _cassette
+    mode = os.getenv("CASSETTE_MODE", "off").lower()
+    if mode == "off":
+        return None
+    if mode not in MODES:
+        raise ValueError(f"CASSETTE_MODE must be one of {', '.join(MODES)}")
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette(
+                    Path(os.getenv("CASSETTE_PATH") or DEFAULT_CASSETTE_PATH),
+                    mode,
+                    latency_scale=float(os.getenv("CASSETTE_LATENCY", "0")),
+                )
+    return _cassette
+
+
+def recorded_stream(target: str, request: Dict[str, Any], open_stream: Callable[[], Iterator[Any]]) -> Tape:
+    """Tape through the active cassette, or straight over open_stream() when there is none."""
+    cassette = get_cassette()
+    if cassette is None:
+        return Tape(open_stream())
+    return cassette.stream(target, request, open_stream)
@@ -0,0 +1,120 @@
+"""
+Response Compression
+
+ASGI middleware that compresses complete (non-streaming) responses with
+brotli when the client accepts it and the optional `brotli` package is
+installed, otherwise gzip. Small bodies and already-compressed content types
+are sent as-is; streamed responses pass through untouched so chunks still
+reach the client as they are produced.
+"""
+
+import gzip
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from runtime.metrics import REGISTRY
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+RESPONSE_BYTES = REGISTRY.counter("http_response_bytes_total", "Response body bytes sent, by encoding")
+UNCOMPRESSED_BYTES = REGISTRY.counter(
+    "http_response_uncompressed_bytes_total", "Response body bytes before compression, by encoding"
+)
+COMPRESS_SECONDS = REGISTRY.histogram(
+    "http_compression_seconds", "Time spent compressing responses",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5)
+)
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml")
+
+
+def compress(data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """Compress data with "br" or "gzip"."""
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best encoding the client accepts that we can produce."""
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """Compress response bodies of at least minimum_size bytes."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks = []
+        streaming = False
+
+        async def send_compressed(message):
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                # Streaming response: flush what we have and stop buffering
+                streaming = True
+                await send(start_message)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                len(body) >= self.minimum_size
+                and "content-encoding" not in headers
+                and "content-range" not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                started = time.perf_counter()
+                compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+                COMPRESS_SECONDS.observe(time.perf_counter() - started, encoding=encoding)
+                UNCOMPRESSED_BYTES.inc(len(body), encoding=encoding)
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers and not headers["etag"].startswith("W/"):
+                    # The encoded bytes differ from the identity representation
+                    headers["ETag"] = "W/" + headers["etag"]
+                RESPONSE_BYTES.inc(len(body), encoding=encoding)
+            else:
+                RESPONSE_BYTES.inc(len(body), encoding="identity")
+
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,105 @@
+"""
+Deadlines and Cancellation
+
+A Deadline travels with a research run through a context variable, so code
+running in worker threads (crew steps, LinkUp and Ollama calls) can see when
+the caller has gone away or the time budget is spent and stop early.
+asyncio.to_thread copies the current context, so the deadline set by the
+HTTP or MCP handler is visible inside crew.kickoff.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a run's deadline has passed or its caller cancelled it."""
+
+
+class Deadline:
+    """Absolute expiry time plus an explicit cancellation flag.
+
+    Args:
+        timeout: Seconds from now, or None for no time limit.
+        parent: Enclosing deadline; the child expires no later than its parent
+            and is cancelled whenever the parent is.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["Deadline"] = None):
+        self.parent = parent
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        if parent is not None and parent.expires_at is not None:
+            if self.expires_at is None or parent.expires_at < self.expires_at:
+                self.expires_at = parent.expires_at
+        self._cancel_reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Mark the run as abandoned; workers stop at their next check."""
+        if self._cancel_reason is None:
+            self._cancel_reason = reason
+
+    @property
+    def cancel_reason(self) -> Optional[str]:
+        if self._cancel_reason is not None:
+            return self._cancel_reason
+        if self.parent is not None:
+            return self.parent.cancel_reason
+        return None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when there is no time limit."""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return self.cancel_reason is not None or (remaining is not None and remaining <= 0)
+
+    def check(self) -> None:
+        """Raise DeadlineExceeded if the run should stop."""
+        reason = self.cancel_reason
+        if reason is not None:
+            raise DeadlineExceeded(f"Research run {reason}")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Research run exceeded its deadline")
+
+    def timeout_for(self, default: float) -> float:
+        """Timeout for one outbound call: the default capped by the time left."""
+        self.check()
+        remaining = self.remaining()
+        return default if remaining is None else max(0.1, min(default, remaining))
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("research_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make deadline the current one for the enclosed block."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check_deadline(*_args, **_kwargs) -> None:
+    """Raise if the current run should stop; usable as a crew step callback."""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def call_timeout(default: float) -> float:
+    """Timeout for an outbound request made on behalf of the current run."""
+    deadline = _current.get()
+    return default if deadline is None else deadline.timeout_for(default)
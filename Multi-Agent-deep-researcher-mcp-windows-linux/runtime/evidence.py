@@ -0,0 +1,172 @@
+"""
+Evidence Pool
+
+Related queries keep surfacing the same pages. The pool stores one
+LLM-written summary per source, keyed by its canonical URL plus a hash of
+the content LinkUp returned for it, in the shared state backend. Every run
+in every worker that meets the same page with the same content reuses the
+summary instead of asking the model again; a page whose content changed
+gets a new entry.
+
+Pool hits and the LLM tokens they saved (prompt plus summary, estimated
+at four characters per token) are exported as metrics and by
+evidence_report().
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from runtime.metrics import REGISTRY
+from runtime.profiling import attributed
+from runtime.state import StateBackend, get_state_backend
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = REGISTRY.counter("evidence_pool_total", "Evidence pool lookups, by result")
+TOKENS_SAVED = REGISTRY.counter("evidence_tokens_saved_total", "Estimated LLM tokens saved by reused source summaries")
+
+# Query parameters that only track where a click came from
+_TRACKING_PARAMS = re.compile(r"^(?:utm_\w+|fbclid|gclid|mc_[ce]id|ref|ref_src|igshid|si)$", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL so trivially different links to one page compare equal.
+
+    Lower-cases scheme and host, drops "www.", default ports, fragments,
+    tracking parameters and trailing slashes, and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(key)
+    ))
+    return urlunsplit(("https" if scheme in ("http", "https") else scheme, host, path, query, ""))
+
+
+def content_hash(text: str) -> str:
+    """Hash of a source's content, ignoring whitespace differences."""
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+class EvidencePool:
+    """Shared per-source summaries.
+
+    Args:
+        state: Backend holding the summaries; defaults to the shared one.
+        ttl: Seconds a summary is kept.
+        workers: Sources summarized in parallel for one search.
+    """
+
+    def __init__(self, state: Optional[StateBackend] = None, ttl: float = 7 * 86400, workers: int = 4):
+        self.state = state or get_state_backend()
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="evidence")
+
+    @staticmethod
+    def key(url: str, content: str) -> str:
+        url_hash = hashlib.blake2b(canonical_url(url).encode("utf-8"), digest_size=12).hexdigest()
+        return f"evidence:{url_hash}:{content_hash(content)}"
+
+    def summary(
+        self,
+        url: str,
+        content: str,
+        summarize: Callable[[], str],
+        prompt_tokens: int = 0,
+    ) -> str:
+        """Pooled summary of a source, produced by summarize() at most once across workers.
+
+        Args:
+            url: Source URL.
+            content: Source text the summary is of.
+            summarize: Produces the summary; exceptions propagate and nothing is stored.
+            prompt_tokens: Estimated prompt size, counted as saved on a hit.
+        """
+        key = self.key(url, content)
+        raw = self.state.get(key)
+        computed = False
+
+        if raw is None:
+            def compute() -> str:
+                nonlocal computed
+                computed = True
+                summary = summarize()
+                return json.dumps({"url": canonical_url(url), "summary": summary, "created_at": time.time()})
+
+            raw = self.state.get_or_compute(key, compute, ttl=self.ttl, wait_timeout=120)
+
+        summary = json.loads(raw)["summary"]
+        if computed:
+            LOOKUPS.inc(result="miss")
+        else:
+            LOOKUPS.inc(result="hit")
+            TOKENS_SAVED.inc(prompt_tokens + _estimate_tokens(summary))
+        return summary
+
+    def summaries(
+        self,
+        sources: Sequence[Tuple[str, str, str]],
+        generate: Callable[[str], str],
+    ) -> List[Optional[str]]:
+        """Summaries of (url, content, prompt) sources in parallel; None where generating failed.
+
+        generate(prompt) asks the model for a summary that is not pooled yet.
+        """
+        def one(url: str, content: str, prompt: str) -> Optional[str]:
+            try:
+                return self.summary(url, content, lambda: generate(prompt), _estimate_tokens(prompt))
+            except Exception as e:
+                logger.warning("Could not summarize %s: %s", url, e)
+                return None
+
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, attributed(one), url, content, prompt)
+            for url, content, prompt in sources
+        ]
+        return [future.result() for future in futures]
+
+
+_pool: Optional[EvidencePool] = None
+
+
+def get_evidence_pool() -> EvidencePool:
+    """Process-wide pool; EVIDENCE_TTL and EVIDENCE_WORKERS configure it."""
+    global _pool
+    if _pool is None:
+        _pool = EvidencePool(
+            ttl=float(os.getenv("EVIDENCE_TTL", str(7 * 86400))),
+            workers=int(os.getenv("EVIDENCE_WORKERS", "4")),
+        )
+    return _pool
+
+
+def evidence_report() -> Dict[str, Any]:
+    """Hit rate and tokens saved by this worker so far."""
+    hits = LOOKUPS.value(result="hit")
+    lookups = hits + LOOKUPS.value(result="miss")
+    return {
+        "lookups": int(lookups),
+        "hit_rate": hits / lookups if lookups else None,
+        "tokens_saved": int(TOKENS_SAVED.value()),
+    }
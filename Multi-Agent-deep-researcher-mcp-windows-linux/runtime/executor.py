@@ -0,0 +1,87 @@
+"""
+Blocking-Work Executor
+
+asyncio.to_thread and run_in_executor(None, ...) share the loop's default
+executor, min(32, cores + 4) threads, which silently caps how many research
+runs, searches and generations can be in progress at once. This module owns
+one dedicated pool (EXECUTOR_THREADS, 64 by default) for every blocking piece
+that is left - a crew kickoff, a LinkUp call, a store read - and installs it
+as the loop's default executor, so concurrency is bounded by admission
+control rather than by the pool size.
+
+run_blocking() is the to_thread replacement: it carries the caller's
+context (deadline, request id, memory account) into the worker thread.
+"""
+
+import os
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from runtime.metrics import REGISTRY
+from runtime.profiling import attributed
+
+T = TypeVar("T")
+
+BUSY_THREADS = REGISTRY.gauge("executor_busy_threads", "Blocking calls currently running on the executor")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_busy = 0
+_busy_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """The process-wide pool for blocking calls, sized by EXECUTOR_THREADS."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("EXECUTOR_THREADS", "64")), thread_name_prefix="blocking"
+                )
+    return _executor
+
+
+def install_executor(loop: Optional[asyncio.AbstractEventLoop] = None) -> ThreadPoolExecutor:
+    """Make the pool the default executor of loop (the running one by default),
+    so asyncio.to_thread and library calls use it too."""
+    executor = get_executor()
+    (loop or asyncio.get_running_loop()).set_default_executor(executor)
+    return executor
+
+
+def _track_busy(delta: int) -> None:
+    global _busy
+    with _busy_lock:
+        _busy += delta
+        BUSY_THREADS.set(_busy)
+
+
+def _counted(func: Callable[..., T]) -> Callable[..., T]:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _track_busy(1)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _track_busy(-1)
+    return wrapper
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call on the dedicated pool within the caller's context."""
+    call = functools.partial(_counted(attributed(func)), *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), contextvars.copy_context().run, call)
+
+
+def submit_blocking(loop: asyncio.AbstractEventLoop, func: Callable[[], Any]) -> "asyncio.Future[Any]":
+    """Start a blocking producer on the pool within the caller's context without awaiting it."""
+    return loop.run_in_executor(get_executor(), contextvars.copy_context().run, _counted(attributed(func)))
+
+
+def executor_report() -> Dict[str, int]:
+    return {"threads": int(os.getenv("EXECUTOR_THREADS", "64")), "busy": _busy}
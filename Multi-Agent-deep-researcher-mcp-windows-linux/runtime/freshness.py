@@ -0,0 +1,300 @@
+"""
+Freshness Engine
+
+Decides how long cached answers stay valid. Queries about fast-moving topics
+(news, prices, "latest", the current year) are time-sensitive and get short
+TTLs; everything else is stable and is kept much longer.
+
+FreshCache wraps the shared state backend with stale-while-revalidate: within
+its TTL an entry is served as-is, for a grace period after that it is still
+served but refreshed in the background, and only then does a caller wait for
+a new value. A background refresher also re-computes popular entries shortly
+before they go stale, so hot queries rarely see either case.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, Optional
+
+from runtime.metrics import REGISTRY
+from runtime.state import StateBackend, get_state_backend
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = REGISTRY.counter("freshness_cache_total", "Freshness cache lookups, by namespace and result")
+REFRESHES = REGISTRY.counter("freshness_refresh_total", "Background refreshes, by namespace, reason and outcome")
+
+TIME_SENSITIVE = "time_sensitive"
+STABLE = "stable"
+
+_TIME_SENSITIVE_TERMS = re.compile(
+    r"\b(?:news|latest|newest|recent(?:ly)?|today|tonight|yesterday|tomorrow|now|current(?:ly)?|"
+    r"breaking|live|this (?:week|month|year)|price[sd]?|pricing|stocks?|shares?|market|"
+    r"exchange rates?|weather|forecast|scores?|standings|election|polls?|release dates?|"
+    r"updates?|announce[sd]?|trending)\b",
+    re.IGNORECASE,
+)
+_YEAR = re.compile(r"\b(20\d\d)\b")
+
+
+@dataclass(frozen=True)
+class FreshnessPolicy:
+    """TTL (seconds an entry is fresh) and grace (seconds it may then be served stale)."""
+    ttl: float
+    grace: float
+
+
+POLICIES: Dict[str, FreshnessPolicy] = {
+    TIME_SENSITIVE: FreshnessPolicy(
+        ttl=float(os.getenv("FRESHNESS_TTL_TIME_SENSITIVE", "300")),
+        grace=float(os.getenv("FRESHNESS_GRACE_TIME_SENSITIVE", "120")),
+    ),
+    STABLE: FreshnessPolicy(
+        ttl=float(os.getenv("FRESHNESS_TTL_STABLE", "86400")),
+        grace=float(os.getenv("FRESHNESS_GRACE_STABLE", "86400")),
+    ),
+}
+
+
+def classify(query: str) -> str:
+    """TIME_SENSITIVE if the query is about something that changes quickly, else STABLE."""
+    if _TIME_SENSITIVE_TERMS.search(query):
+        return TIME_SENSITIVE
+    this_year = date.today().year
+    if any(int(year) >= this_year - 1 for year in _YEAR.findall(query)):
+        return TIME_SENSITIVE
+    return STABLE
+
+
+def policy_for(query: str) -> FreshnessPolicy:
+    return POLICIES[classify(query)]
+
+
+@dataclass
+class _Tracked:
+    """A key this worker has served, kept so the refresher can re-compute it."""
+    query: str
+    compute: Callable[[], str]
+    should_cache: Callable[[str], bool]
+    stored_at: float
+    hits: float = 0.0
+
+
+class FreshCache:
+    """Stale-while-revalidate cache over the shared state backend.
+
+    Entries are stored as JSON with the time they were computed, so every
+    worker agrees on their age. At most max_tracked keys are remembered for
+    refreshing, least recently served first out.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        state: Optional[StateBackend] = None,
+        refresh_workers: int = 2,
+        max_tracked: Optional[int] = None,
+    ):
+        self.namespace = namespace
+        self.state = state or get_state_backend()
+        self.max_tracked = max_tracked or int(os.getenv("FRESHNESS_MAX_TRACKED", "10000"))
+        self._tracked: "OrderedDict[str, _Tracked]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix=f"refresh-{namespace}")
+
+    def _store(self, key: str, value: str, policy: FreshnessPolicy) -> float:
+        stored_at = time.time()
+        entry = json.dumps({"value": value, "stored_at": stored_at})
+        self.state.set(key, entry, ttl=policy.ttl + policy.grace)
+        return stored_at
+
+    def _load(self, key: str) -> Optional[Dict]:
+        raw = self.state.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def get(
+        self,
+        key: str,
+        query: str,
+        compute: Callable[[], str],
+        should_cache: Callable[[str], bool] = lambda value: True,
+        wait_timeout: float = 60.0,
+    ) -> str:
+        """Cached value for key, computing it (once across workers) when missing or too old.
+
+        Args:
+            key: Cache key within this namespace.
+            query: Query the value answers; decides the freshness policy.
+            compute: Produces a new value; also used for background refreshes.
+            should_cache: Returns False for values that must not be cached.
+            wait_timeout: Seconds to wait for another worker computing the same key.
+        """
+        key = f"{self.namespace}:{key}"
+        policy = policy_for(query)
+        entry = self._load(key)
+        now = time.time()
+
+        if entry is not None:
+            age = now - entry["stored_at"]
+            self._track(key, query, compute, should_cache, entry["stored_at"])
+            if age < policy.ttl:
+                CACHE_LOOKUPS.inc(namespace=self.namespace, result="fresh")
+                return entry["value"]
+            if age < policy.ttl + policy.grace:
+                CACHE_LOOKUPS.inc(namespace=self.namespace, result="stale")
+                self._executor.submit(self._refresh, key, "stale")
+                return entry["value"]
+
+        CACHE_LOOKUPS.inc(namespace=self.namespace, result="miss")
+
+        def compute_entry() -> str:
+            value = compute()
+            return json.dumps({"value": value, "stored_at": time.time()})
+
+        raw = self.state.get_or_compute(
+            f"{key}:compute",
+            compute_entry,
+            ttl=min(5, policy.ttl),  # Only shares the result with concurrent waiters
+            should_cache=lambda raw: should_cache(json.loads(raw)["value"]),
+            wait_timeout=wait_timeout,
+        )
+        fresh = json.loads(raw)
+        if should_cache(fresh["value"]):
+            stored_at = self._store(key, fresh["value"], policy)
+            self._track(key, query, compute, should_cache, stored_at)
+        return fresh["value"]
+
+    def invalidate(self, key: str) -> None:
+        key = f"{self.namespace}:{key}"
+        self.state.delete(key)
+        with self._lock:
+            self._tracked.pop(key, None)
+
+    def _track(self, key, query, compute, should_cache, stored_at) -> None:
+        with self._lock:
+            tracked = self._tracked.get(key)
+            if tracked is None:
+                tracked = self._tracked[key] = _Tracked(query, compute, should_cache, stored_at)
+            else:
+                self._tracked.move_to_end(key)
+            tracked.stored_at = max(tracked.stored_at, stored_at)
+            tracked.hits += 1
+            self._evict(time.time())
+
+    def _evict(self, now: float) -> None:
+        """Forget least recently served keys past their grace period, and any over max_tracked.
+
+        Keeps the table bounded even when the refresher, which also prunes it,
+        is disabled. Called with the lock held.
+        """
+        while self._tracked:
+            key, oldest = next(iter(self._tracked.items()))
+            policy = policy_for(oldest.query)
+            if len(self._tracked) <= self.max_tracked and now - oldest.stored_at < policy.ttl + policy.grace:
+                break
+            del self._tracked[key]
+
+    def _refresh(self, key: str, reason: str) -> None:
+        """Re-compute one tracked entry unless another worker is already doing it."""
+        with self._lock:
+            tracked = self._tracked.get(key)
+        if tracked is None:
+            return
+        lease = f"lease:refresh:{key}"
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        if not self.state.acquire_lease(lease, owner, ttl=120):
+            return
+        try:
+            entry = self._load(key)
+            policy = policy_for(tracked.query)
+            if entry is not None and time.time() - entry["stored_at"] < policy.ttl * 0.5:
+                return  # Someone refreshed it since we looked
+            value = tracked.compute()
+            if not tracked.should_cache(value):
+                REFRESHES.inc(namespace=self.namespace, reason=reason, outcome="failed")
+                return
+            stored_at = self._store(key, value, policy)
+            with self._lock:
+                tracked.stored_at = stored_at
+            REFRESHES.inc(namespace=self.namespace, reason=reason, outcome="ok")
+        except Exception as e:
+            REFRESHES.inc(namespace=self.namespace, reason=reason, outcome="failed")
+            logger.warning("Background refresh of %s failed: %s", key, e)
+        finally:
+            self.state.release_lease(lease, owner)
+
+    def refresh_popular(self, min_hits: float, ahead: float) -> int:
+        """Refresh entries with at least min_hits recent hits that are within `ahead` of their TTL.
+
+        Hit counts are halved on every call, so popularity follows recent
+        traffic, and entries nobody has asked for in a while are forgotten.
+        Returns the number of refreshes started.
+        """
+        now = time.time()
+        due = []
+        with self._lock:
+            for key, tracked in list(self._tracked.items()):
+                policy = policy_for(tracked.query)
+                age = now - tracked.stored_at
+                if tracked.hits >= min_hits and age >= policy.ttl * ahead:
+                    due.append(key)
+                tracked.hits /= 2
+                if tracked.hits < 0.1 and age >= policy.ttl + policy.grace:
+                    del self._tracked[key]
+        for key in due:
+            self._executor.submit(self._refresh, key, "popular")
+        return len(due)
+
+
+_caches: Dict[str, FreshCache] = {}
+_caches_lock = threading.Lock()
+_refresher: Optional[threading.Thread] = None
+
+
+def _refresh_loop(interval: float, min_hits: float, ahead: float) -> None:
+    while True:
+        time.sleep(interval)
+        for cache in list(_caches.values()):
+            try:
+                started = cache.refresh_popular(min_hits, ahead)
+                if started:
+                    logger.info("Refreshing %d popular %s entries", started, cache.namespace)
+            except Exception as e:
+                logger.warning("Refresher pass over %s failed: %s", cache.namespace, e)
+
+
+def get_fresh_cache(namespace: str) -> FreshCache:
+    """Process-wide cache for a namespace; starts the background refresher on first use.
+
+    FRESHNESS_REFRESH_INTERVAL (seconds, 0 disables the refresher),
+    FRESHNESS_REFRESH_MIN_HITS and FRESHNESS_REFRESH_AHEAD (fraction of the
+    TTL after which popular entries are refreshed) tune the refresher.
+    """
+    global _refresher
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = _caches[namespace] = FreshCache(namespace)
+        interval = float(os.getenv("FRESHNESS_REFRESH_INTERVAL", "30"))
+        if _refresher is None and interval > 0:
+            _refresher = threading.Thread(
+                target=_refresh_loop,
+                args=(
+                    interval,
+                    float(os.getenv("FRESHNESS_REFRESH_MIN_HITS", "3")),
+                    float(os.getenv("FRESHNESS_REFRESH_AHEAD", "0.8")),
+                ),
+                name="freshness-refresher",
+                daemon=True,
+            )
+            _refresher.start()
+    return cache
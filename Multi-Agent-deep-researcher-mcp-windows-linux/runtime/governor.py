@@ -0,0 +1,255 @@
+"""
+Generation Governor
+
+Per-agent generation settings - output token limit (Ollama's num_predict),
+temperature and context window - so report length is an explicit trade
+against latency instead of whatever "comprehensive" means to the model.
+
+Output is unlimited unless a limit is configured (GEN_<ROLE>_NUM_PREDICT)
+or latency-target mode is on. In latency-target mode (GEN_LATENCY_TARGET
+seconds) each agent gets a share of the target and its token limit is the
+number of tokens it can produce in that share at the slow end (5th
+percentile) of its recently observed throughput, so about 95% of runs finish
+within the target. Limits only ever tighten a configured num_predict.
+
+Each research run records the budget it was given and the tokens each agent
+actually produced; both are logged and exported as metrics.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from runtime.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("searcher", "analyst", "writer")
+
+GENERATION_TOKENS = REGISTRY.counter(
+    "generation_tokens_total", "Output tokens per agent role, budgeted and actually generated"
+)
+BUDGET_USED = REGISTRY.histogram(
+    "generation_budget_used_ratio", "Generated tokens as a fraction of the role's budget, per run",
+    buckets=(0.25, 0.5, 0.75, 0.9, 1.0, 1.1, 1.5, 2.0)
+)
+
+# role: (temperature, num_ctx); num_predict has no default, output is unlimited
+_DEFAULTS = {
+    "searcher": (0.2, 4096),
+    "analyst": (0.3, 4096),
+    "writer": (0.5, 4096),
+}
+
+# Fraction of the latency target each role may spend
+LATENCY_SHARES = {"searcher": 0.2, "analyst": 0.3, "writer": 0.5}
+
+
+@dataclass(frozen=True)
+class GenerationSettings:
+    """Ollama generation options for one agent role; num_predict None means unlimited."""
+    num_predict: Optional[int]
+    temperature: float
+    num_ctx: int
+
+    def options(self) -> Dict[str, Any]:
+        options = {"temperature": self.temperature, "num_ctx": self.num_ctx}
+        if self.num_predict:
+            options["num_predict"] = self.num_predict
+        return options
+
+
+class GenerationGovernor:
+    """Chooses per-role generation settings, optionally to meet a latency target.
+
+    Args:
+        settings: Configured settings per role; num_predict, if set, is the ceiling.
+        latency_target: Target p95 seconds of model time per run, or None.
+        min_tokens: Smallest token limit latency mode will set.
+        window: Recent throughput samples kept per role.
+        min_samples: Samples needed before latency mode adjusts a role.
+    """
+
+    def __init__(
+        self,
+        settings: Dict[str, GenerationSettings],
+        latency_target: Optional[float] = None,
+        min_tokens: int = 128,
+        window: int = 50,
+        min_samples: int = 5,
+    ):
+        self.settings = settings
+        self.latency_target = latency_target
+        self.min_tokens = min_tokens
+        self.min_samples = min_samples
+        self._rates: Dict[str, Deque[float]] = {role: deque(maxlen=window) for role in settings}
+        self._lock = threading.Lock()
+
+    def observe(self, role: str, tokens: int, seconds: float) -> None:
+        """Record that a role produced `tokens` in `seconds` (prompt processing included)."""
+        if role in self._rates and tokens > 0 and seconds > 0:
+            with self._lock:
+                self._rates[role].append(tokens / seconds)
+
+    def tokens_per_second(self, role: str) -> Optional[float]:
+        """Slow-end (5th percentile) throughput of a role, or None with too few samples."""
+        with self._lock:
+            rates = sorted(self._rates.get(role, ()))
+        if len(rates) < self.min_samples:
+            return None
+        return rates[int(0.05 * (len(rates) - 1))]
+
+    def budget(self, role: str) -> Optional[int]:
+        """Output token limit for the role's next generation, or None for unlimited."""
+        configured = self.settings[role].num_predict
+        if not self.latency_target:
+            return configured
+        rate = self.tokens_per_second(role)
+        if rate is None:
+            return configured
+        fitted = int(self.latency_target * LATENCY_SHARES.get(role, 0.0) * rate)
+        return max(self.min_tokens, min(configured, fitted) if configured else fitted)
+
+    def settings_for(self, role: str) -> GenerationSettings:
+        return replace(self.settings[role], num_predict=self.budget(role))
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Configured limit, current budget and observed throughput per role."""
+        return {
+            role: {
+                "num_predict": settings.num_predict,
+                "budget": self.budget(role),
+                "temperature": settings.temperature,
+                "num_ctx": settings.num_ctx,
+                "tokens_per_second_p5": self.tokens_per_second(role),
+            }
+            for role, settings in self.settings.items()
+        }
+
+
+class GenerationRun:
+    """Token budgets a run was given and what its agents generated."""
+
+    def __init__(self, governor: GenerationGovernor):
+        self.governor = governor
+        self.budgets = {role: governor.budget(role) for role in governor.settings}
+        self.actual: Dict[str, int] = {role: 0 for role in governor.settings}
+        self.calls: Dict[str, int] = {role: 0 for role in governor.settings}
+        self._lock = threading.Lock()
+        self._lap_started = time.monotonic()
+
+    def lap(self) -> float:
+        """Seconds since the run started or lap() was last called."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._lap_started = now - self._lap_started, now
+        return elapsed
+
+    def settings_for(self, role: str) -> GenerationSettings:
+        """The role's settings with this run's budget."""
+        return replace(self.governor.settings[role], num_predict=self.budgets[role])
+
+    def words(self, role: str) -> Optional[int]:
+        """The role's budget as an approximate word count, for prompts; None if unlimited."""
+        budget = self.budgets[role]
+        if not budget:
+            return None
+        return max(50, int(budget * 0.75) // 10 * 10)
+
+    def length_hint(self, role: str, template: str = "Keep it under {words} words.", scale: float = 1.0) -> str:
+        """template filled with the role's word budget, or "" when output is unlimited."""
+        words = self.words(role)
+        return template.format(words=max(10, int(words * scale))) if words else ""
+
+    def add(self, role: str, tokens: int) -> None:
+        with self._lock:
+            self.actual[role] = self.actual.get(role, 0) + tokens
+            self.calls[role] = self.calls.get(role, 0) + 1
+
+    def summary(self) -> Dict[str, Tuple[int, Optional[int]]]:
+        """(actual, budgeted) tokens per role that generated anything; budgeted
+        is None for unlimited roles.
+
+        A role called several times in a run (DAG mode) is budgeted per call.
+        """
+        with self._lock:
+            return {
+                role: (self.actual[role], self.budgets[role] * self.calls[role] if self.budgets[role] else None)
+                for role in self.actual if self.calls[role]
+            }
+
+
+_run: ContextVar[Optional[GenerationRun]] = ContextVar("generation_run", default=None)
+
+
+@contextmanager
+def generation_run(governor: GenerationGovernor) -> Iterator[GenerationRun]:
+    """Fix budgets for a research run and report budget vs. actual tokens when it ends."""
+    run = GenerationRun(governor)
+    token = _run.set(run)
+    try:
+        yield run
+    finally:
+        _run.reset(token)
+        summary = run.summary()
+        for role, (actual, budgeted) in summary.items():
+            GENERATION_TOKENS.inc(actual, role=role, kind="actual")
+            if budgeted:
+                GENERATION_TOKENS.inc(budgeted, role=role, kind="budget")
+                BUDGET_USED.observe(actual / budgeted, role=role)
+        if summary:
+            logger.info(
+                "Generation tokens (actual/budget): %s",
+                ", ".join(
+                    f"{role} {actual}/{budgeted or 'unlimited'}" for role, (actual, budgeted) in summary.items()
+                )
+            )
+
+
+def record_generation(role: str, tokens: int, seconds: float) -> None:
+    """Report a finished generation to the governor and the current run."""
+    run = _run.get()
+    if run is None:
+        return
+    run.governor.observe(role, tokens, seconds)
+    run.add(role, tokens)
+
+
+def current_generation() -> Optional[GenerationRun]:
+    return _run.get()
+
+
+_governor: Optional[GenerationGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> GenerationGovernor:
+    """Process-wide governor configured from the environment.
+
+    GEN_<ROLE>_NUM_PREDICT, GEN_<ROLE>_TEMPERATURE and GEN_<ROLE>_NUM_CTX set
+    each role's options (roles: SEARCHER, ANALYST, WRITER); output is
+    unlimited unless NUM_PREDICT is set. GEN_LATENCY_TARGET > 0 turns on
+    latency-target mode.
+    """
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                settings = {}
+                for role, (temperature, num_ctx) in _DEFAULTS.items():
+                    prefix = f"GEN_{role.upper()}"
+                    num_predict = int(os.getenv(f"{prefix}_NUM_PREDICT") or 0)
+                    settings[role] = GenerationSettings(
+                        num_predict=num_predict if num_predict > 0 else None,
+                        temperature=float(os.getenv(f"{prefix}_TEMPERATURE") or temperature),
+                        num_ctx=int(os.getenv(f"{prefix}_NUM_CTX") or num_ctx),
+                    )
+                target = float(os.getenv("GEN_LATENCY_TARGET") or 0)
+                _governor = GenerationGovernor(settings, latency_target=target if target > 0 else None)
+    return _governor
@@ -0,0 +1,176 @@
+"""
+Hedged Requests
+
+Cuts tail latency of outbound calls. A call runs normally; if it has not
+finished after the target's observed p90 latency, a duplicate is sent (to the
+same endpoint or another replica) and whichever succeeds first is used. The
+loser's deadline is cancelled so it stops at its next check, and a late
+result it still produces is handed to a cleanup callback.
+
+Hedges are limited by a token budget: every call earns HEDGE_BUDGET tokens
+and a hedge spends one, so at most that fraction of calls (5% by default)
+is ever duplicated, even when a backend slows down across the board.
+"""
+
+import os
+import math
+import logging
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from runtime.deadline import Deadline, current_deadline, deadline_scope
+from runtime.metrics import REGISTRY, Histogram
+from runtime.profiling import attributed
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGES = REGISTRY.counter("hedged_requests_total", "Hedging decisions and outcomes, by target")
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("HEDGE_MAX_THREADS", "32")), thread_name_prefix="hedge"
+)
+
+
+class HedgeBudget:
+    """Token bucket allowing hedges for at most `ratio` of calls."""
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class Hedger:
+    """Runs calls to one target with a hedge after its observed latency quantile.
+
+    Args:
+        target: Name used in metrics and logs.
+        latency: Histogram the target's call latency is recorded in.
+        quantile: Latency quantile after which a hedge is sent.
+        min_samples: Calls observed (per label set) before hedging starts.
+        budget: Shared hedge budget; defaults to HEDGE_BUDGET of calls.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        latency: Histogram,
+        quantile: float = 0.9,
+        min_samples: int = 20,
+        budget: Optional[HedgeBudget] = None,
+    ):
+        self.target = target
+        self.latency = latency
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.budget = budget or HedgeBudget(float(os.getenv("HEDGE_BUDGET", "0.05")))
+
+    def hedge_delay(self, **labels: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None when no hedge should be sent.
+
+        No hedge is sent while there is too little data, when the quantile
+        lies beyond the histogram's last bucket (the target is timing out,
+        and a duplicate would only double the load), or when the delay would
+        outlast the current deadline.
+        """
+        count, _ = self.latency.stats(**labels)
+        if count < self.min_samples:
+            return None
+        delay = self.latency.quantile(self.quantile, **labels)
+        if delay is None or not math.isfinite(delay):
+            return None
+        deadline = current_deadline()
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+    def call(
+        self,
+        attempt: Callable[[int], T],
+        labels: Optional[dict] = None,
+        is_ok: Callable[[T], bool] = lambda result: True,
+        discard: Optional[Callable[[T], None]] = None,
+    ) -> T:
+        """Run attempt(0), hedging with attempt(1) if it is slow.
+
+        Args:
+            attempt: Makes the call; its argument is the attempt number, so
+                a hedge can pick a different replica.
+            labels: Labels of the latency series that sets the hedge delay.
+            is_ok: False for results that should not win the race (error
+                strings), as long as another attempt may still succeed.
+            discard: Called with a successful result that arrived too late.
+
+        Each attempt runs in its own context under a child of the current
+        deadline, which is cancelled when the attempt loses.
+        """
+        labels = labels or {}
+        self.budget.deposit()
+        delay = self.hedge_delay(**labels)
+        if delay is None:
+            return attempt(0)
+
+        parent = current_deadline()
+        attempts: List[Tuple[Future, Deadline]] = []
+
+        def start(number: int) -> None:
+            deadline = Deadline(parent=parent)
+            context = contextvars.copy_context()
+            future = _executor.submit(context.run, attributed(_run_in_scope), deadline, attempt, number)
+            attempts.append((future, deadline))
+
+        start(0)
+        done, _ = wait([attempts[0][0]], timeout=delay)
+        if not done:
+            if self.budget.try_spend():
+                logger.debug("Hedging %s call after %.2fs", self.target, delay)
+                HEDGES.inc(target=self.target, outcome="sent")
+                start(1)
+            else:
+                HEDGES.inc(target=self.target, outcome="over_budget")
+
+        pending = {future for future, _ in attempts}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and is_ok(future.result()):
+                    self._finish(attempts, future, discard)
+                    return future.result()
+        # Every attempt failed; report the primary's outcome as an unhedged call would
+        return attempts[0][0].result()
+
+    def _finish(self, attempts, winner: Future, discard) -> None:
+        """Cancel the attempts that lost and record who won."""
+        if len(attempts) > 1:
+            won = "hedge_won" if winner is attempts[1][0] else "primary_won"
+            HEDGES.inc(target=self.target, outcome=won)
+        for future, deadline in attempts:
+            if future is winner:
+                continue
+            deadline.cancel("lost a hedged race")
+            if discard is not None:
+                future.add_done_callback(
+                    lambda f: discard(f.result()) if f.exception() is None else None
+                )
+
+
+def _run_in_scope(deadline: Deadline, attempt: Callable[[int], T], number: int) -> T:
+    with deadline_scope(deadline):
+        return attempt(number)
@@ -0,0 +1,135 @@
+"""
+Logging Setup
+
+Non-blocking, optionally structured logging for the servers. Records are put
+on an in-memory queue by the calling thread and written to stderr by a
+background listener, so slow terminal or pipe I/O never stalls a request.
+
+Verbose agent traces are sampled per research run: a sampled run logs every
+agent step to the "research.trace" logger, the rest log nothing. The level
+and sample rate can be changed at runtime (see the /admin/logging endpoint).
+"""
+
+import os
+import sys
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, Optional
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+trace_logger = logging.getLogger("research.trace")
+
+_settings: Dict[str, Any] = {
+    "trace_sample_rate": float(os.getenv("CREW_TRACE_SAMPLE_RATE", "0")),
+}
+_listener: Optional[QueueListener] = None
+_configure_lock = threading.Lock()
+_current_run: ContextVar[Optional[str]] = ContextVar("trace_run_id", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """Route all logging through a queue to a background stderr writer.
+
+    Args:
+        level: Root level name; defaults to LOG_LEVEL or INFO.
+        fmt: "text" or "json"; defaults to LOG_FORMAT or text.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, handler, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(QueueHandler(log_queue))
+        root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+
+def get_logging_settings() -> Dict[str, Any]:
+    return {
+        "level": logging.getLevelName(logging.getLogger().level),
+        "trace_sample_rate": _settings["trace_sample_rate"],
+    }
+
+
+def update_logging_settings(
+    level: Optional[str] = None,
+    trace_sample_rate: Optional[float] = None,
+    logger_name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Change the log level (of the root or one logger) and trace sampling at runtime."""
+    if level is not None:
+        logging.getLogger(logger_name).setLevel(level.upper())
+    if trace_sample_rate is not None:
+        _settings["trace_sample_rate"] = min(1.0, max(0.0, trace_sample_rate))
+    return get_logging_settings()
+
+
+@contextmanager
+def run_trace(kind: str, query: str) -> Iterator[Optional[str]]:
+    """Decide whether this run's agent steps are traced; yields the run id if so.
+
+    The decision is stored in a context variable, so it follows the run into
+    the worker thread that executes the crew.
+    """
+    run_id = None
+    if random.random() < _settings["trace_sample_rate"]:
+        run_id = uuid.uuid4().hex[:12]
+        trace_logger.info("Tracing %s run", kind, extra={"run_id": run_id, "query": query})
+    token = _current_run.set(run_id)
+    try:
+        yield run_id
+    finally:
+        _current_run.reset(token)
+
+
+def trace_step(step: Any) -> None:
+    """Log an agent step if the current run was sampled for tracing."""
+    run_id = _current_run.get()
+    if run_id is None:
+        return
+    text = getattr(step, "text", None) or getattr(step, "output", None) or str(step)
+    trace_logger.info(
+        "%s", str(text)[:2000],
+        extra={"run_id": run_id, "step": type(step).__name__, "tool": getattr(step, "tool", None)},
+    )
@@ -0,0 +1,202 @@
+"""
+Memory Accounting
+
+Keeps in-flight research state within what a small box can hold:
+
+- Every admitted run gets a RunMemory account (memory_scope) that records the
+  payload bytes it buffers (LinkUp responses, Ollama generations).
+- PayloadBuffer accumulates such a payload and charges it to the run until
+  it is closed. Payloads are not spilled to disk: every consumer needs the
+  whole body in memory (a parsed JSON document, a generated answer), so a
+  spill would only add disk I/O without lowering peak RSS.
+- MemoryBudget lets admission control hold back new runs while the process
+  RSS plus the expected growth of one more run exceeds MEMORY_BUDGET_MB.
+
+memory_report() summarizes all of it for /health.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from runtime.metrics import REGISTRY
+
+try:
+    import psutil
+except ImportError:  # Optional dependency, only needed where /proc is missing
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+RSS_BYTES = REGISTRY.gauge("process_resident_memory_bytes", "Resident set size of this worker")
+PAYLOAD_BYTES = REGISTRY.counter("run_payload_bytes_total", "Payload bytes buffered by runs, by source")
+
+_MB = 1024 * 1024
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process, or 0 if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        if psutil is not None:
+            rss = psutil.Process().memory_info().rss
+        else:
+            try:
+                import resource
+            except ImportError:
+                return 0
+            # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            rss = peak if sys.platform == "darwin" else peak * 1024
+    RSS_BYTES.set(rss)
+    return rss
+
+
+class RunMemory:
+    """Payload bytes one run holds in memory."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.started_at = time.time()
+        self.held = 0
+        self.peak_held = 0
+        self._lock = threading.Lock()
+
+    def charge(self, nbytes: int) -> None:
+        with self._lock:
+            self.held += nbytes
+            self.peak_held = max(self.peak_held, self.held)
+
+    def release(self, nbytes: int) -> None:
+        with self._lock:
+            self.held = max(0, self.held - nbytes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "age": round(time.time() - self.started_at, 1),
+            "held_bytes": self.held,
+            "peak_held_bytes": self.peak_held,
+        }
+
+
+_run: ContextVar[Optional[RunMemory]] = ContextVar("run_memory", default=None)
+_active_runs: Dict[int, RunMemory] = {}
+_active_lock = threading.Lock()
+
+
+@contextmanager
+def memory_scope(kind: str) -> Iterator[RunMemory]:
+    """Account payloads buffered in this context (and threads it starts) to a new run."""
+    account = RunMemory(kind)
+    token = _run.set(account)
+    with _active_lock:
+        _active_runs[id(account)] = account
+    try:
+        yield account
+    finally:
+        with _active_lock:
+            _active_runs.pop(id(account), None)
+        try:
+            _run.reset(token)
+        except ValueError:
+            pass  # Closed from another context (a streamed response body); nothing to restore
+
+
+def current_run() -> Optional[RunMemory]:
+    return _run.get()
+
+
+class PayloadBuffer:
+    """Append-only buffer for a large intermediate payload.
+
+    The bytes written are charged to the current run until the buffer is
+    closed, so /health and the memory budget see what runs hold.
+
+    Args:
+        source: Label for metrics ("linkup", "ollama", ...).
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.size = 0
+        self._account = _run.get()
+        self._chunks: List[bytes] = []
+
+    def write(self, data: Union[str, bytes]) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._chunks.append(data)
+        self.size += len(data)
+        if self._account is not None:
+            self._account.charge(len(data))
+        PAYLOAD_BYTES.inc(len(data), source=self.source)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
+
+    def text(self) -> str:
+        return self.getvalue().decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        self._chunks = []
+        if self._account is not None:
+            self._account.release(self.size)
+        self.size = 0
+
+    def __enter__(self) -> "PayloadBuffer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class MemoryBudget:
+    """Process-wide RSS budget consulted by admission control.
+
+    Args:
+        budget_bytes: Largest RSS to admit new work at.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+
+    def has_room(self, expected_growth: float) -> bool:
+        """True if one more run growing RSS by expected_growth bytes fits the budget."""
+        return rss_bytes() + expected_growth <= self.budget_bytes
+
+
+_budget: Optional[MemoryBudget] = None
+
+
+def get_memory_budget() -> Optional[MemoryBudget]:
+    """The budget set by MEMORY_BUDGET_MB, or None when it is unset or 0."""
+    global _budget
+    if _budget is None:
+        budget_mb = float(os.getenv("MEMORY_BUDGET_MB", "0"))
+        if budget_mb <= 0:
+            return None
+        _budget = MemoryBudget(int(budget_mb * _MB))
+    return _budget
+
+
+def memory_report() -> Dict[str, Any]:
+    """RSS, budget and per-run accounting for /health."""
+    rss = rss_bytes()
+    with _active_lock:
+        runs: List[Dict[str, Any]] = [account.snapshot() for account in _active_runs.values()]
+    budget = get_memory_budget()
+    return {
+        "rss_bytes": rss,
+        "budget_bytes": budget.budget_bytes if budget else None,
+        "active_runs": len(runs),
+        "held_bytes_per_run": sum(run["held_bytes"] for run in runs) // len(runs) if runs else None,
+        "runs": runs,
+    }
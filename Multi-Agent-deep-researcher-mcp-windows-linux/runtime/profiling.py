@@ -0,0 +1,246 @@
+"""
+Live Profiling
+
+Tools for finding where time goes inside a running server without
+restarting it or installing a profiler:
+
+- sample_cpu() samples the stacks of every thread (or only the threads
+  working for one request) and returns them in collapsed "folded" format,
+  ready for flamegraph.pl or speedscope.
+- dump_tasks() lists the event loop's asyncio tasks with their stacks.
+- LoopLagMonitor measures how late the event loop runs its callbacks and,
+  from a watchdog thread, logs the stack of whatever is blocking it when a
+  stall passes the threshold.
+
+Work is attributed to a request through request_scope() and attributed():
+the first tags the current context with a request id, the second makes a
+worker thread count as working for that request while it runs a callable.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from runtime.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a scheduled callback",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_thread_requests: Dict[int, str] = {}
+_active_requests: Counter = Counter()
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Raised when a CPU profile is requested while another is running."""
+
+
+@contextmanager
+def request_scope(request_id: Optional[str]) -> Iterator[Optional[str]]:
+    """Tag work done in this context with a request id."""
+    token = _request_id.set(request_id)
+    _active_requests[request_id] += 1
+    try:
+        yield request_id
+    finally:
+        _active_requests[request_id] -= 1
+        if _active_requests[request_id] <= 0:
+            del _active_requests[request_id]
+        _request_id.reset(token)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def attributed(func: Callable) -> Callable:
+    """Wrap func so the thread running it is attributed to the current request.
+
+    The request id is read when the wrapper runs, so wrap callables that are
+    executed with the caller's context (asyncio.to_thread, context.run).
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        request_id = _request_id.get()
+        if request_id is None:
+            return func(*args, **kwargs)
+        ident = threading.get_ident()
+        previous = _thread_requests.get(ident)
+        _thread_requests[ident] = request_id
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if previous is None:
+                _thread_requests.pop(ident, None)
+            else:
+                _thread_requests[ident] = previous
+    return run
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def sample_cpu(seconds: float, interval: float = 0.005, request_id: Optional[str] = None) -> str:
+    """Sample thread stacks and return them as collapsed stacks ("a;b;c count" lines).
+
+    Args:
+        seconds: Longest time to sample for.
+        interval: Seconds between samples.
+        request_id: Only sample threads attributed to this request, and stop
+            early once it has started and finished.
+
+    Raises:
+        ProfilerBusy: Another profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A CPU profile is already running")
+    try:
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks: Counter = Counter()
+        samples = 0
+        seen = False
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            if request_id is not None:
+                if request_id in _active_requests:
+                    seen = True
+                elif seen:
+                    break
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if request_id is not None and _thread_requests.get(ident) != request_id:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stacks[f"{names.get(ident, ident)};{_collapse(frame)}"] += 1
+            samples += 1
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+
+    logger.info("CPU profile: %d samples, %d distinct stacks", samples, len(stacks))
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+
+def dump_tasks(loop: Optional[asyncio.AbstractEventLoop] = None) -> List[Dict[str, Any]]:
+    """Pending asyncio tasks with their coroutine stacks, longest stacks first."""
+    tasks = []
+    for task in asyncio.all_tasks(loop):
+        stack = [
+            f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+            for frame in task.get_stack()
+        ]
+        tasks.append({"name": task.get_name(), "done": task.done(), "stack": stack})
+    return sorted(tasks, key=lambda task: len(task["stack"]), reverse=True)
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag and logs what is blocking the loop when it stalls.
+
+    A coroutine wakes every `interval` seconds and records how late it was.
+    A watchdog thread notices when the coroutine has not run for longer than
+    `threshold` and logs the loop thread's current stack, which is the
+    callback holding the loop.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start monitoring the running event loop."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._measure(), name="loop-lag-monitor")
+        threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True).start()
+
+    async def _measure(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self) -> None:
+        reported = None
+        while self._task is not None and not self._task.done():
+            time.sleep(self.interval)
+            stalled_for = time.monotonic() - self._heartbeat
+            if stalled_for <= self.interval + self.threshold:
+                reported = None
+                continue
+            if reported == self._heartbeat:
+                continue  # Already logged this stall
+            reported = self._heartbeat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable"
+            logger.warning("Event loop blocked for %.2fs; loop thread is in:\n%s", stalled_for, stack)
+
+    def report(self) -> Dict[str, Any]:
+        """Lag statistics since start."""
+        count, total = LOOP_LAG.stats()
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "samples": count,
+            "mean_lag": total / count if count else 0.0,
+            "p99_lag": LOOP_LAG.quantile(0.99),
+            "max_lag": self.max_lag,
+            "stalls": self.stalls,
+        }
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def start_loop_monitor() -> Optional[LoopLagMonitor]:
+    """Start the process-wide lag monitor on the running loop (LOOP_LAG_THRESHOLD=0 disables)."""
+    global _monitor
+    threshold = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+    if threshold <= 0:
+        return None
+    if _monitor is None:
+        _monitor = LoopLagMonitor(threshold=threshold)
+        _monitor.start()
+    return _monitor
+
+
+def get_loop_monitor() -> Optional[LoopLagMonitor]:
+    return _monitor
@@ -0,0 +1,255 @@
+"""
+Query Log
+
+Records every research and search query (raw and canonical form), where it
+came from, how long it took and whether it was answered from a cache, in an
+SQLite file shared by all workers. Inserts are queued and written in batches
+by a background thread, so logging costs a request almost nothing.
+
+The analytics side finds hot queries (most asked over a window) and trending
+ones (asked far more often recently than usual); the topic warmer uses both.
+Queries for topics the warmer has pre-computed are counted as warm hits or
+misses, giving the warm-hit ratio.
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from runtime.canonical import canonicalize, query_key
+from runtime.metrics import REGISTRY
+from runtime.state import DEFAULT_SQLITE_PATH, get_state_backend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_LOG_PATH = DEFAULT_SQLITE_PATH.parent / "query_log.db"
+
+WARM_LOOKUPS = REGISTRY.counter("warm_topic_queries_total", "Queries for warmed topics, by kind and result")
+
+_source: ContextVar[str] = ContextVar("query_source", default="api")
+
+
+@dataclass
+class QueryRecord:
+    """One logged query; cached is set while it runs if a cache answered it."""
+    query: str
+    kind: str
+    source: str
+    started_at: float = field(default_factory=time.time)
+    latency: float = 0.0
+    outcome: str = "ok"
+    cached: bool = False
+    warmed: bool = False
+
+
+_record: ContextVar[Optional[QueryRecord]] = ContextVar("query_record", default=None)
+
+
+@contextmanager
+def query_source(source: str) -> Iterator[None]:
+    """Attribute queries started in this context to a source ("http", "mcp", "warmer")."""
+    token = _source.set(source)
+    try:
+        yield
+    finally:
+        _source.reset(token)
+
+
+def note_cached(kind: str) -> None:
+    """Mark the query of this kind handled in this context as answered from a cache.
+
+    A full research run's own searches hitting the search cache do not make
+    the research query cached, hence the kind.
+    """
+    record = _record.get()
+    if record is not None and record.kind == kind:
+        record.cached = True
+
+
+def warm_marker(kind: str, query: str) -> str:
+    return f"warm:{kind}:{query_key(query)}"
+
+
+class QueryLog:
+    """Append-only query log with hot/trending analytics."""
+
+    def __init__(self, path: Path, batch_size: int = 200):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._queue: "queue.SimpleQueue[Optional[QueryRecord]]" = queue.SimpleQueue()
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS queries (
+                ts REAL NOT NULL, kind TEXT NOT NULL, source TEXT NOT NULL, query TEXT NOT NULL,
+                normalized TEXT NOT NULL, latency REAL NOT NULL, outcome TEXT NOT NULL,
+                cached INTEGER NOT NULL, warmed INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS queries_by_time ON queries (kind, ts);
+            """
+        )
+        self._writer = threading.Thread(target=self._write_loop, name="query-log-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def track(self, query: str, kind: str) -> Iterator[QueryRecord]:
+        """Time a query and log it when the block exits."""
+        record = QueryRecord(query=query, kind=kind, source=_source.get())
+        token = _record.set(record)
+        started = time.monotonic()
+        try:
+            yield record
+        except BaseException as e:
+            record.outcome = "cancelled" if not isinstance(e, Exception) else "error"
+            raise
+        finally:
+            record.latency = time.monotonic() - started
+            _record.reset(token)
+            self.append(record)
+
+    def append(self, record: QueryRecord) -> None:
+        self._queue.put(record)
+
+    @staticmethod
+    def _check_warmed(record: QueryRecord) -> None:
+        """Set record.warmed if the warmer had pre-computed its topic; runs on the writer thread."""
+        if record.source == "warmer":
+            return
+        try:
+            record.warmed = get_state_backend().get(warm_marker(record.kind, record.query)) is not None
+        except Exception as e:
+            logger.debug("Could not check warm marker: %s", e)
+        if record.warmed:
+            WARM_LOOKUPS.inc(kind=record.kind, result="hit" if record.cached else "miss")
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # The warm-marker lookup is state backend I/O, kept off the request path
+            for record in batch:
+                self._check_warmed(record)
+            try:
+                self._connect().executemany(
+                    "INSERT INTO queries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (r.started_at, r.kind, r.source, r.query, canonicalize(r.query), r.latency,
+                         r.outcome, int(r.cached), int(r.warmed))
+                        for r in batch
+                    ],
+                )
+            except sqlite3.Error as e:
+                logger.warning("Dropped %d query log records: %s", len(batch), e)
+
+    def hot(self, kind: str, window: float = 7 * 86400, limit: int = 20, min_count: int = 2) -> List[Dict[str, Any]]:
+        """Most asked topics over the window, excluding the warmer's own runs.
+
+        Each entry carries the latest raw phrasing of the topic.
+        """
+        rows = self._connect().execute(
+            # SQLite fills bare columns from the row that supplied MAX(ts)
+            "SELECT normalized, query, MAX(ts), COUNT(*), AVG(latency) FROM queries "
+            "WHERE kind = ? AND source != 'warmer' AND ts >= ? GROUP BY normalized "
+            "HAVING COUNT(*) >= ? ORDER BY COUNT(*) DESC LIMIT ?",
+            (kind, time.time() - window, min_count, limit),
+        ).fetchall()
+        return [
+            {"normalized": normalized, "query": query, "last_seen": last, "count": count, "avg_latency": latency}
+            for normalized, query, last, count, latency in rows
+        ]
+
+    def trending(
+        self,
+        kind: str,
+        recent: float = 6 * 3600,
+        baseline: float = 7 * 86400,
+        limit: int = 20,
+        min_count: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """Topics asked at least min_count times recently, ranked by how much
+        their recent rate exceeds their rate over the baseline window."""
+        now = time.time()
+        rows = self._connect().execute(
+            "SELECT normalized, query, MAX(ts), SUM(ts >= ?), COUNT(*) FROM queries "
+            "WHERE kind = ? AND source != 'warmer' AND ts >= ? GROUP BY normalized HAVING SUM(ts >= ?) >= ?",
+            (now - recent, kind, now - baseline, now - recent, min_count),
+        ).fetchall()
+        trending = []
+        for normalized, query, last, recent_count, total in rows:
+            recent_rate = recent_count / recent
+            baseline_rate = (total - recent_count + 1) / max(baseline - recent, 1)
+            trending.append({
+                "normalized": normalized, "query": query, "last_seen": last,
+                "recent_count": recent_count, "score": recent_rate / baseline_rate,
+            })
+        trending.sort(key=lambda entry: entry["score"], reverse=True)
+        return trending[:limit]
+
+    def warm_stats(self, window: float = 86400) -> Dict[str, Any]:
+        """Warm-hit ratio over the window, from all workers' records."""
+        cached, warmed, total = self._connect().execute(
+            "SELECT COALESCE(SUM(cached AND warmed), 0), COALESCE(SUM(warmed), 0), COUNT(*) FROM queries "
+            "WHERE source != 'warmer' AND ts >= ?",
+            (time.time() - window,),
+        ).fetchone()
+        return {
+            "queries": total,
+            "warmed_topic_queries": warmed,
+            "warm_hit_ratio": cached / warmed if warmed else None,
+        }
+
+    def prune(self, max_age: float) -> int:
+        """Delete records older than max_age seconds; returns how many."""
+        cursor = self._connect().execute("DELETE FROM queries WHERE ts < ?", (time.time() - max_age,))
+        return cursor.rowcount
+
+
+_log: Optional[QueryLog] = None
+_log_lock = threading.Lock()
+
+
+def get_query_log() -> Optional[QueryLog]:
+    """Process-wide log at QUERY_LOG_PATH, or None when QUERY_LOG is false."""
+    global _log
+    if os.getenv("QUERY_LOG", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = QueryLog(Path(os.getenv("QUERY_LOG_PATH") or DEFAULT_QUERY_LOG_PATH))
+    return _log
+
+
+@contextmanager
+def logged_query(query: str, kind: str) -> Iterator[Optional[QueryRecord]]:
+    """QueryLog.track on the process-wide log, or a no-op when logging is off."""
+    log = get_query_log()
+    if log is None:
+        yield None
+        return
+    with log.track(query, kind) as record:
+        yield record
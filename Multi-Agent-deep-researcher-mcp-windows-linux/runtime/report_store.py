@@ -0,0 +1,325 @@
+"""
+Report Store
+
+Persistent, content-addressed storage for finished reports. A report's id is
+a hash of its normalized query (see runtime.canonical), the model that wrote
+it and the set of sources it cites, so the same research over the same
+sources always lands on the same entry and is stored once.
+
+Each section is written as its own gzip file and an SQLite index records the
+query, creation time, sources and every section's byte offsets. Single
+sections and byte ranges are therefore served by decompressing only the
+files they touch, and reports survive server restarts.
+"""
+
+import os
+import re
+import gzip
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from runtime.canonical import canonicalize, normalize
+from runtime.reports import build_digest, section_spans
+from runtime.state import DEFAULT_SQLITE_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_DIR = DEFAULT_SQLITE_PATH.parent / "reports"
+
+_URL = re.compile(r"https?://[^\s<>()\[\]\"']+")
+
+
+def extract_sources(text: str) -> List[str]:
+    """Sorted, de-duplicated URLs cited in a report."""
+    return sorted({url.rstrip(".,;:") for url in _URL.findall(text)})
+
+
+def report_id_for(query: str, model: str, sources: Iterable[str]) -> str:
+    """Content address of a report."""
+    key = "\0".join([normalize(query), model, "\n".join(sorted(set(sources)))])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class ReportStore:
+    """Reports on disk under root, indexed by query, time and source."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS reports (
+                report_id TEXT PRIMARY KEY, kind TEXT NOT NULL, query TEXT NOT NULL,
+                normalized_query TEXT NOT NULL, model TEXT NOT NULL, created_at REAL NOT NULL,
+                title TEXT, summary TEXT, chars INTEGER, bytes INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS reports_by_query ON reports (normalized_query, kind, model, created_at);
+            CREATE INDEX IF NOT EXISTS reports_by_time ON reports (created_at);
+            CREATE TABLE IF NOT EXISTS report_sources (
+                source TEXT NOT NULL, report_id TEXT NOT NULL, PRIMARY KEY (source, report_id)
+            );
+            CREATE TABLE IF NOT EXISTS report_sections (
+                report_id TEXT NOT NULL, idx INTEGER NOT NULL, heading TEXT NOT NULL,
+                chars INTEGER NOT NULL, start INTEGER NOT NULL, length INTEGER NOT NULL,
+                PRIMARY KEY (report_id, idx)
+            );
+            """
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.root / "index.db"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _report_dir(self, report_id: str) -> Path:
+        return self.root / report_id[:2] / report_id
+
+    def save(self, query: str, text: str, model: Optional[str] = None, kind: str = "research") -> str:
+        """Store a report unless an identical one exists; returns its id.
+
+        Args:
+            query: The query the report answers.
+            text: Markdown report.
+            model: Model that wrote it; defaults to MODEL_NAME.
+            kind: "research" for full reports, "search" for quick search results.
+        """
+        model = model or os.getenv("MODEL_NAME", "phi3:latest")
+        sources = extract_sources(text)
+        report_id = report_id_for(query, model, sources)
+        if self.exists(report_id):
+            return report_id
+
+        # Write the section files into a scratch directory and move it into
+        # place in one step, so readers never see a partial report
+        rows, offset = self._section_rows(report_id, text)
+        target = self._report_dir(report_id)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        scratch = Path(tempfile.mkdtemp(dir=target.parent, prefix=".tmp-"))
+        try:
+            for idx, (heading, start, end) in enumerate(section_spans(text)):
+                with open(scratch / f"{idx:04d}.gz", "wb") as f:
+                    f.write(gzip.compress(text[start:end].encode("utf-8"), compresslevel=6, mtime=0))
+            try:
+                os.rename(scratch, target)
+            except OSError:
+                shutil.rmtree(scratch, ignore_errors=True)
+                if not target.is_dir():
+                    raise
+                if self.exists(report_id):
+                    return report_id  # Another worker stored it first
+                # Another worker moved its copy into place and has not indexed it
+                # yet, or was interrupted before it could. The directory is complete
+                # (it arrived by rename), so it is kept and indexed as it is on disk;
+                # the text may word things differently from ours.
+                text = self._read_dir_text(target)
+                rows, offset = self._section_rows(report_id, text)
+        except BaseException:
+            shutil.rmtree(scratch, ignore_errors=True)
+            raise
+
+        digest = build_digest(report_id, text)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO reports VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (report_id, kind, query, normalize(query), model, time.time(),
+                 digest["title"], digest["summary"], len(text), offset),
+            )
+            conn.executemany("INSERT OR IGNORE INTO report_sections VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT OR IGNORE INTO report_sources VALUES (?, ?)",
+                [(source, report_id) for source in sources],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info("Stored %s report %s (%d sections, %d bytes)", kind, report_id, len(rows), offset)
+        return report_id
+
+    @staticmethod
+    def _section_rows(report_id: str, text: str) -> Tuple[List[tuple], int]:
+        """report_sections rows for text and its total size in bytes."""
+        rows = []
+        offset = 0
+        for idx, (heading, start, end) in enumerate(section_spans(text)):
+            size = len(text[start:end].encode("utf-8"))
+            rows.append((report_id, idx, heading, len(text[start:end].strip()), offset, size))
+            offset += size
+        return rows, offset
+
+    @staticmethod
+    def _read_dir_text(directory: Path) -> str:
+        data = []
+        for path in sorted(directory.glob("*.gz")):
+            with gzip.open(path, "rb") as f:
+                data.append(f.read())
+        return b"".join(data).decode("utf-8")
+
+    def exists(self, report_id: str) -> bool:
+        row = self._connect().execute(
+            "SELECT 1 FROM reports WHERE report_id = ?", (report_id,)
+        ).fetchone()
+        return row is not None
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """Index entry for a report, with its sources and section table."""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT kind, query, model, created_at, title, summary, chars, bytes "
+            "FROM reports WHERE report_id = ?",
+            (report_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        kind, query, model, created_at, title, summary, chars, size = row
+        sections = conn.execute(
+            "SELECT idx, heading, chars, start, length FROM report_sections "
+            "WHERE report_id = ? ORDER BY idx",
+            (report_id,),
+        ).fetchall()
+        sources = conn.execute(
+            "SELECT source FROM report_sources WHERE report_id = ? ORDER BY source", (report_id,)
+        ).fetchall()
+        return {
+            "report_id": report_id,
+            "kind": kind,
+            "query": query,
+            "model": model,
+            "created_at": created_at,
+            "title": title,
+            "summary": summary,
+            "chars": chars,
+            "bytes": size,
+            "sources": [source for (source,) in sources],
+            "sections": [
+                {"index": idx, "heading": heading, "chars": section_chars, "start": start, "length": length}
+                for idx, heading, section_chars, start, length in sections
+            ],
+        }
+
+    def digest(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """Same shape as reports.build_digest, read from the index alone."""
+        entry = self.get(report_id)
+        if entry is None:
+            return None
+        return {
+            "report_id": report_id,
+            "title": entry["title"],
+            "summary": entry["summary"],
+            "chars": entry["chars"],
+            "sections": [
+                {"index": s["index"], "heading": s["heading"], "chars": s["chars"]}
+                for s in entry["sections"]
+            ],
+        }
+
+    def _read_section_bytes(self, report_id: str, index: int) -> bytes:
+        with gzip.open(self._report_dir(report_id) / f"{index:04d}.gz", "rb") as f:
+            return f.read()
+
+    def read_section(self, report_id: str, index: int) -> Optional[str]:
+        """Text of one section, or None if the report or section is unknown."""
+        row = self._connect().execute(
+            "SELECT 1 FROM report_sections WHERE report_id = ? AND idx = ?", (report_id, index)
+        ).fetchone()
+        if row is None:
+            return None
+        return self._read_section_bytes(report_id, index).decode("utf-8").strip()
+
+    def iter_range(self, report_id: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the UTF-8 bytes [start, end) of a report, one section at a time.
+
+        Only sections overlapping the range are decompressed.
+        """
+        rows = self._connect().execute(
+            "SELECT idx, start, length FROM report_sections WHERE report_id = ? "
+            "AND start + length > ? AND (? IS NULL OR start < ?) ORDER BY idx",
+            (report_id, start, end, end),
+        ).fetchall()
+        for idx, section_start, length in rows:
+            data = self._read_section_bytes(report_id, idx)
+            lo = max(start - section_start, 0)
+            hi = length if end is None else min(end - section_start, length)
+            yield data[lo:hi]
+
+    def read_text(self, report_id: str) -> Optional[str]:
+        """Whole report text, or None if unknown."""
+        if not self.exists(report_id):
+            return None
+        return b"".join(self.iter_range(report_id)).decode("utf-8")
+
+    def latest(
+        self,
+        query: str,
+        kind: str = "research",
+        model: Optional[str] = None,
+        max_age: Optional[float] = None,
+    ) -> Optional[str]:
+        """Id of the newest stored report for a query, if any is young enough."""
+        model = model or os.getenv("MODEL_NAME", "phi3:latest")
+        since = time.time() - max_age if max_age is not None else 0
+        row = self._connect().execute(
+            "SELECT report_id FROM reports WHERE normalized_query = ? AND kind = ? AND model = ? "
+            "AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+            (normalize(query), kind, model, since),
+        ).fetchone()
+        return row[0] if row else None
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        source: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """Newest reports containing a query's terms, citing a source and/or created since a time."""
+        sql = "SELECT r.report_id, r.kind, r.query, r.model, r.created_at, r.title, r.chars FROM reports r"
+        clauses, params = [], []
+        if source:
+            sql += " JOIN report_sources s ON s.report_id = r.report_id"
+            clauses.append("s.source = ?")
+            params.append(source)
+        if query:
+            for term in canonicalize(query).split():
+                clauses.append("r.normalized_query LIKE ?")
+                params.append(f"%{term}%")
+        if since is not None:
+            clauses.append("r.created_at >= ?")
+            params.append(since)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY r.created_at DESC LIMIT ?"
+        params.append(limit)
+        columns = ("report_id", "kind", "query", "model", "created_at", "title", "chars")
+        return [dict(zip(columns, row)) for row in self._connect().execute(sql, params)]
+
+
+_store: Optional[ReportStore] = None
+_store_lock = threading.Lock()
+
+
+def get_report_store() -> ReportStore:
+    """Return the process-wide store rooted at REPORT_STORE_DIR."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReportStore(Path(os.getenv("REPORT_STORE_DIR") or DEFAULT_REPORT_DIR))
+    return _store
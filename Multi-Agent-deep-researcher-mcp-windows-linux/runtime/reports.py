@@ -0,0 +1,72 @@
+"""
+Report Helpers
+
+Identify finished markdown reports by a content hash (used as the HTTP
+ETag), split them into sections, and build compact digests so clients can
+fetch a report's outline first and individual sections on demand.
+"""
+
+import re
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+# Markdown headings up to level 3 start a new section
+_HEADING = re.compile(r"^(#{1,3})\s+(.+?)\s*#*\s*$", re.MULTILINE)
+
+
+def report_etag(text: str) -> str:
+    """Strong ETag value (quoted) for a report body."""
+    return '"' + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == bare:
+            return True
+    return False
+
+
+def section_spans(text: str) -> List[Tuple[str, int, int]]:
+    """(heading, start, end) slices that together cover a non-blank text exactly.
+
+    Text before the first heading is the preamble, with heading "".
+    """
+    matches = list(_HEADING.finditer(text))
+    if not matches:
+        return [("", 0, len(text))] if text.strip() else []
+    bounds = [match.start() for match in matches] + [len(text)]
+    spans = []
+    if text[:bounds[0]].strip():
+        spans.append(("", 0, bounds[0]))
+    else:
+        bounds[0] = 0  # Fold leading whitespace into the first section
+    for i, match in enumerate(matches):
+        spans.append((match.group(2), bounds[i], bounds[i + 1]))
+    return spans
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split markdown into (heading, content) pairs; text before the first heading is the preamble."""
+    return [(heading, text[start:end].strip()) for heading, start, end in section_spans(text)]
+
+
+def build_digest(report_id: str, text: str) -> Dict[str, Any]:
+    """Outline of a report: title, first paragraph and per-section sizes."""
+    sections = split_sections(text)
+    title = next((heading for heading, _ in sections if heading), "")
+    first_paragraph = next((p.strip() for p in text.split("\n\n") if p.strip() and not p.lstrip().startswith("#")), "")
+    return {
+        "report_id": report_id,
+        "title": title,
+        "summary": first_paragraph[:500],
+        "chars": len(text),
+        "sections": [
+            {"index": i, "heading": heading, "chars": len(content)}
+            for i, (heading, content) in enumerate(sections)
+        ],
+    }
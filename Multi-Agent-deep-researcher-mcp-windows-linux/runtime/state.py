@@ -0,0 +1,325 @@
+"""
+Shared State Backend
+
+This module provides the key/value store that server workers use for caches,
+counters and single-flight leases. A single worker keeps its state in memory;
+multi-worker deployments point every worker at the same SQLite (WAL) file or
+Redis-compatible server via STATE_BACKEND_URL.
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = Path(__file__).resolve().parent.parent / ".state" / "research_state.db"
+
+
+class StateBackend:
+    """Interface for state shared between server workers."""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add to an integer counter, creating it if missing."""
+        raise NotImplementedError
+
+    def acquire_lease(self, key: str, owner: str, ttl: float) -> bool:
+        """Take an expiring lease on key. Returns False if someone else holds it."""
+        raise NotImplementedError
+
+    def renew_lease(self, key: str, owner: str, ttl: float) -> bool:
+        """Extend a lease owner still holds to ttl from now. Returns False if it was lost."""
+        raise NotImplementedError
+
+    def release_lease(self, key: str, owner: str) -> None:
+        raise NotImplementedError
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], str],
+        ttl: Optional[float] = None,
+        should_cache: Callable[[str], bool] = lambda value: True,
+        lease_ttl: float = 60.0,
+        wait_timeout: float = 60.0,
+    ) -> str:
+        """Return the cached value for key, computing it at most once across workers.
+
+        The first caller takes a lease and runs compute(); concurrent callers in
+        any worker poll for the result instead of repeating the work. If the
+        lease holder does not finish within wait_timeout the waiter computes
+        the value itself.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock_key = f"lease:{key}"
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + wait_timeout
+        delay = 0.05
+
+        while True:
+            if self.acquire_lease(lock_key, owner, lease_ttl):
+                try:
+                    value = self.get(key)
+                    if value is None:
+                        value = compute()
+                        if should_cache(value):
+                            self.set(key, value, ttl)
+                    return value
+                finally:
+                    self.release_lease(lock_key, owner)
+
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            if time.monotonic() >= deadline:
+                logger.warning("Timed out waiting for lease on %s, computing locally", key)
+                return compute()
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local backend used when only one worker is running."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        with self._lock:
+            current = self._live(key)
+            if current is None:
+                expires_at = time.time() + ttl if ttl else None
+                total = amount
+            else:
+                expires_at = self._data[key][1]
+                total = int(current) + amount
+            self._data[key] = (str(total), expires_at)
+            return total
+
+    def acquire_lease(self, key: str, owner: str, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (owner, time.time() + ttl)
+            return True
+
+    def renew_lease(self, key: str, owner: str, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) != owner:
+                return False
+            self._data[key] = (owner, time.time() + ttl)
+            return True
+
+    def release_lease(self, key: str, owner: str) -> None:
+        with self._lock:
+            if self._live(key) == owner:
+                del self._data[key]
+
+
+class SQLiteStateBackend(StateBackend):
+    """Backend shared by workers on one host through a SQLite file in WAL mode."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        self._connect().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (key, now),
+            )
+            conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + ?",
+                (key, str(amount), expires_at, amount),
+            )
+            row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return int(row[0])
+
+    def acquire_lease(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+            (key, owner, now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    def renew_lease(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE kv SET expires_at = ? WHERE key = ? AND value = ? AND expires_at > ?",
+            (now + ttl, key, owner, now),
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, key: str, owner: str) -> None:
+        self._connect().execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, owner))
+
+
+class RedisStateBackend(StateBackend):
+    """Backend shared through a Redis-compatible server (requires the redis package)."""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "STATE_BACKEND_URL points at Redis but the 'redis' package is not installed"
+            ) from e
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        pipe = self._client.pipeline()
+        pipe.incrby(key, amount)
+        if ttl:
+            pipe.pexpire(key, int(ttl * 1000), nx=True)
+        return int(pipe.execute()[0])
+
+    def acquire_lease(self, key: str, owner: str, ttl: float) -> bool:
+        return bool(self._client.set(key, owner, px=int(ttl * 1000), nx=True))
+
+    def renew_lease(self, key: str, owner: str, ttl: float) -> bool:
+        return bool(self._client.eval(
+            "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0",
+            1,
+            key,
+            owner,
+            int(ttl * 1000),
+        ))
+
+    def release_lease(self, key: str, owner: str) -> None:
+        # Compare-and-delete so an expired lease taken over by another worker is kept
+        self._client.eval(
+            "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0",
+            1,
+            key,
+            owner,
+        )
+
+
+def create_state_backend(url: Optional[str]) -> StateBackend:
+    """Create a backend from a URL: memory://, sqlite:///path or redis://host:port/db."""
+    if not url or url.startswith("memory://"):
+        return MemoryStateBackend()
+    if url.startswith("sqlite://"):
+        # sqlite:///relative.db and sqlite:////absolute.db, as in SQLAlchemy URLs;
+        # sqlite://relative.db is accepted too
+        path = url[len("sqlite://"):]
+        if path.startswith("/"):
+            path = path[1:]
+        return SQLiteStateBackend(Path(path) if path else DEFAULT_SQLITE_PATH)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateBackend(url)
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
+
+
+_backend: Optional[StateBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    """Return the process-wide backend configured by STATE_BACKEND_URL."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = os.getenv("STATE_BACKEND_URL")
+                _backend = create_state_backend(url)
+                logger.info("Using %s for shared state", type(_backend).__name__)
+    return _backend
@@ -0,0 +1,189 @@
+"""
+Topic Warmer
+
+Pre-computes answers to the queries users are most likely to ask next. At
+every interval inside the off-peak window (WARMER_HOURS), the warmer takes
+the hot and trending topics from the query log and runs each one through the
+research or search pipeline at batch priority, so the report store and the
+search cache already hold a fresh answer when the real request arrives.
+
+Topics whose answer is still fresh are skipped, and the warmer backs off as
+soon as interactive work is running. One worker at a time warms (a lease in
+the shared state backend). Each warmed topic leaves a marker for as long as
+its answer stays fresh; the query log counts queries for marked topics as
+warm hits or misses.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from runtime.admission import AdmissionRejected, get_admission_controller
+from runtime.freshness import policy_for
+from runtime.metrics import REGISTRY
+from runtime.query_log import QueryLog, get_query_log, query_source, warm_marker
+from runtime.state import StateBackend, get_state_backend
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("research", "search")
+WARMER_LEASE = "lease:warmer"
+
+WARMED = REGISTRY.counter("warmer_topics_total", "Topics considered by the warmer, by kind and result")
+
+
+def parse_hours(spec: str) -> Tuple[int, int]:
+    """(start, end) hours from "START-END"; the window may wrap past midnight."""
+    start, _, end = spec.partition("-")
+    return int(start) % 24, int(end) % 24
+
+
+def in_window(hour: int, window: Tuple[int, int]) -> bool:
+    start, end = window
+    if start == end:
+        return True  # "0-0" means always
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class TopicWarmer:
+    """Runs hot and trending topics ahead of demand.
+
+    Args:
+        run: Coroutine function run(kind, query) producing the answer
+            (ResearchCrew.conduct_research or quick_search); raises if the
+            run fails.
+        is_fresh: Returns True when kind/query already has a fresh answer.
+        log: Query log to read topics from.
+        state: Backend holding the lease and warm markers.
+        hours: Off-peak (start, end) hours, local time.
+        topics: Topics warmed per kind and round.
+        timeout: Seconds allowed per warmed run.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[str, str], Awaitable[str]],
+        is_fresh: Callable[[str, str], bool],
+        log: QueryLog,
+        state: Optional[StateBackend] = None,
+        hours: Tuple[int, int] = (2, 6),
+        topics: int = 20,
+        timeout: float = 600.0,
+    ):
+        self.run = run
+        self.is_fresh = is_fresh
+        self.log = log
+        self.state = state or get_state_backend()
+        self.hours = hours
+        self.topics = topics
+        self.timeout = timeout
+        self.last_round: Optional[Dict[str, Any]] = None
+
+    def candidates(self, kind: str) -> List[str]:
+        """Trending topics first, then hot ones, one raw query per topic."""
+        seen, queries = set(), []
+        for entry in self.log.trending(kind, limit=self.topics) + self.log.hot(kind, limit=self.topics):
+            if entry["normalized"] not in seen:
+                seen.add(entry["normalized"])
+                queries.append(entry["query"])
+        return queries[:self.topics]
+
+    @staticmethod
+    def _busy() -> bool:
+        return any(get_admission_controller(kind).in_flight for kind in KINDS)
+
+    async def warm_once(self, force: bool = False) -> Dict[str, Any]:
+        """One warming round; outside the window or while busy it does nothing unless forced.
+
+        Returns counts of warmed, fresh (skipped) and failed topics.
+        """
+        counts = {"warmed": 0, "fresh": 0, "failed": 0, "skipped": None}
+        if not force and not in_window(datetime.now().hour, self.hours):
+            counts["skipped"] = "outside off-peak hours"
+            return counts
+
+        # The lease covers one topic with room to spare and is renewed before
+        # each one, so a round of any length keeps it and a dead worker's
+        # lease lapses soon
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        lease_ttl = self.timeout * 2
+        if not await asyncio.to_thread(self.state.acquire_lease, WARMER_LEASE, owner, lease_ttl):
+            counts["skipped"] = "another worker is warming"
+            return counts
+        try:
+            for kind in KINDS:
+                for query in await asyncio.to_thread(self.candidates, kind):
+                    if self._busy() and not force:
+                        counts["skipped"] = "interactive traffic"
+                        return counts
+                    if not await asyncio.to_thread(self.state.renew_lease, WARMER_LEASE, owner, lease_ttl):
+                        counts["skipped"] = "lost the warmer lease"
+                        return counts
+                    result = await self._warm(kind, query)
+                    counts[result] += 1
+                    WARMED.inc(kind=kind, result=result)
+            return counts
+        finally:
+            await asyncio.to_thread(self.state.release_lease, WARMER_LEASE, owner)
+            await asyncio.to_thread(self.log.prune, float(os.getenv("QUERY_LOG_RETENTION_DAYS", "30")) * 86400)
+            self.last_round = {"finished_at": time.time(), **counts}
+            logger.info("Warmer round: %s", counts)
+
+    async def _warm(self, kind: str, query: str) -> str:
+        ttl = policy_for(query).ttl
+        if await asyncio.to_thread(self.is_fresh, kind, query):
+            await asyncio.to_thread(self.state.set, warm_marker(kind, query), str(time.time()), ttl)
+            return "fresh"
+        deadline = time.monotonic() + self.timeout
+        try:
+            with query_source("warmer"):
+                async with get_admission_controller(kind).admit("batch", deadline=deadline):
+                    await asyncio.wait_for(self.run(kind, query), self.timeout)
+        except (AdmissionRejected, asyncio.TimeoutError) as e:
+            logger.info("Warming %s %r skipped: %s", kind, query, e)
+            return "failed"
+        except Exception as e:
+            logger.warning("Warming %s %r failed: %s", kind, query, e)
+            return "failed"
+        await asyncio.to_thread(self.state.set, warm_marker(kind, query), str(time.time()), ttl)
+        return "warmed"
+
+    async def run_forever(self, interval: float) -> None:
+        while True:
+            try:
+                await self.warm_once()
+            except Exception as e:
+                logger.warning("Warmer round failed: %s", e)
+            await asyncio.sleep(interval)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "hours": f"{self.hours[0]}-{self.hours[1]}",
+            "topics": self.topics,
+            "last_round": self.last_round,
+        }
+
+
+def make_warmer(
+    run: Callable[[str, str], Awaitable[str]],
+    is_fresh: Callable[[str, str], bool],
+) -> Optional[TopicWarmer]:
+    """Warmer configured from WARMER_HOURS, WARMER_TOPICS and WARMER_TIMEOUT,
+    or None when the query log is off."""
+    log = get_query_log()
+    if log is None:
+        return None
+    return TopicWarmer(
+        run,
+        is_fresh,
+        log,
+        hours=parse_hours(os.getenv("WARMER_HOURS", "2-6")),
+        topics=int(os.getenv("WARMER_TOPICS", "20")),
+        timeout=float(os.getenv("WARMER_TIMEOUT", "600")),
+    )
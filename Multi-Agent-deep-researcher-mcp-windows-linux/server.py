@@ -4,12 +4,19 @@ MCP Multi-Agent Deep Researcher Server
 
 A Model Context Protocol server that implements a multi-agent research system
 using CrewAI for agent orchestration, LinkUp for web search, and Ollama for AI processing.
+
+Runs over stdio (one process per client) or as one long-lived process serving
+many clients over the streamable HTTP or SSE transports, sharing a single
+ResearchCrew, its caches and its admission limits.
 """
 
 import asyncio
+import contextlib
 import json
 import logging
 import os
+import time
+import uuid
 from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
@@ -25,23 +32,141 @@ from mcp.types import (
     TextContent,
 )
 
-from agents.research_crew import ResearchCrew
+from agents.research_crew import ResearchCrew, ResearchFailed
+from runtime.admission import AdmissionRejected, get_admission_controller
+from runtime.deadline import DeadlineExceeded
+from runtime.executor import install_executor
+from runtime.logging_setup import configure_logging
+from runtime.profiling import ProfilerBusy, dump_tasks, get_loop_monitor, request_scope, sample_cpu, start_loop_monitor
+from runtime.query_log import query_source
+from runtime.state import get_state_backend
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure non-blocking logging (LOG_LEVEL, LOG_FORMAT=text|json)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# Default time budgets (seconds); cancelled MCP calls abort their run immediately
+DEFAULT_RESEARCH_TIMEOUT = float(os.getenv("RESEARCH_TIMEOUT", "600"))
+DEFAULT_SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "60"))
+
+# Seconds between progress notifications while a research run is in flight
+PROGRESS_INTERVAL = float(os.getenv("MCP_PROGRESS_INTERVAL", "5"))
+
+# Characters of stage output included with each progress notification
+PARTIAL_TEXT_LIMIT = 2000
+
+# Seconds a background research result stays retrievable
+JOB_TTL = 3600
+# Expose the debug_profile tool (CPU profiles and task dumps) to clients
+MCP_DEBUG_TOOLS = os.getenv("MCP_DEBUG_TOOLS", "false").lower() in ("1", "true", "yes")
+
+TRANSPORTS = ("stdio", "streamable-http", "sse")
+
 class MCPResearchServer:
     """MCP Server for multi-agent research functionality."""
     
     def __init__(self):
         self.server = Server("mcp-multi-agent-researcher")
         self.research_crew = ResearchCrew()
+        self.state = get_state_backend()
+        self._background = set()
         self.setup_handlers()
     
+    def _request_id(self) -> Optional[str]:
+        """JSON-RPC id of the tool call being handled, used to attribute profiles."""
+        try:
+            return str(self.server.request_context.request_id)
+        except LookupError:
+            return None
+    
+    async def send_progress(self, progress: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+        """Send a progress notification for the current tool call, if the client asked for one."""
+        try:
+            ctx = self.server.request_context
+        except LookupError:
+            return
+        token = ctx.meta.progressToken if ctx.meta else None
+        if token is None:
+            return
+        try:
+            await ctx.session.send_progress_notification(token, progress, total=total, message=message)
+        except Exception as e:
+            logger.debug("Could not send progress notification: %s", e)
+    
+    async def run_with_progress(self, query: str, timeout: float, depth: Optional[str] = None) -> str:
+        """Run research, forwarding pipeline events as MCP progress notifications.
+        
+        Each finished stage is reported with its partial output. Between
+        events a heartbeat goes out every PROGRESS_INTERVAL seconds so clients
+        do not time out; its progress creeps toward the next step without
+        reaching it, keeping reported progress strictly increasing.
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        task = asyncio.ensure_future(self.research_crew.conduct_research(
+            query,
+            timeout=timeout,
+            on_progress=lambda event: loop.call_soon_threadsafe(events.put_nowait, event),
+            depth=depth
+        ))
+        started = time.monotonic()
+        step, total, beats = 0, None, 0
+        
+        async def forward(event: Dict[str, Any]) -> None:
+            message = event['message']
+            if event.get('partial'):
+                message += f" (~{event['tokens']} tokens)\n\n{event['partial'][:PARTIAL_TEXT_LIMIT]}"
+            await self.send_progress(event['progress'], event['total'], message)
+        
+        try:
+            while True:
+                getter = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait(
+                    {task, getter}, timeout=PROGRESS_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter in done:
+                    event = getter.result()
+                    step, total, beats = event['progress'], event['total'], 0
+                    await forward(event)
+                    continue
+                getter.cancel()
+                if task in done:
+                    while not events.empty():
+                        await forward(events.get_nowait())
+                    return task.result()
+                beats += 1
+                elapsed = time.monotonic() - started
+                await self.send_progress(step + beats / (beats + 1), total, f"Research in progress ({elapsed:.0f}s)")
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    def start_background_research(self, query: str, timeout: float, depth: Optional[str] = None) -> str:
+        """Run the full research pipeline in the background; returns a job id."""
+        job_id = uuid.uuid4().hex[:16]
+        key = f"research:job:{job_id}"
+        self.state.set(key, json.dumps({"status": "running", "query": query}), ttl=JOB_TTL)
+        
+        async def run():
+            try:
+                async with get_admission_controller("research").admit():
+                    result = await self.research_crew.conduct_research(query, timeout=timeout, depth=depth)
+                record = {"status": "done", "result": result}
+            except AdmissionRejected as e:
+                record = {"status": "failed", "error": f"Server busy ({e.reason})"}
+            except Exception as e:
+                logger.error("Background research %s failed: %s", job_id, e)
+                record = {"status": "failed", "error": str(e)}
+            self.state.set(key, json.dumps({**record, "query": query}), ttl=JOB_TTL)
+        
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return job_id
+    
     def setup_handlers(self):
         """Set up MCP server handlers."""
         
@@ -58,11 +183,40 @@ class MCPResearchServer:
                             "query": {
                                 "type": "string",
                                 "description": "The research question or topic to investigate"
+                            },
+                            "timeout": {
+                                "type": "number",
+                                "description": "Seconds before the run is abandoned (optional)"
+                            },
+                            "depth": {
+                                "type": "string",
+                                "enum": ["standard", "deep"],
+                                "description": "LinkUp search depth (optional; chosen automatically)"
+                            },
+                            "mode": {
+                                "type": "string",
+                                "enum": ["full", "search_first"],
+                                "description": "full waits for the report; search_first returns search "
+                                               "results now and a job_id for research_result"
                             }
                         },
                         "required": ["query"]
                     }
                 ),
+                Tool(
+                    name="research_result",
+                    description="Fetch the report of a research_query started with mode=search_first",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "job_id": {
+                                "type": "string",
+                                "description": "Job id returned by research_query"
+                            }
+                        },
+                        "required": ["job_id"]
+                    }
+                ),
                 Tool(
                     name="quick_search",
                     description="Perform a quick web search for immediate information",
@@ -72,12 +226,46 @@ class MCPResearchServer:
                             "query": {
                                 "type": "string",
                                 "description": "The search query"
+                            },
+                            "timeout": {
+                                "type": "number",
+                                "description": "Seconds before the run is abandoned (optional)"
+                            },
+                            "depth": {
+                                "type": "string",
+                                "enum": ["standard", "deep"],
+                                "description": "LinkUp search depth (optional; chosen automatically)"
                             }
                         },
                         "required": ["query"]
                     }
                 )
             ]
+            if MCP_DEBUG_TOOLS:
+                tools.append(Tool(
+                    name="debug_profile",
+                    description="Profile this server: sampled CPU stacks (collapsed, for flamegraphs) "
+                                "or an asyncio task and event-loop lag report",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "kind": {
+                                "type": "string",
+                                "enum": ["cpu", "tasks"],
+                                "description": "cpu samples stacks; tasks dumps asyncio tasks"
+                            },
+                            "seconds": {
+                                "type": "number",
+                                "description": "How long to sample CPU stacks (default 10)"
+                            },
+                            "request_id": {
+                                "type": "string",
+                                "description": "Only profile the tool call with this JSON-RPC id, until it finishes"
+                            }
+                        },
+                        "required": ["kind"]
+                    }
+                ))
             return ListToolsResult(tools=tools)
         
         @self.server.call_tool()
@@ -85,77 +273,234 @@ class MCPResearchServer:
             name: str, arguments: dict
         ) -> CallToolResult:
             """Handle tool calls."""
-            try:
-                if name == "research_query":
-                    query = arguments.get("query")
-                    if not query:
+            with request_scope(self._request_id()), query_source("mcp"):
+                try:
+                    if name == "research_query":
+                        query = arguments.get("query")
+                        if not query:
+                            return CallToolResult(
+                                content=[TextContent(
+                                    type="text",
+                                    text="Error: Query parameter is required"
+                                )],
+                                isError=True
+                            )
+                        
+                        logger.info("Starting research for query: %s", query)
+                        timeout = arguments.get("timeout") or DEFAULT_RESEARCH_TIMEOUT
+                        depth = arguments.get("depth")
+                        
+                        if arguments.get("mode") == "search_first":
+                            async with get_admission_controller("search").admit():
+                                search_results = await self.research_crew.quick_search(
+                                    query, timeout=DEFAULT_SEARCH_TIMEOUT, depth=depth
+                                )
+                            job_id = self.start_background_research(query, timeout, depth)
+                            result = (
+                                f"{search_results}\n\n---\nFull analysis continues in the background. "
+                                f"Call research_result with job_id \"{job_id}\" to fetch the report."
+                            )
+                        else:
+                            async with get_admission_controller("research").admit():
+                                result = await self.run_with_progress(query, timeout, depth)
+                        
+                        return CallToolResult(
+                            content=[TextContent(
+                                type="text",
+                                text=result
+                            )]
+                        )
+                    
+                    elif name == "research_result":
+                        record = self.state.get(f"research:job:{arguments.get('job_id')}")
+                        if record is None:
+                            return CallToolResult(
+                                content=[TextContent(
+                                    type="text",
+                                    text="Error: Unknown or expired job_id"
+                                )],
+                                isError=True
+                            )
+                        
+                        job = json.loads(record)
+                        if job["status"] == "running":
+                            text = f"Research on '{job['query']}' is still running; try again shortly."
+                        elif job["status"] == "failed":
+                            text = f"Error: {job['error']}"
+                        else:
+                            text = job["result"]
+                        
                         return CallToolResult(
                             content=[TextContent(
                                 type="text",
-                                text="Error: Query parameter is required"
+                                text=text
                             )],
-                            isError=True
+                            isError=job["status"] == "failed"
                         )
                     
-                    logger.info(f"Starting research for query: {query}")
-                    result = await self.research_crew.conduct_research(query)
+                    elif name == "debug_profile" and MCP_DEBUG_TOOLS:
+                        if arguments.get("kind") == "cpu":
+                            seconds = min(float(arguments.get("seconds") or 10), 300)
+                            try:
+                                text = await asyncio.to_thread(
+                                    sample_cpu, seconds, 0.005, arguments.get("request_id")
+                                )
+                            except ProfilerBusy as e:
+                                return CallToolResult(
+                                    content=[TextContent(type="text", text=f"Error: {e}")],
+                                    isError=True
+                                )
+                        else:
+                            monitor = get_loop_monitor()
+                            text = json.dumps(
+                                {"loop": monitor.report() if monitor else None, "tasks": dump_tasks()},
+                                indent=2
+                            )
+                        
+                        return CallToolResult(
+                            content=[TextContent(
+                                type="text",
+                                text=text or "No samples collected"
+                            )]
+                        )
                     
-                    return CallToolResult(
-                        content=[TextContent(
-                            type="text",
-                            text=result
-                        )]
-                    )
-                
-                elif name == "quick_search":
-                    query = arguments.get("query")
-                    if not query:
+                    elif name == "quick_search":
+                        query = arguments.get("query")
+                        if not query:
+                            return CallToolResult(
+                                content=[TextContent(
+                                    type="text",
+                                    text="Error: Query parameter is required"
+                                )],
+                                isError=True
+                            )
+                        
+                        logger.info("Performing quick search for: %s", query)
+                        async with get_admission_controller("search").admit():
+                            result = await self.research_crew.quick_search(
+                                query,
+                                timeout=arguments.get("timeout") or DEFAULT_SEARCH_TIMEOUT,
+                                depth=arguments.get("depth")
+                            )
+                        
                         return CallToolResult(
                             content=[TextContent(
                                 type="text",
-                                text="Error: Query parameter is required"
+                                text=result
+                            )]
+                        )
+                    
+                    else:
+                        return CallToolResult(
+                            content=[TextContent(
+                                type="text",
+                                text=f"Unknown tool: {name}"
                             )],
                             isError=True
                         )
-                    
-                    logger.info(f"Performing quick search for: {query}")
-                    result = await self.research_crew.quick_search(query)
-                    
+                
+                except AdmissionRejected as e:
                     return CallToolResult(
                         content=[TextContent(
                             type="text",
-                            text=result
-                        )]
+                            text=f"Server busy ({e.reason}), retry in {e.retry_after}s"
+                        )],
+                        isError=True
                     )
                 
-                else:
+                except DeadlineExceeded as e:
                     return CallToolResult(
                         content=[TextContent(
                             type="text",
-                            text=f"Unknown tool: {name}"
+                            text=f"Error: {str(e)}"
+                        )],
+                        isError=True
+                    )
+                
+                except ResearchFailed as e:
+                    return CallToolResult(
+                        content=[TextContent(
+                            type="text",
+                            text=str(e)
+                        )],
+                        isError=True
+                    )
+                
+                except Exception as e:
+                    logger.error("Error in tool call %s: %s", name, e)
+                    return CallToolResult(
+                        content=[TextContent(
+                            type="text",
+                            text=f"Error: {str(e)}"
                         )],
                         isError=True
                     )
-            
-            except Exception as e:
-                logger.error(f"Error in tool call {name}: {str(e)}")
-                return CallToolResult(
-                    content=[TextContent(
-                        type="text",
-                        text=f"Error: {str(e)}"
-                    )],
-                    isError=True
-                )
+
+def create_http_app(server_instance: MCPResearchServer, transport: str):
+    """Build a Starlette app serving MCP over streamable HTTP (/mcp) or SSE (/sse)."""
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Mount, Route
+    
+    server = server_instance.server
+    
+    if transport == "sse":
+        from mcp.server.sse import SseServerTransport
+        
+        sse = SseServerTransport("/messages/")
+        
+        async def handle_sse(request):
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, server.create_initialization_options())
+            return Response()
+        
+        return Starlette(routes=[
+            Route("/sse", endpoint=handle_sse, methods=["GET"]),
+            Mount("/messages/", app=sse.handle_post_message),
+        ])
+    
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    
+    session_manager = StreamableHTTPSessionManager(app=server)
+    
+    async def handle_streamable_http(scope, receive, send):
+        await session_manager.handle_request(scope, receive, send)
+    
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with session_manager.run():
+            yield
+    
+    return Starlette(routes=[Mount("/mcp", app=handle_streamable_http)], lifespan=lifespan)
 
 async def main():
     """Main server entry point."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="MCP Multi-Agent Deep Researcher Server")
+    parser.add_argument("--transport", choices=TRANSPORTS, default=os.getenv("MCP_TRANSPORT", "stdio"),
+                        help="stdio for one client per process, streamable-http or sse for many")
+    parser.add_argument("--host", default=os.getenv("MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MCP_PORT", "8090")))
+    args = parser.parse_args()
+    
     server_instance = MCPResearchServer()
+    install_executor()
+    start_loop_monitor()
     
     # Check required environment variables
     if not os.getenv('LINKUP_API_KEY'):
         logger.warning("LINKUP_API_KEY not set. Web search functionality may be limited.")
     
-    logger.info("Starting MCP Multi-Agent Deep Researcher Server...")
+    logger.info("Starting MCP Multi-Agent Deep Researcher Server (%s transport)...", args.transport)
+    
+    if args.transport != "stdio":
+        import uvicorn
+        
+        app = create_http_app(server_instance, args.transport)
+        config = uvicorn.Config(app, host=args.host, port=args.port, log_level="info")
+        await uvicorn.Server(config).serve()
+        return
     
     async with stdio_server() as (read_stream, write_stream):
         await server_instance.server.run(
@@ -169,4 +514,4 @@ async def main():
         )
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from runtime.admission import AdmissionController, AdmissionRejected
+from runtime.memory import MemoryBudget, PayloadBuffer, memory_report, memory_scope
+
+
+class FakeBudget(MemoryBudget):
+    """Budget whose room is switched by the test instead of read from RSS."""
+
+    def __init__(self):
+        super().__init__(budget_bytes=0)
+        self.room = True
+
+    def has_room(self, expected_growth: float) -> bool:
+        return self.room
+
+
+def controller(memory=None, concurrency=4, queue_timeout=1.0):
+    return AdmissionController(
+        "search", max_concurrency=concurrency, max_queue=8, queue_timeout=queue_timeout, memory=memory
+    )
+
+
+def test_memory_budget_holds_free_slots_but_one_run_always_proceeds():
+    async def scenario():
+        budget = FakeBudget()
+        budget.room = False
+        admission = controller(budget, queue_timeout=0.1)
+
+        async with admission.admit():
+            assert admission.in_flight == 1
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with admission.admit():
+                    pass
+            assert rejected.value.reason == "queue_timeout"
+
+    asyncio.run(scenario())
+
+
+def test_queued_run_starts_when_memory_frees():
+    async def scenario():
+        budget = FakeBudget()
+        budget.room = False
+        admission = controller(budget)
+        first_done = asyncio.Event()
+        order = []
+
+        async def first():
+            async with admission.admit():
+                order.append("first")
+                await first_done.wait()
+
+        async def second():
+            async with admission.admit():
+                order.append("second")
+
+        runner = asyncio.ensure_future(first())
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(second())
+        await asyncio.sleep(0.05)
+        assert order == ["first"] and admission.queue_depth == 1
+
+        budget.room = True
+        first_done.set()
+        await asyncio.gather(runner, waiting)
+        assert order == ["first", "second"]
+        assert admission.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_without_a_budget_slots_are_limited_by_concurrency_only():
+    async def scenario():
+        admission = controller(concurrency=2, queue_timeout=0.05)
+        async with admission.admit(), admission.admit():
+            with pytest.raises(AdmissionRejected):
+                async with admission.admit():
+                    pass
+
+    asyncio.run(scenario())
+
+
+def test_payloads_are_charged_to_the_run_until_closed():
+    with memory_scope("research") as run:
+        with PayloadBuffer("linkup") as body:
+            body.write(b"x" * 1000)
+            body.write("y" * 500)
+            assert run.held == 1500
+            assert body.text() == "x" * 1000 + "y" * 500
+        assert run.held == 0
+        assert run.peak_held == 1500
+
+
+def test_report_averages_the_bytes_runs_hold():
+    with memory_scope("search"), PayloadBuffer("linkup") as small:
+        small.write(b"x" * 100)
+        with memory_scope("research"), PayloadBuffer("linkup") as large:
+            large.write(b"x" * 300)
+            report = memory_report()
+    assert report["active_runs"] == 2
+    assert report["held_bytes_per_run"] == 200
@@ -0,0 +1,56 @@
+import pytest
+
+from runtime.canonical import canonicalize, normalize, query_key, stem
+
+
+@pytest.mark.parametrize("a, b", [
+    ("What is Agentic AI?", "what is agentic  ai"),
+    ("Café prices, 2026", "cafe prices 2026"),
+    ("population of 1,000,000", "population of 1000000"),
+    ("Ｆｕｌｌｗｉｄｔｈ text", "fullwidth text"),
+])
+def test_keys_fold_case_accents_punctuation_and_whitespace(a, b):
+    assert normalize(a) == normalize(b)
+    assert query_key(a) == query_key(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("is python faster than java", "is java faster than python"),
+    ("dogs bite men", "men bite dogs"),
+    ("IT jobs", "jobs"),
+    ("running shoes", "run shoes"),
+    ("not safe", "safe"),
+])
+def test_keys_keep_word_order_and_every_term(a, b):
+    assert query_key(a) != query_key(b)
+
+
+def test_key_namespace_separates_entries():
+    assert query_key("agentic ai", namespace="standard") != query_key("agentic ai", namespace="deep")
+
+
+def test_canonical_form_groups_phrasings_of_a_topic():
+    assert canonicalize("What is agentic AI?") == canonicalize("agentic A.I.")
+    assert canonicalize("artificial intelligence in the U.S.") == canonicalize("AI USA")
+    assert canonicalize("computing costs") == canonicalize("compute cost")
+
+
+def test_canonical_form_keeps_negations_and_question_words():
+    assert canonicalize("why is the sky blue") != canonicalize("how is the sky blue")
+    assert canonicalize("not safe") != canonicalize("safe")
+
+
+def test_canonical_form_keeps_stopwords_when_nothing_else_remains():
+    assert canonicalize("what is it") == "is it what"
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("computing", "comput"),
+    ("computes", "comput"),
+    ("running", "run"),
+    ("studies", "study"),
+    ("class", "class"),
+    ("ai", "ai"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
@@ -0,0 +1,88 @@
+import pytest
+
+from runtime.cassette import Cassette, CassetteMiss, request_key
+
+
+def test_request_key_ignores_dict_order():
+    assert request_key("linkup", {"q": "ai", "depth": "deep"}) == request_key("linkup", {"depth": "deep", "q": "ai"})
+    assert request_key("linkup", {"q": "ai"}) != request_key("ollama", {"q": "ai"})
+
+
+def test_calls_replay_in_recorded_order(tmp_path):
+    path = tmp_path / "calls.cassette"
+    recorder = Cassette(path, "record")
+    responses = iter([[200, "first"], [200, "second"]])
+    assert recorder.call("linkup", {"q": "ai"}, lambda: next(responses)) == [200, "first"]
+    assert recorder.call("linkup", {"q": "ai"}, lambda: next(responses)) == [200, "second"]
+
+    player = Cassette(path, "replay")
+
+    def live():
+        raise AssertionError("replay must not call the backend")
+
+    assert player.call("linkup", {"q": "ai"}, live) == [200, "first"]
+    assert player.call("linkup", {"q": "ai"}, live) == [200, "second"]
+    # Past the end, the last recording is repeated
+    assert player.call("linkup", {"q": "ai"}, live) == [200, "second"]
+
+
+def test_replay_of_an_unrecorded_request_raises(tmp_path):
+    path = tmp_path / "calls.cassette"
+    Cassette(path, "record").call("linkup", {"q": "ai"}, lambda: [200, "ok"])
+    with pytest.raises(CassetteMiss):
+        Cassette(path, "replay").call("linkup", {"q": "other"}, lambda: None)
+
+
+def test_replay_needs_an_existing_cassette(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Cassette(tmp_path / "missing.cassette", "replay")
+
+
+def test_only_finished_streams_are_recorded(tmp_path):
+    path = tmp_path / "streams.cassette"
+    recorder = Cassette(path, "record")
+
+    finished = recorder.stream("ollama", {"prompt": "hi"}, lambda: iter(["Hel", "lo"]))
+    assert list(finished) == ["Hel", "lo"]
+    finished.finish()
+
+    abandoned = recorder.stream("ollama", {"prompt": "bye"}, lambda: iter(["By", "e"]))
+    next(abandoned)
+    abandoned.close()
+
+    player = Cassette(path, "replay")
+    assert list(player.stream("ollama", {"prompt": "hi"}, lambda: iter(()))) == ["Hel", "lo"]
+    with pytest.raises(CassetteMiss):
+        player.stream("ollama", {"prompt": "bye"}, lambda: iter(()))
+
+
+def truncate_last_record(path, recorded):
+    """Cut the record written by `recorded` short, as a crash mid-write would."""
+    size = path.stat().st_size
+    recorded()
+    with open(path, "r+b") as f:
+        f.truncate(size + (path.stat().st_size - size) // 2)
+
+
+def test_records_before_a_truncated_tail_still_replay(tmp_path):
+    path = tmp_path / "calls.cassette"
+    recorder = Cassette(path, "record")
+    recorder.call("linkup", {"q": "ai"}, lambda: [200, "ok"])
+    truncate_last_record(path, lambda: recorder.call("linkup", {"q": "ai"}, lambda: [200, "cut short"]))
+
+    player = Cassette(path, "replay")
+    assert player.call("linkup", {"q": "ai"}, lambda: None) == [200, "ok"]
+    # The partial record is not indexed, so the complete one keeps repeating
+    assert player.call("linkup", {"q": "ai"}, lambda: None) == [200, "ok"]
+
+
+def test_recording_resumes_after_a_truncated_tail(tmp_path):
+    path = tmp_path / "calls.cassette"
+    recorder = Cassette(path, "record")
+    recorder.call("linkup", {"q": "ai"}, lambda: [200, "ok"])
+    truncate_last_record(path, lambda: recorder.call("linkup", {"q": "ml"}, lambda: [200, "cut short"]))
+
+    Cassette(path, "record").call("linkup", {"q": "ml"}, lambda: [200, "again"])
+    player = Cassette(path, "replay")
+    assert player.call("linkup", {"q": "ai"}, lambda: None) == [200, "ok"]
+    assert player.call("linkup", {"q": "ml"}, lambda: None) == [200, "again"]
@@ -0,0 +1,24 @@
+from runtime.freshness import FreshCache, policy_for
+from runtime.state import MemoryStateBackend
+
+
+def cache(max_tracked=3):
+    return FreshCache("test", state=MemoryStateBackend(), refresh_workers=1, max_tracked=max_tracked)
+
+
+def test_tracked_keys_are_capped_least_recently_served_first():
+    fresh = cache()
+    for query in ("a", "b", "c"):
+        fresh.get(query, query, lambda: "value")
+    fresh.get("a", "a", lambda: "value")
+    fresh.get("d", "d", lambda: "value")
+    assert list(fresh._tracked) == ["test:c", "test:a", "test:d"]
+
+
+def test_keys_past_their_grace_period_are_forgotten():
+    fresh = cache(max_tracked=100)
+    fresh.get("old", "old", lambda: "value")
+    policy = policy_for("old")
+    fresh._tracked["test:old"].stored_at -= policy.ttl + policy.grace
+    fresh.get("new", "new", lambda: "value")
+    assert list(fresh._tracked) == ["test:new"]
@@ -0,0 +1,105 @@
+import time
+import threading
+
+import pytest
+
+from runtime.deadline import Deadline, DeadlineExceeded, check_deadline, deadline_scope
+from runtime.hedging import HedgeBudget, Hedger
+from runtime.metrics import Histogram
+
+
+def latency(buckets=(0.05, 0.1, 1.0), samples=(), name="test_hedge_seconds"):
+    histogram = Histogram(name, "test", buckets=buckets)
+    for seconds in samples:
+        histogram.observe(seconds)
+    return histogram
+
+
+def hedger(histogram, budget=1.0, min_samples=20):
+    return Hedger("test", histogram, min_samples=min_samples, budget=HedgeBudget(budget, burst=100))
+
+
+def test_no_hedge_until_enough_samples():
+    assert hedger(latency(samples=[0.05] * 5)).hedge_delay() is None
+
+
+def test_hedge_delay_is_the_quantile():
+    assert hedger(latency(samples=[0.05] * 30)).hedge_delay() == 0.05
+
+
+def test_no_hedge_when_quantile_is_past_the_last_bucket():
+    slow = hedger(latency(samples=[5.0] * 30))
+    assert slow.hedge_delay() is None
+    assert slow.call(lambda attempt: "ok") == "ok"
+
+
+def test_no_hedge_when_delay_outlasts_the_deadline():
+    h = hedger(latency(samples=[1.0] * 30))
+    with deadline_scope(Deadline(0.5)):
+        assert h.hedge_delay() is None
+
+
+def test_slow_primary_is_hedged_and_loses():
+    h = hedger(latency(samples=[0.05] * 30))
+    cancelled = threading.Event()
+
+    def attempt(number):
+        if number == 0:
+            try:
+                for _ in range(100):
+                    check_deadline()
+                    time.sleep(0.01)
+            except DeadlineExceeded:
+                cancelled.set()
+                raise
+            return "primary"
+        return "hedge"
+
+    assert h.call(attempt) == "hedge"
+    assert cancelled.wait(1.0)
+
+
+def test_failed_attempt_does_not_win():
+    h = hedger(latency(samples=[0.05] * 30))
+
+    def attempt(number):
+        if number == 0:
+            time.sleep(0.1)
+            return "Error: primary failed"
+        time.sleep(0.2)
+        return "hedge"
+
+    assert h.call(attempt, is_ok=lambda result: not result.startswith("Error")) == "hedge"
+
+
+def test_all_attempts_failing_raises_the_primary_error():
+    h = hedger(latency(samples=[0.05] * 30))
+
+    def attempt(number):
+        time.sleep(0.1)
+        raise RuntimeError(f"attempt {number} failed")
+
+    with pytest.raises(RuntimeError, match="attempt 0 failed"):
+        h.call(attempt)
+
+
+def test_budget_limits_hedges():
+    h = hedger(latency(samples=[0.05] * 30), budget=0.0)
+    started = []
+
+    def attempt(number):
+        started.append(number)
+        time.sleep(0.1)
+        return "ok"
+
+    assert h.call(attempt) == "ok"
+    assert started == [0]
+
+
+def test_budget_allows_a_fraction_of_calls():
+    budget = HedgeBudget(0.25, burst=10)
+    spent = 0
+    for _ in range(100):
+        budget.deposit()
+        spent += budget.try_spend()
+    assert spent == 25
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from agents.tools.linkup_search import search_failed
+from agents.tools.search_providers import FanoutSearch, LocalIndexProvider, StubProvider, merge_results
+
+
+def urls(results):
+    return "\n".join(result["url"] for result in results)
+
+
+@pytest.fixture(autouse=True)
+def no_search_cache(monkeypatch):
+    monkeypatch.setenv("SEARCH_CACHE_TTL", "0")
+
+
+def test_local_index_requires_every_term(tmp_path):
+    index = LocalIndexProvider(tmp_path / "index.db")
+    index.add("file:///qc.md", "Quantum computing", "Quantum computers use qubits for error correction.")
+    index.add("file:///jobs.md", "IT jobs", "Jobs in computing are growing.")
+
+    assert [r["url"] for r in index.search("quantum computing error correction", "standard")] == ["file:///qc.md"]
+    assert index.search("computing salaries in europe", "standard") == []
+    assert index.search("what is the", "standard") == []
+
+
+def test_first_policy_answers_with_the_fastest_provider():
+    search = FanoutSearch(
+        [StubProvider("slow", latency=0.5, results=1), StubProvider("fast", results=1)], urls, policy="first"
+    )
+    started = time.monotonic()
+    result = search.search("agentic ai", "standard")
+    assert time.monotonic() - started < 0.4
+    assert "fast.example" in result and "slow.example" not in result
+
+
+def test_merge_policy_interleaves_providers_that_answer_in_time():
+    search = FanoutSearch(
+        [StubProvider("a", results=2), StubProvider("b", results=2), StubProvider("late", latency=1.0)],
+        urls,
+        policy="merge",
+        merge_wait=0.2,
+    )
+    lines = search.search("agentic ai", "standard").splitlines()
+    assert [line.split("/")[2] for line in lines] == ["a.example", "b.example", "a.example", "b.example"]
+
+
+def test_failed_provider_is_skipped():
+    search = FanoutSearch([StubProvider("broken", failure_rate=1.0), StubProvider("ok", results=1)], urls)
+    assert "ok.example" in search.search("agentic ai", "standard")
+
+
+def test_all_providers_failing_is_reported():
+    search = FanoutSearch([StubProvider("a", failure_rate=1.0), StubProvider("b", failure_rate=1.0)], urls)
+    result = search.search("agentic ai", "standard")
+    assert result.startswith("Search failed: all providers failed")
+    assert search_failed(result)
+
+
+def test_no_results_is_not_a_failure():
+    search = FanoutSearch([StubProvider("empty", results=0)], urls)
+    result = search.search("agentic ai", "standard")
+    assert result == "No search results found."
+    assert not search_failed(result)
+
+
+def test_routing_prefers_fast_reliable_providers():
+    slow, fast = StubProvider("slow"), StubProvider("fast")
+    search = FanoutSearch([slow, fast], urls, fanout=1, probe_every=0)
+    for _ in range(5):
+        search.stats.observe("slow", 2.0, True)
+        search.stats.observe("fast", 0.1, True)
+    assert search.route() == [fast]
+
+    for _ in range(50):
+        search.stats.observe("fast", 0.1, False)
+    assert search.route() == [slow]
+
+
+def test_merge_results_drops_duplicate_urls():
+    merged = merge_results([
+        [{"url": "https://example.com/a"}, {"url": "https://example.com/b"}],
+        [{"url": "https://example.com/a/"}, {"url": "https://example.com/c"}],
+    ])
+    assert [result["url"] for result in merged] == [
+        "https://example.com/a", "https://example.com/b", "https://example.com/c"
+    ]
@@ -10,17 +10,119 @@ import os
 import sys
 import time
 import signal
+import logging
 import subprocess
 import threading
 import webbrowser
+import urllib.request
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
+BACKEND_BASE_PORT = 8080
+FRONTEND_PORT = 3000
+
+
+class SupervisedProcess:
+    """A child process with drained logs, readiness probing and restart-on-crash.
+    
+    Output is read continuously on a background thread and written to a
+    rotating log file, so a chatty child can never block on a full pipe.
+    """
+    
+    def __init__(self, name, command, cwd, env=None, ready_url=None, log_dir=None, echo=True):
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.ready_url = ready_url
+        self.echo = echo
+        self.process = None
+        self.restarts = 0
+        self.started_at = None
+        self.stopping = False
+        
+        self.log = logging.getLogger(f"launcher.{name}")
+        self.log.propagate = False
+        self.log.setLevel(logging.INFO)
+        if log_dir is not None and not self.log.handlers:
+            log_dir.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(log_dir / f"{name}.log", maxBytes=5 * 1024 * 1024, backupCount=3)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.log.addHandler(handler)
+    
+    def start(self):
+        """Launch the process and start draining its output."""
+        self.stopping = False
+        self.started_at = time.monotonic()
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=self.cwd,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True
+        )
+        threading.Thread(target=self._drain, args=(self.process,), daemon=True).start()
+    
+    def _drain(self, process):
+        for line in process.stdout:
+            line = line.rstrip()
+            self.log.info(line)
+            if self.echo and not self.stopping:
+                print(f"[{self.name}] {line}")
+    
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+    
+    def wait_ready(self, timeout=30.0):
+        """Poll the readiness URL with short backoff; return seconds from launch to ready.
+        
+        Returns None if the process exits or does not become ready in time.
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            if not self.alive():
+                return None
+            if self.ready_url is None:
+                return time.monotonic() - self.started_at
+            try:
+                with urllib.request.urlopen(self.ready_url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.monotonic() - self.started_at
+            except Exception:
+                pass
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return None
+    
+    def stop(self, timeout=5):
+        """Terminate gracefully, killing the process if it does not exit in time."""
+        self.stopping = True
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
 class MCPLauncher:
-    def __init__(self):
+    # Restart backoff after a crash: doubles up to the cap, resets once stable
+    RESTART_BACKOFF = 1.0
+    RESTART_BACKOFF_MAX = 30.0
+    STABLE_AFTER = 60.0
+    
+    def __init__(self, workers=1, instances=1, echo_logs=True):
         self.project_root = Path(__file__).parent
-        self.backend_process = None
-        self.frontend_process = None
+        self.workers = workers
+        self.instances = instances
+        self.echo_logs = echo_logs
+        self.log_dir = self.project_root / "logs"
+        self.backends = []
+        self.frontend = None
         self.running = True
+        self._restart_lock = threading.Lock()
         
     def check_dependencies(self):
         """Check if all required dependencies are available."""
@@ -74,8 +176,21 @@ class MCPLauncher:
         
         return True
     
+    def _backend_env(self):
+        """Environment variables for the backend."""
+        env = os.environ.copy()
+        env.update({
+            'OPENAI_API_KEY': 'ollama',
+            'OPENAI_API_BASE': 'http://localhost:11434/v1',
+        })
+        if self.instances > 1 and not env.get('STATE_BACKEND_URL'):
+            # Separate instances must share caches like in-process workers do
+            state_db = self.project_root / "Multi-Agent-deep-researcher-mcp-windows-linux" / ".state" / "research_state.db"
+            env['STATE_BACKEND_URL'] = f"sqlite:///{state_db}"
+        return env
+    
     def start_backend(self):
-        """Start the backend API server."""
+        """Start the backend API server instances and wait until they are ready."""
         print("🚀 Starting backend API server...")
         
         backend_dir = self.project_root / "Multi-Agent-deep-researcher-mcp-windows-linux"
@@ -85,57 +200,41 @@ class MCPLauncher:
             print(f"❌ Backend server script not found: {server_script}")
             return False
         
-        # Set environment variables for the backend
-        env = os.environ.copy()
-        env.update({
-            'OPENAI_API_KEY': 'ollama',
-            'OPENAI_API_BASE': 'http://localhost:11434/v1',
-        })
+        env = self._backend_env()
         
         try:
-            self.backend_process = subprocess.Popen(
-                ['poetry', 'run', 'python', str(server_script)],
-                cwd=str(self.project_root),
-                env=env,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
+            for i in range(self.instances):
+                port = BACKEND_BASE_PORT + i
+                self.backends.append(SupervisedProcess(
+                    f"backend-{port}",
+                    ['poetry', 'run', 'python', str(server_script),
+                     '--port', str(port), '--workers', str(self.workers)],
+                    cwd=str(self.project_root),
+                    env=env,
+                    ready_url=f"http://localhost:{port}/health",
+                    log_dir=self.log_dir,
+                    echo=self.echo_logs
+                ))
             
-            # Wait a bit for the process to start
-            time.sleep(3)
+            for backend in self.backends:
+                backend.start()
             
-            # Monitor backend startup
-            backend_ready = False
-            for i in range(15):  # Wait up to 15 seconds
-                if self.backend_process.poll() is not None:
-                    # Process exited, get the error
-                    stdout, stderr = self.backend_process.communicate()
-                    print(f"❌ Backend server failed to start:")
-                    if stdout:
-                        print(f"   Output: {stdout}")
-                    if stderr:
-                        print(f"   Error: {stderr}")
+            all_ready = True
+            for backend in self.backends:
+                ready_in = backend.wait_ready(timeout=30)
+                if ready_in is not None:
+                    print(f"✅ {backend.name} ready in {ready_in:.2f}s ({self.workers} worker(s))")
+                elif not backend.alive():
+                    print(f"❌ Backend server failed to start, see {self.log_dir / (backend.name + '.log')}")
                     return False
-                
-                try:
-                    # Try to connect to the health endpoint
-                    import urllib.request
-                    with urllib.request.urlopen('http://localhost:8080/health', timeout=1) as response:
-                        if response.status == 200:
-                            backend_ready = True
-                            break
-                except Exception:
-                    pass
-                
-                time.sleep(1)
+                else:
+                    all_ready = False
             
-            if backend_ready:
-                print("✅ Backend API server is running on http://localhost:8080")
-                return True
+            if all_ready:
+                print(f"✅ Backend API server is running on http://localhost:{BACKEND_BASE_PORT}")
             else:
                 print("⚠️  Backend server started but health check failed")
-                return True  # Continue anyway
+            return True  # Continue anyway
                 
         except Exception as e:
             print(f"❌ Failed to start backend server: {e}")
@@ -146,19 +245,19 @@ class MCPLauncher:
         print("🌐 Starting frontend HTTP server...")
         
         try:
-            self.frontend_process = subprocess.Popen(
-                [sys.executable, '-m', 'http.server', '3000'],
+            self.frontend = SupervisedProcess(
+                "frontend",
+                [sys.executable, '-m', 'http.server', str(FRONTEND_PORT)],
                 cwd=str(self.project_root),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True
+                ready_url=f"http://localhost:{FRONTEND_PORT}/frontend.html",
+                log_dir=self.log_dir,
+                echo=self.echo_logs
             )
+            self.frontend.start()
             
-            # Wait a moment for the server to start
-            time.sleep(2)
-            
-            if self.frontend_process.poll() is None:
-                print("✅ Frontend HTTP server is running on http://localhost:3000")
+            ready_in = self.frontend.wait_ready(timeout=10)
+            if ready_in is not None:
+                print(f"✅ Frontend HTTP server is running on http://localhost:{FRONTEND_PORT} (ready in {ready_in:.2f}s)")
                 return True
             else:
                 print("❌ Frontend server failed to start")
@@ -168,25 +267,43 @@ class MCPLauncher:
             print(f"❌ Failed to start frontend server: {e}")
             return False
     
-    def monitor_processes(self):
-        """Monitor both processes and restart if needed."""
-        def monitor_backend():
-            if self.backend_process:
-                for line in self.backend_process.stdout:
-                    if self.running:
-                        print(f"[Backend] {line.strip()}")
+    def supervise(self):
+        """Restart crashed processes with exponential backoff (runs on a thread)."""
+        backoff = {}
         
-        def monitor_frontend():
-            if self.frontend_process:
-                for line in self.frontend_process.stdout:
-                    if self.running:
-                        print(f"[Frontend] {line.strip()}")
-        
-        if self.backend_process:
-            threading.Thread(target=monitor_backend, daemon=True).start()
-        
-        if self.frontend_process:
-            threading.Thread(target=monitor_frontend, daemon=True).start()
+        while self.running:
+            for proc in self.backends + [self.frontend]:
+                if proc is None or proc.stopping or proc.alive():
+                    continue
+                with self._restart_lock:
+                    if not self.running or proc.stopping or proc.alive():
+                        continue
+                    uptime = time.monotonic() - proc.started_at
+                    delay = self.RESTART_BACKOFF if uptime > self.STABLE_AFTER else backoff.get(proc.name, self.RESTART_BACKOFF)
+                    print(f"⚠️  {proc.name} exited with code {proc.process.returncode}, restarting in {delay:.1f}s")
+                    time.sleep(delay)
+                    backoff[proc.name] = min(delay * 2, self.RESTART_BACKOFF_MAX)
+                    if not self.running:
+                        break
+                    proc.restarts += 1
+                    proc.start()
+                    ready_in = proc.wait_ready(timeout=30)
+                    if ready_in is not None:
+                        print(f"✅ {proc.name} restarted, ready in {ready_in:.2f}s")
+            time.sleep(0.2)
+    
+    def rolling_restart(self):
+        """Restart backend instances one at a time so the others keep serving."""
+        with self._restart_lock:
+            print("🔄 Rolling restart of backend instances...")
+            for backend in self.backends:
+                backend.stop()
+                backend.start()
+                ready_in = backend.wait_ready(timeout=30)
+                if ready_in is None:
+                    print(f"❌ {backend.name} did not become ready, stopping rolling restart")
+                    return
+                print(f"✅ {backend.name} back in {ready_in:.2f}s")
     
     def open_browser(self):
         """Open the frontend in the default browser."""
@@ -203,21 +320,14 @@ class MCPLauncher:
         print("\n🛑 Shutting down servers...")
         self.running = False
         
-        if self.backend_process:
+        if self.backends:
             print("   Stopping backend server...")
-            self.backend_process.terminate()
-            try:
-                self.backend_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.backend_process.kill()
+            for backend in self.backends:
+                backend.stop()
         
-        if self.frontend_process:
+        if self.frontend:
             print("   Stopping frontend server...")
-            self.frontend_process.terminate()
-            try:
-                self.frontend_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.frontend_process.kill()
+            self.frontend.stop()
         
         print("✅ Cleanup complete")
     
@@ -235,6 +345,8 @@ class MCPLauncher:
         # Register signal handlers
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=self.rolling_restart, daemon=True).start())
         
         try:
             # Check dependencies
@@ -255,8 +367,8 @@ class MCPLauncher:
                 self.cleanup()
                 return 1
             
-            # Start monitoring
-            self.monitor_processes()
+            # Restart anything that crashes from here on
+            threading.Thread(target=self.supervise, daemon=True).start()
             
             print("\n" + "=" * 60)
             print("🎉 Both servers are running!")
@@ -267,26 +379,19 @@ class MCPLauncher:
             print("   • What are the latest AI trends in 2024?")
             print("   • How does quantum computing work?")
             print("   • Environmental impacts of cryptocurrency mining")
+            print(f"📝 Logs: {self.log_dir}")
+            if self.instances > 1:
+                print(f"🔄 Send SIGHUP (kill -HUP {os.getpid()}) for a rolling restart of {self.instances} backends")
             print("\n⌨️  Press Ctrl+C to stop both servers")
             print("=" * 60)
             
-            # Open browser after a short delay
-            time.sleep(2)
+            # Both servers have passed their readiness probes
             self.open_browser()
             
-            # Keep the main thread alive
+            # Keep the main thread alive; the supervisor handles restarts
             try:
                 while self.running:
                     time.sleep(1)
-                    
-                    # Check if processes are still running
-                    if self.backend_process and self.backend_process.poll() is not None:
-                        print("⚠️  Backend process stopped unexpectedly")
-                        break
-                    
-                    if self.frontend_process and self.frontend_process.poll() is not None:
-                        print("⚠️  Frontend process stopped unexpectedly")
-                        break
                         
             except KeyboardInterrupt:
                 pass
@@ -302,7 +407,19 @@ class MCPLauncher:
 
 def main():
     """Entry point."""
-    launcher = MCPLauncher()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Start the MCP Multi-Agent Deep Researcher")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Backend worker processes; more than one enables shared-state production mode")
+    parser.add_argument("--instances", type=int, default=1,
+                        help=f"Separately supervised backends on ports {BACKEND_BASE_PORT}, {BACKEND_BASE_PORT + 1}, ... "
+                             "(restarted one at a time on SIGHUP)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Only write server output to logs/ instead of echoing it")
+    args = parser.parse_args()
+    
+    launcher = MCPLauncher(workers=args.workers, instances=args.instances, echo_logs=not args.quiet)
     return launcher.run()
 
 if __name__ == "__main__":